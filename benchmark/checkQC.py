@@ -0,0 +1,141 @@
+#
+#  checkQC.py
+###########################################################################
+#
+#  Purpose:
+#
+#       Check that the single record QC (emalCheck.py) reports the same
+#	QC errors as the load (makeIMPC.py) for every line of a synthetic
+#	GenTar file with every outcome of makeGenTar.py. The load is run
+#	against the SQLite stand-in (lib/db.py) in full lookup mode, which
+#	writes the lookup snapshot; each input line is then checked with
+#	emalCheck.checkLine() against the snapshot.
+#
+#  Usage:
+#
+#      checkQC.py [--rows N] [--mix ...] [--db-alleles N] [--workdir dir]
+#
+#  Outputs:
+#
+#	per category: the lines reported by the load and by the check and
+#	the lines on which they differ; the first differing lines
+#
+#  Exit Codes:
+#
+#      0:  The check and the load agree on every line
+#      1:  They differ, or the load failed
+#
+#  Notes:
+#
+#	Duplicate lines in the input (dupeAlleleInInput) are found across
+#	lines and are not reported by the check of a single line; they are
+#	not compared. The suggestions (QC_SUGGEST_K) are turned off in both.
+#
+###########################################################################
+
+import sys
+import os
+import json
+import argparse
+import collections
+
+import runBenchmark
+import makeGenTar
+
+CRT = '\n'
+
+# categories the check of a single line does not report
+SKIPPED = ['dupeAlleleInInput']
+
+# differing lines printed
+SHOWN = 5
+
+#
+# Purpose: The QC errors of each line, as (rule, category, fields)
+# Returns: dictionary {line number: sorted list of errors}
+#
+def loadErrors(jsonFile):
+    errorDict = collections.defaultdict(list)
+    for line in open(jsonFile, 'r'):
+        r = json.loads(line)
+        if r['category'] not in SKIPPED:
+            errorDict[r['line']].append((r['rule'], r['category'],
+                tuple(sorted(r['fields'].items()))))
+    for errorList in errorDict.values():
+        errorList.sort()
+    return errorDict
+
+#
+# MAIN
+#
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'emalCheck.py against makeIMPC.py')
+    parser.add_argument('--rows', type = int, default = 5000)
+    parser.add_argument('--mix', default = makeGenTar.DEFAULT_MIX)
+    parser.add_argument('--db-alleles', type = int, default = 5000)
+    parser.add_argument('--workdir', default = os.path.join(runBenchmark.benchDir, 'work', 'check'))
+    args = parser.parse_args()
+
+    workDir = args.workdir
+    if not os.path.isdir(workDir):
+        os.makedirs(workDir)
+    inputFile = os.path.join(workDir, 'gentar_crispr_file.txt')
+    dbFile = os.path.join(workDir, 'mgd.sqlite')
+    makeGenTar.generate(args.rows, inputFile, dbFile, args.mix, args.db_alleles)
+
+    env = runBenchmark.runEnv(workDir, inputFile, dbFile,
+        os.path.join(workDir, 'emalload.metrics.json'))
+    env.update({
+        'LOOKUP_MODE' : 'full',
+        'LOOKUP_SNAPSHOT' : os.path.join(workDir, 'emalload_lookups.sqlite'),
+        'QC_JSON_FILE' : os.path.join(workDir, 'emalload_qc.jsonl'),
+        'QC_INDEX' : '',
+        'QC_SUGGEST_K' : '0' })
+    if runBenchmark.runScript('makeIMPC.py', env) != 0:
+        print('makeIMPC.py failed, see %s' % os.path.join(workDir, 'makeIMPC.py.out'))
+        sys.exit(1)
+    loadDict = loadErrors(env['QC_JSON_FILE'])
+
+    # the check, in this process, with the environment of the load
+    os.environ.update(env)
+    sys.path[:0] = [os.path.join(runBenchmark.benchDir, 'lib')]
+    import emalCheck
+    import emalQC
+    import makeIMPC
+
+    emalCheck.openSnapshot(makeIMPC, env['LOOKUP_SNAPSHOT'])
+    requirementList = emalCheck.requirementLines(makeIMPC)
+
+    # {category: [load lines, check lines, differing lines]}
+    countDict = collections.defaultdict(lambda: [0, 0, 0])
+    diffList = []
+    lineCount = 0
+    fp = open(inputFile, 'r')
+    fp.readline()
+    for lineNum, line in enumerate(fp, 2):
+        lineCount += 1
+        entryList, pathList, outcome, alleleLine = \
+            emalCheck.checkLine(makeIMPC, line.rstrip('\n'), requirementList)
+        checkList = sorted([(rule, category, tuple(sorted(fieldDict.items())))
+            for rule, category, fieldDict in entryList])
+        loadList = loadDict.get(lineNum, [])
+
+        for category in set([e[1] for e in loadList]):
+            countDict[category][0] += 1
+        for category in set([e[1] for e in checkList]):
+            countDict[category][1] += 1
+        if checkList != loadList:
+            for category in set([e[1] for e in loadList + checkList]):
+                countDict[category][2] += 1
+            diffList.append((lineNum, loadList, checkList))
+    fp.close()
+    emalQC.removeSpools()
+
+    print('%-42s %8s %8s %8s' % ('category', 'load', 'check', 'differ'))
+    for category in sorted(countDict):
+        print('%-42s %8s %8s %8s' % ((category,) + tuple(countDict[category])))
+    for lineNum, loadList, checkList in diffList[:SHOWN]:
+        print('line %s:%s    load:  %s%s    check: %s' % (lineNum, CRT,
+            loadList, CRT, checkList))
+    print('%s of %s lines differ' % (len(diffList), lineCount))
+    sys.exit(int(diffList != []))
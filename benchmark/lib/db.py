@@ -0,0 +1,165 @@
+#
+#  db.py
+###########################################################################
+#
+#  Purpose:
+#
+#       Local stand-in for the MGI pylib 'db' module, backed by the SQLite
+#	snapshot written by makeGenTar.py. It lets the emalload scripts run
+#	against synthetic data for benchmarking; it is only on the python
+#	path of the benchmark runs (PYTHONPATH=benchmark/lib).
+#
+#	Only the subset of the db API used by the load is provided.
+#	The postgres specifics used by the load are emulated:
+#	    nextval('seq'), setval('seq', n)	- python functions
+#	    select * from ACC_setMax(n)		- updates ACC_AccessionMax
+#	    explain analyze ...			- explain query plan, as
+#						  rows of 'QUERY PLAN'
+#
+#  Env Vars:
+#
+#	BENCH_DB - the SQLite snapshot
+#
+#  Notes:
+#
+#	Sequences are initialized from the max key of their table when
+#	the connection is opened.
+#
+#	As with postgres, column names in results are not case sensitive.
+#
+#	As a postgres connection, the connection can be used by the
+#	threads of emalload.py, one at a time.
+#
+###########################################################################
+
+import os
+import re
+import time
+import sqlite3
+
+server = 'sqlite'
+database = os.getenv('BENCH_DB')
+
+conn = None
+sqlLogFunction = None
+
+# {sequence: current value, ...}
+sequenceDict = {}
+
+# sequence name: (table, key column)
+sequenceTables = {
+    'all_allele_seq' : ('ALL_Allele', '_Allele_key'),
+    'all_allele_mutation_seq' : ('ALL_Allele_Mutation', '_Assoc_key'),
+    'mgi_reference_assoc_seq' : ('MGI_Reference_Assoc', '_Assoc_key'),
+    'mgi_note_seq' : ('MGI_Note', '_Note_key'),
+    'voc_annot_seq' : ('VOC_Annot', '_Annot_key') }
+
+class Row(dict):
+    #
+    # Is: one result row
+    # Has: column values keyed by lower case column name
+    # Does: looks up columns case insensitively
+    #
+    def __init__(self, row):
+        dict.__init__(self, [(str.lower(k), row[k]) for k in row.keys()])
+    def __getitem__(self, key):
+        return dict.__getitem__(self, str.lower(key))
+    def __contains__(self, key):
+        return dict.__contains__(self, str.lower(key))
+    def get(self, key, default = None):
+        return dict.get(self, str.lower(key), default)
+
+setMaxFinder = re.compile(r'select \* from ACC_setMax\((\d+)\)', re.I)
+explainFinder = re.compile(r'^\s*explain analyze\s', re.I)
+
+def nextval(name):
+    sequenceDict[name] = sequenceDict.get(name, 0) + 1
+    return sequenceDict[name]
+
+def setval(name, value):
+    sequenceDict[name] = value or 0
+    return sequenceDict[name]
+
+def connect():
+    global conn
+
+    conn = sqlite3.connect(database, check_same_thread = False)
+    conn.row_factory = sqlite3.Row
+    conn.create_function('nextval', 1, nextval)
+    conn.create_function('setval', 2, setval)
+    for name, (table, keyColumn) in sequenceTables.items():
+        row = conn.execute('select max(%s) from %s' % (keyColumn, table)).fetchone()
+        sequenceDict[name] = row[0] or 0
+
+def useOneConnection(flag = 0):
+    global conn
+
+    if flag:
+        if conn is None:
+            connect()
+    elif conn is not None:
+        conn.commit()
+        conn.close()
+        conn = None
+
+def sql(command, parser = 'auto', **kw):
+    if conn is None:
+        connect()
+
+    if type(command) == list:
+        return [sql(c, parser) for c in command]
+
+    start = time.time()
+    match = setMaxFinder.search(command)
+    if match:
+        conn.execute('''update ACC_AccessionMax
+            set maxNumericPart = maxNumericPart + ?
+            where prefixPart = 'MGI:' ''', (int(match.group(1)),))
+        results = []
+    elif explainFinder.search(command):
+        cursor = conn.execute(explainFinder.sub('explain query plan ', command))
+        results = [Row({'QUERY PLAN' : r['detail']}) for r in cursor.fetchall()]
+    else:
+        cursor = conn.execute(command)
+        if cursor.description is None:
+            results = []
+        else:
+            results = [Row(r) for r in cursor.fetchall()]
+
+    if sqlLogFunction is not None:
+        sqlLogFunction(start = start, end = time.time(), queries = [command],
+            results = [results], server = server, database = database)
+
+    if parser is None:
+        return None
+    return results
+
+def commit():
+    if conn is not None:
+        conn.commit()
+
+def set_sqlLogFunction(function):
+    global sqlLogFunction
+
+    sqlLogFunction = function
+
+def sqlLogAll(**kw):
+    pass
+
+def get_sqlServer():
+    return server
+
+def get_sqlDatabase():
+    return database
+
+def set_sqlServer(value):
+    pass
+
+def set_sqlDatabase(value):
+    pass
+
+def set_sqlUser(value):
+    pass
+
+def set_sqlPasswordFromFile(value):
+    pass
@@ -0,0 +1,402 @@
+#
+#  makeGenTar.py
+###########################################################################
+#
+#  Purpose:
+#
+#       Generate a synthetic 9 column GenTar input file and a matching
+#	SQLite snapshot of the MGI tables read by the load (see lib/db.py),
+#	with a controlled mix of QC outcomes.
+#
+#  Usage:
+#
+#      makeGenTar.py --rows N --input inputFile --db snapshotFile
+#	   [--mix outcome=weight,...] [--db-alleles N] [--seed N]
+#
+#  Outcomes:
+#
+#	colony		allele found by colony ID (7.2.E)
+#	alleleid	allele found by allele ID (7.2.D), colony note added
+#	symbol		allele found by symbol (7.2.H4), colony note added
+#	new		new allele created
+#	missing		7.2.A1 required value missing
+#	marker		7.2.A1 marker ID not in MGI
+#	strain		7.2.A1 strain not in MGI (reported, allele still created)
+#	class		7.2.A1 allele class not endonuclease-mediated
+#	type		7.2.A1 allele type not in translated set
+#	subtype		7.2.A1 allele subtype not in translated set
+#	unknownid	7.2.C1 allele ID not in MGI
+#	status		7.2.D3 allele ID match, status discrepancy
+#	secondary	7.2.D1 allele ID match, secondary marker ID (no error)
+#	markerdiff	7.2.D1 allele ID match, marker ID mismatch
+#	symboldiff	7.2.D2 allele ID match, allele symbol mismatch
+#	cidmismatch	7.2.D4a allele ID match, colony ID mismatch
+#	cidmulti	7.2.D4b allele ID match, colony ID of multiple alleles
+#	ciddiff		7.2.D4b allele ID match, colony ID of another allele
+#	multicid	7.2.F1 colony ID matches multiple alleles
+#	cidmarker	7.2.F2 colony ID match, marker ID mismatch
+#	cidsymbol	7.2.F2 colony ID match, allele symbol mismatch
+#	cidstatus	7.2.F3 colony ID match, status discrepancy
+#	symstatus	7.2.H1 symbol match, status discrepancy
+#	symcid		7.2.H2 symbol match, allele has another colony ID
+#	symdupe		7.2.H3 symbol matches multiple alleles
+#	nomen		bad allele nomenclature
+#	labcode		7.2.I lab code not in MGI
+#	dupe		duplicate new allele in input (two lines)
+#	transkey	7.2.A1g allele type/subtype pair without a translation
+#
+#  Outputs:
+#
+#	the input file, the snapshot, and the outcome counts on stdout
+#
+#  Exit Codes:
+#
+#      0:  Successful completion
+#      1:  An exception occurred
+#
+###########################################################################
+
+import sys
+import os
+import random
+import sqlite3
+import argparse
+
+TAB = '\t'
+CRT = '\n'
+
+HEADER = ['Gene Symbol', 'Gene MGI Accession ID', 'Colony Name',
+    'Colony Background Strain', 'Mutation Class', 'Mutation Type',
+    'Mutation Subtype', 'Mutation Symbol', 'Mutation MGI Accession ID']
+
+DEFAULT_MIX = 'colony=25,alleleid=5,symbol=5,new=40,missing=1,marker=2,' + \
+    'strain=2,class=1,type=1,subtype=1,unknownid=2,status=2,multicid=2,' + \
+    'nomen=2,labcode=5,dupe=4,secondary=1,markerdiff=1,symboldiff=1,' + \
+    'cidmismatch=1,cidmulti=1,ciddiff=1,cidmarker=1,cidsymbol=1,' + \
+    'cidstatus=1,symstatus=1,symcid=1,symdupe=1,transkey=1'
+
+# vocabulary terms: (_Term_key, _Vocab_key, term, abbreviation)
+APPROVED_KEY = 847114
+RESERVED_KEY = 847113
+EM_TYPE_KEY = 11927650
+TERMS = [
+    (APPROVED_KEY, 37, 'Approved', None),
+    (RESERVED_KEY, 37, 'Reserved', None),
+    (EM_TYPE_KEY, 38, 'Endonuclease-mediated', None),
+    (1001, 36, 'Intragenic deletion', None),
+    (1002, 36, 'Insertion', None),
+    (1003, 36, 'Deletion', None),
+    (1004, 36, 'Single point mutation', None),
+    (1005, 35, 'Not Specified', None),
+    (1006, 93, 'Null/knockout', None),
+    (1007, 61, 'Not Applicable', None),
+    (1008, 92, 'IMPC', None),
+    (4268545, 73, 'Curated', None),
+    (2001, 71, 'The Jackson Laboratory', 'J'),
+    (2002, 71, 'Wellcome Trust Sanger Institute', 'Wtsi'),
+    (2003, 71, 'MRC Harwell', 'H'),
+    (2004, 71, 'Baylor College of Medicine', 'Bay'),
+    (2005, 71, 'Toronto Centre for Phenogenomics', 'Tcp') ]
+LAB_CODES = ['J', 'Wtsi', 'H', 'Bay', 'Tcp']
+
+STRAINS = ['C57BL/6NJ', 'C57BL/6NTac', 'C57BL/6N', 'Not Specified']
+# (synonym, strain) pairs (MGI_Synonym, _MGIType_key = 10)
+STRAIN_SYNONYMS = [('B6N', 'C57BL/6N'), ('B6NTac', 'C57BL/6NTac')]
+
+SCHEMA = '''
+create table ACC_Accession (_Accession_key integer primary key, accID text,
+    prefixPart text, numericPart integer, _LogicalDB_key integer,
+    _Object_key integer, _MGIType_key integer, private integer,
+    preferred integer, modification_date text default current_timestamp);
+create index acc_idx1 on ACC_Accession (accID);
+create index acc_idx2 on ACC_Accession (_Object_key, _MGIType_key);
+create table ACC_MGIType (_MGIType_key integer primary key, tableName text);
+create table ACC_AccessionMax (prefixPart text, maxNumericPart integer);
+create table MRK_Marker (_Marker_key integer primary key, symbol text,
+    name text, _Marker_Status_key integer, _Marker_Type_key integer,
+    modification_date text default current_timestamp);
+create table ALL_Allele (_Allele_key integer primary key, _Marker_key integer,
+    symbol text, name text, _Allele_Status_key integer,
+    _Allele_Type_key integer, modification_date text default current_timestamp);
+create index all_idx1 on ALL_Allele (symbol);
+create table ALL_Allele_Mutation (_Assoc_key integer primary key,
+    _Allele_key integer, _Mutation_key integer);
+create table MGI_Reference_Assoc (_Assoc_key integer primary key,
+    _Refs_key integer, _Object_key integer);
+create table MGI_Note (_Note_key integer primary key, _Object_key integer,
+    _MGIType_key integer, _NoteType_key integer, note text,
+    modification_date text default current_timestamp);
+create table VOC_Term (_Term_key integer primary key, _Vocab_key integer,
+    term text, abbreviation text,
+    modification_date text default current_timestamp);
+create table VOC_Annot (_Annot_key integer primary key, _Object_key integer,
+    _Term_key integer);
+create table PRB_Strain (_Strain_key integer primary key, strain text,
+    private integer, modification_date text default current_timestamp);
+create table MGI_Synonym (_Synonym_key integer primary key,
+    _Object_key integer, _MGIType_key integer, synonym text,
+    modification_date text default current_timestamp);
+create table MGI_User (_User_key integer primary key, login text);
+'''
+
+MARKER_ID_BASE = 1000000
+SECONDARY_ID_BASE = 3000000
+ALLELE_ID_BASE = 5000000
+
+#
+# Purpose: Build the snapshot and input file
+#
+class Generator:
+    #
+    # Is: a synthetic GenTar file and MGI snapshot under construction
+    # Has: the rows of each table and the input lines
+    # Does: adds database objects and input lines for each outcome
+    #
+    def __init__(self, nMarkers, seed):
+        self.rand = random.Random(seed)
+        self.nMarkers = nMarkers
+        self.alleles = []	# ALL_Allele rows
+        self.accs = []		# ACC_Accession rows
+        self.notes = []		# MGI_Note rows
+        self.lines = []		# input lines (lists of 9 fields)
+        self.seq = 0		# unique number for symbols and colony IDs
+
+    def nextSeq(self):
+        self.seq += 1
+        return self.seq
+
+    def markerKey(self):
+        return self.rand.randint(1, self.nMarkers)
+
+    def markerID(self, markerKey):
+        return 'MGI:%s' % (MARKER_ID_BASE + markerKey)
+
+    def symbol(self, markerKey, n, labCode):
+        return 'Gm%s<em%s(IMPC)%s>' % (markerKey, n, labCode)
+
+    def addAllele(self, markerKey, symbol, statusKey = APPROVED_KEY, colonyID = None):
+        alleleKey = len(self.alleles) + 1
+        self.alleles.append((alleleKey, markerKey, symbol, symbol,
+            statusKey, EM_TYPE_KEY))
+        alleleID = 'MGI:%s' % (ALLELE_ID_BASE + alleleKey)
+        self.accs.append((alleleID, 'MGI:', ALLELE_ID_BASE + alleleKey, 1,
+            alleleKey, 11, 0, 1))
+        if colonyID is not None:
+            self.notes.append((alleleKey, 11, 1041, colonyID))
+        return alleleID
+
+    def addSecondaryID(self, markerKey, n):
+        markerID = 'MGI:%s' % (SECONDARY_ID_BASE + n)
+        self.accs.append((markerID, 'MGI:', SECONDARY_ID_BASE + n, 1,
+            markerKey, 2, 0, 0))
+        return markerID
+
+    def otherMarkerKey(self, markerKey):
+        return markerKey % self.nMarkers + 1
+
+    def addLine(self, markerKey, colonyID, symbol, alleleID = '',
+            strain = 'C57BL/6NJ', alleleClass = 'endonuclease-mediated',
+            alleleType = 'deletion', subType = 'exon deletion',
+            markerID = None):
+        if markerID is None:
+            markerID = self.markerID(markerKey)
+        self.lines.append(['Gm%s' % markerKey, markerID, colonyID, strain,
+            alleleClass, alleleType, subType, symbol, alleleID])
+
+    def outcome(self, name):
+        mk = self.markerKey()
+        n = self.nextSeq()
+        cid = 'BENCH%s' % n
+        lab = self.rand.choice(LAB_CODES)
+        symbol = self.symbol(mk, n, lab)
+
+        if name == 'colony':
+            self.addAllele(mk, symbol, colonyID = cid)
+            self.addLine(mk, cid, symbol)
+        elif name == 'alleleid':
+            alleleID = self.addAllele(mk, symbol)
+            self.addLine(mk, cid, symbol, alleleID = alleleID)
+        elif name == 'symbol':
+            self.addAllele(mk, symbol)
+            self.addLine(mk, cid, symbol)
+        elif name == 'new':
+            self.addLine(mk, cid, symbol)
+        elif name == 'missing':
+            self.addLine(mk, '', symbol)
+        elif name == 'marker':
+            self.addLine(mk, cid, symbol, markerID = 'MGI:9%s' % n)
+        elif name == 'strain':
+            self.addLine(mk, cid, symbol, strain = 'BENCH/%sJ' % n)
+        elif name == 'class':
+            self.addLine(mk, cid, symbol, alleleClass = 'Targeted')
+        elif name == 'type':
+            self.addLine(mk, cid, symbol, alleleType = 'translocation')
+        elif name == 'subtype':
+            self.addLine(mk, cid, symbol, subType = 'inversion')
+        elif name == 'unknownid':
+            self.addLine(mk, cid, symbol, alleleID = 'MGI:8%s' % n)
+        elif name == 'status':
+            alleleID = self.addAllele(mk, symbol, statusKey = RESERVED_KEY)
+            self.addLine(mk, cid, symbol, alleleID = alleleID)
+        elif name == 'secondary':
+            alleleID = self.addAllele(mk, symbol)
+            self.addLine(mk, cid, symbol, alleleID = alleleID,
+                markerID = self.addSecondaryID(mk, n))
+        elif name == 'markerdiff':
+            alleleID = self.addAllele(mk, symbol)
+            self.addLine(mk, cid, symbol, alleleID = alleleID,
+                markerID = self.markerID(self.otherMarkerKey(mk)))
+        elif name == 'symboldiff':
+            alleleID = self.addAllele(mk, symbol)
+            self.addLine(mk, cid, self.symbol(mk, self.nextSeq(), lab), alleleID = alleleID)
+        elif name == 'cidmismatch':
+            alleleID = self.addAllele(mk, symbol, colonyID = 'OTHER%s' % n)
+            self.addLine(mk, cid, symbol, alleleID = alleleID)
+        elif name == 'cidmulti':
+            alleleID = self.addAllele(mk, symbol)
+            self.addAllele(mk, self.symbol(mk, self.nextSeq(), lab), colonyID = cid)
+            self.addAllele(mk, self.symbol(mk, self.nextSeq(), lab), colonyID = cid)
+            self.addLine(mk, cid, symbol, alleleID = alleleID)
+        elif name == 'ciddiff':
+            alleleID = self.addAllele(mk, symbol)
+            self.addAllele(mk, self.symbol(mk, self.nextSeq(), lab), colonyID = cid)
+            self.addLine(mk, cid, symbol, alleleID = alleleID)
+        elif name == 'multicid':
+            self.addAllele(mk, symbol, colonyID = cid)
+            self.addAllele(mk, self.symbol(mk, self.nextSeq(), lab), colonyID = cid)
+            self.addLine(mk, cid, symbol)
+        elif name == 'cidmarker':
+            self.addAllele(mk, symbol, colonyID = cid)
+            self.addLine(mk, cid, symbol, markerID = self.markerID(self.otherMarkerKey(mk)))
+        elif name == 'cidsymbol':
+            self.addAllele(mk, symbol, colonyID = cid)
+            self.addLine(mk, cid, self.symbol(mk, self.nextSeq(), lab))
+        elif name == 'cidstatus':
+            self.addAllele(mk, symbol, statusKey = RESERVED_KEY, colonyID = cid)
+            self.addLine(mk, cid, symbol)
+        elif name == 'symstatus':
+            self.addAllele(mk, symbol, statusKey = RESERVED_KEY)
+            self.addLine(mk, cid, symbol)
+        elif name == 'symcid':
+            self.addAllele(mk, symbol, colonyID = 'OTHER%s' % n)
+            self.addLine(mk, cid, symbol)
+        elif name == 'symdupe':
+            self.addAllele(mk, symbol)
+            self.addAllele(mk, symbol)
+            self.addLine(mk, cid, symbol)
+        elif name == 'nomen':
+            self.addLine(mk, cid, '%s<x>' % symbol)
+        elif name == 'labcode':
+            self.addLine(mk, cid, self.symbol(mk, n, 'Zz'))
+        elif name == 'dupe':
+            self.addLine(mk, cid, symbol)
+            self.addLine(mk, 'BENCH%s' % self.nextSeq(), symbol)
+        elif name == 'transkey':
+            self.addLine(mk, cid, symbol, alleleType = 'insertion', subType = 'deletion')
+        else:
+            raise ValueError('Unknown outcome: %s' % name)
+
+    def background(self, nAlleles):
+        # alleles (some with colony notes) the input never refers to
+        for i in range(nAlleles):
+            mk = self.markerKey()
+            n = self.nextSeq()
+            colonyID = None
+            if i % 2 == 0:
+                colonyID = 'OTHER%s' % n
+            self.addAllele(mk, self.symbol(mk, n, 'J'), colonyID = colonyID)
+
+    def writeDB(self, fileName):
+        if os.path.exists(fileName):
+            os.remove(fileName)
+        conn = sqlite3.connect(fileName)
+        conn.executescript(SCHEMA)
+
+        markers = [(k, 'Gm%s' % k, 'predicted gene %s' % k, 1, 1)
+            for k in range(1, self.nMarkers + 1)]
+        conn.executemany('''insert into MRK_Marker (_Marker_key, symbol, name,
+            _Marker_Status_key, _Marker_Type_key) values (?,?,?,?,?)''', markers)
+        conn.executemany('''insert into ALL_Allele (_Allele_key, _Marker_key,
+            symbol, name, _Allele_Status_key, _Allele_Type_key)
+            values (?,?,?,?,?,?)''', self.alleles)
+
+        accs = [(self.markerID(k), 'MGI:', MARKER_ID_BASE + k, 1, k, 2, 0, 1)
+            for k in range(1, self.nMarkers + 1)] + self.accs
+        conn.executemany('''insert into ACC_Accession (accID, prefixPart,
+            numericPart, _LogicalDB_key, _Object_key, _MGIType_key, private,
+            preferred) values (?,?,?,?,?,?,?,?)''', accs)
+        conn.executemany('''insert into MGI_Note (_Object_key, _MGIType_key,
+            _NoteType_key, note) values (?,?,?,?)''', self.notes)
+
+        conn.executemany('''insert into VOC_Term (_Term_key, _Vocab_key, term,
+            abbreviation) values (?,?,?,?)''', TERMS)
+        conn.executemany('insert into PRB_Strain (strain, private) values (?, 0)',
+            [(s,) for s in STRAINS])
+        conn.executemany('''insert into MGI_Synonym (_Object_key, _MGIType_key,
+            synonym) select _Strain_key, 10, ? from PRB_Strain where strain = ?''',
+            STRAIN_SYNONYMS)
+        conn.executemany('insert into ACC_MGIType values (?,?)',
+            [(2, 'MRK_Marker'), (11, 'ALL_Allele')])
+        conn.execute('insert into ACC_AccessionMax values (?,?)',
+            ('MGI:', ALLELE_ID_BASE + len(self.alleles)))
+        conn.execute('insert into MGI_User values (1, ?)', ('impc_emalload',))
+        conn.commit()
+        conn.close()
+
+    def writeInput(self, fileName):
+        fp = open(fileName, 'w')
+        fp.write('%s%s' % (str.join(TAB, HEADER), CRT))
+        for tokens in self.lines:
+            fp.write('%s%s' % (str.join(TAB, tokens), CRT))
+        fp.close()
+
+#
+# Purpose: Parse an outcome mix 'name=weight,...'
+# Returns: list of (name, weight)
+#
+def parseMix(mix):
+    pairs = []
+    for item in str.split(mix, ','):
+        name, weight = str.split(item, '=')
+        pairs.append((str.strip(name), float(weight)))
+    return pairs
+
+#
+# Purpose: Generate the snapshot and input file
+# Returns: dictionary {outcome: count, ...}
+#
+def generate(rows, inputFile, dbFile, mix = DEFAULT_MIX, dbAlleles = 50000, seed = 1):
+    gen = Generator(max(rows // 2, 100), seed)
+    pairs = parseMix(mix)
+    names = [p[0] for p in pairs]
+    weights = [p[1] for p in pairs]
+
+    counts = {}
+    while len(gen.lines) < rows:
+        name = gen.rand.choices(names, weights)[0]
+        gen.outcome(name)
+        counts[name] = counts.get(name, 0) + 1
+    del gen.lines[rows:]
+
+    gen.background(dbAlleles)
+    gen.writeDB(dbFile)
+    gen.writeInput(inputFile)
+    return counts
+
+#
+# MAIN
+#
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Generate a synthetic GenTar file and MGI snapshot')
+    parser.add_argument('--rows', type = int, required = True)
+    parser.add_argument('--input', required = True)
+    parser.add_argument('--db', required = True)
+    parser.add_argument('--mix', default = DEFAULT_MIX)
+    parser.add_argument('--db-alleles', type = int, default = 50000)
+    parser.add_argument('--seed', type = int, default = 1)
+    args = parser.parse_args()
+
+    counts = generate(args.rows, args.input, args.db, args.mix, args.db_alleles, args.seed)
+    for name in sorted(counts):
+        print('%s%s%s' % (name, TAB, counts[name]))
+    sys.exit(0)
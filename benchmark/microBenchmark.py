@@ -0,0 +1,362 @@
+#
+#  microBenchmark.py
+###########################################################################
+#
+#  Purpose:
+#
+#       Micro-benchmarks of the hot functions of makeIMPC.py and
+#	makeAllele.py on fixture data, without a database:
+#
+#	    lookup.*	  the initialize() lookup builders, on the result
+#			  rows of the snapshot queries
+#	    findLabCode	  lab code extraction, per allele symbol
+#	    isBadNomen	  nomenclature check, per allele symbol
+#	    *.warm	  the same, with every symbol already parsed
+#			  (parseAlleleSymbol() cache); the others clear the
+#			  cache before each repeat
+#	    qc.*	  createAlleleFile() on lines that all take one branch:
+#			  alleleid (7.2.D), colony (7.2.E), symbol (7.2.H),
+#			  new (new allele)
+#	    writeQCReport writeQCReport() with large QC lists (--report-rows
+#			  input lines, all errors)
+#	    writeAllele	  makeAllele.py bcp row formatting, per allele
+#
+#	Each benchmark is repeated; the median and interquartile range of
+#	the repeats are reported and compared with the stored baseline.
+#
+#  Usage:
+#
+#      microBenchmark.py [--rows N] [--report-rows N] [--repeat N] [--only name,...]
+#	   [--baseline file] [--save-baseline] [--threshold fraction]
+#
+#  Outputs:
+#
+#	the median and IQR (ms) of each benchmark and its change against
+#	the baseline on stdout; with --save-baseline the baseline file
+#	(default microBaseline.json): {name: {'median', 'iqr'}, ...}
+#
+#  Exit Codes:
+#
+#      0:  Successful completion
+#      1:  A median is slower than its baseline by more than the threshold
+#	   (--threshold, default MICRO_THRESHOLD or 0.25)
+#
+#  Notes:
+#
+#	The fixture is generated by makeGenTar.py and read through the
+#	SQLite stand-in for the database (lib/db.py); the qc.symbol branch
+#	includes its per line symbol query against the stand-in.
+#
+#	The writeAllele benchmark needs the MGI pylib modules imported by
+#	makeAllele.py (mgi_utils, loadlib, sourceloadlib); it is skipped
+#	if they are not installed.
+#
+###########################################################################
+
+import sys
+import os
+import io
+import gc
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+benchDir = os.path.dirname(os.path.abspath(__file__))
+installDir = os.path.dirname(benchDir)
+binDir = os.path.join(installDir, 'bin')
+
+sys.path.insert(0, binDir)
+sys.path.insert(0, os.path.join(benchDir, 'lib'))
+import makeGenTar
+import runBenchmark
+
+# createAlleleFile branches and the makeGenTar outcome that exercises each
+BRANCHES = ['alleleid', 'colony', 'symbol', 'new']
+
+# outcomes of the fixture used for writeQCReport (every report section)
+REPORT_MIX = 'missing=1,marker=1,strain=1,class=1,type=1,subtype=1,' + \
+    'unknownid=1,status=1,multicid=1,nomen=1,labcode=1,dupe=1'
+
+#
+# Purpose: Time a function
+# Returns: list of the elapsed seconds of each repeat
+#
+def timeIt(function, setup, repeat):
+    times = []
+    for i in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+#
+# Purpose: Summarize the repeats of a benchmark
+# Returns: dictionary {'median', 'iqr'} in milliseconds
+#
+def summarize(times):
+    if len(times) > 1:
+        q1, q2, q3 = statistics.quantiles(times, n = 4)
+    else:
+        q1 = q3 = times[0]
+    return {'median' : round(statistics.median(times) * 1000, 3),
+        'iqr' : round((q3 - q1) * 1000, 3)}
+
+#
+# Purpose: Generate the fixture input files and snapshot
+# Returns: dictionary {branch: input lines, 'report': input lines}
+# Effects: writes the snapshot to workDir
+#
+def makeFixture(workDir, rows, reportRows):
+    gen = makeGenTar.Generator(rows * len(BRANCHES) + reportRows, 1)
+
+    fixture = {}
+    for name in BRANCHES:
+        first = len(gen.lines)
+        for i in range(rows):
+            gen.outcome(name)
+        fixture[name] = gen.lines[first:]
+
+    first = len(gen.lines)
+    pairs = makeGenTar.parseMix(REPORT_MIX)
+    while len(gen.lines) - first < reportRows:
+        for name, weight in pairs:
+            gen.outcome(name)
+    fixture['report'] = gen.lines[first:]
+
+    gen.background(rows)
+    gen.writeDB(os.path.join(workDir, 'mgd.sqlite'))
+
+    header = '%s%s' % (str.join(makeGenTar.TAB, makeGenTar.HEADER), makeGenTar.CRT)
+    for name in fixture:
+        fixture[name] = header + str.join('', ['%s%s' % \
+            (str.join(makeGenTar.TAB, tokens), makeGenTar.CRT) for tokens in fixture[name]])
+    return fixture
+
+#
+# Purpose: Benchmarks of makeIMPC.py
+# Returns: dictionary {name: (function, setup)}
+#
+def impcBenchmarks(fixture, workDir):
+    import makeIMPC
+
+    # the lookup query results, in the order initialize() runs them
+    queryResults = []
+    makeIMPC.db.set_sqlLogFunction(lambda **kw: queryResults.append(kw['results'][0]))
+    makeIMPC.initialize()
+    makeIMPC.db.set_sqlLogFunction(None)
+    colonyResults, colonyNoteResults, alleleResults, labCodeResults, \
+        markerResults, strainResults = queryResults[:6]
+
+    def resetLookup():
+        makeIMPC.colonyToAlleleDict.clear()
+        makeIMPC.colonyDict.clear()
+        makeIMPC.alleleBySymbolDict.clear()
+        makeIMPC.alleleByIDDict.clear()
+        makeIMPC.labCodeDict.clear()
+        makeIMPC.markerDict.clear()
+        makeIMPC.strainDict.clear()
+
+    def buildAlleleDicts():
+        makeIMPC.buildColonyDict(colonyNoteResults)
+        makeIMPC.buildAlleleDicts(alleleResults)
+
+    benchmarks = {
+        'lookup.colonyToAllele' : (lambda: makeIMPC.buildColonyToAlleleDict(colonyResults), resetLookup),
+        'lookup.allele' : (buildAlleleDicts, resetLookup),
+        'lookup.labCode' : (lambda: makeIMPC.buildLabCodeDict(labCodeResults), resetLookup),
+        'lookup.marker' : (lambda: makeIMPC.buildMarkerDict(markerResults), resetLookup),
+        'lookup.strain' : (lambda: makeIMPC.buildStrainDict(strainResults), resetLookup) }
+
+    # the benchmarks that follow need the full lookups
+    def restoreLookup():
+        resetLookup()
+        makeIMPC.buildColonyToAlleleDict(colonyResults)
+        makeIMPC.buildColonyDict(colonyNoteResults)
+        makeIMPC.buildAlleleDicts(alleleResults)
+        makeIMPC.buildLabCodeDict(labCodeResults)
+        makeIMPC.buildMarkerDict(markerResults)
+        makeIMPC.buildStrainDict(strainResults)
+
+    symbols = [str.split(line, makeGenTar.TAB)[7] for line in \
+        str.split(fixture['new'], makeGenTar.CRT)[1:-1]]
+
+    def findLabCodes():
+        for symbol in symbols:
+            makeIMPC.findLabCode(symbol)
+
+    def checkNomen():
+        for symbol in symbols:
+            makeIMPC.isBadNomen(symbol)
+
+    # parseAlleleSymbol() caches per symbol: cold parses every symbol,
+    # warm finds every symbol in the cache
+    def coldSymbols():
+        makeIMPC.parseAlleleSymbol.cache_clear()
+
+    def warmSymbols():
+        coldSymbols()
+        for symbol in symbols:
+            makeIMPC.parseAlleleSymbol(symbol)
+
+    benchmarks['findLabCode'] = (findLabCodes, coldSymbols)
+    benchmarks['findLabCode.warm'] = (findLabCodes, warmSymbols)
+    benchmarks['isBadNomen'] = (checkNomen, coldSymbols)
+    benchmarks['isBadNomen.warm'] = (checkNomen, warmSymbols)
+
+    # the input is read (and its QC lines referenced) from a file
+    def qcSetup(name):
+        fileName = os.path.join(workDir, '%s.txt' % name)
+        open(fileName, 'w').write(fixture[name])
+        def setup():
+            makeIMPC.resetQC()
+            makeIMPC.parseAlleleSymbol.cache_clear()
+            makeIMPC.fpIMPC = open(fileName, 'rb')
+            makeIMPC.emalQC.openInput(fileName)
+            makeIMPC.fpAllele = io.StringIO()
+            makeIMPC.fpNoteload = io.StringIO()
+        return setup
+
+    for name in BRANCHES:
+        benchmarks['qc.%s' % name] = (makeIMPC.createAlleleFile, qcSetup(name))
+
+    # QC spools of the report fixture
+    def reportSetup():
+        qcSetup('report')()
+        makeIMPC.createAlleleFile()
+        makeIMPC.fpQC = io.StringIO()
+
+    benchmarks['writeQCReport'] = (makeIMPC.writeQCReport, reportSetup)
+
+    return benchmarks, restoreLookup
+
+#
+# Purpose: Benchmarks of makeAllele.py
+# Returns: dictionary {name: (function, setup)}; empty if the MGI pylib
+#	modules are not installed
+#
+def alleleBenchmarks(rows):
+    try:
+        import makeAllele
+    except ImportError as e:
+        print('writeAllele skipped: %s' % e)
+        return {}
+
+    resolved = []
+    for i in range(rows):
+        resolved.append({
+            'markerID' : 'MGI:%s' % (1000000 + i),
+            'markerSymbol' : 'Gm%s' % i,
+            'markerKey' : i,
+            'description' : '',
+            'colonyID' : 'BENCH%s' % i,
+            'alleleSymbol' : 'Gm%s<em1(IMPC)J>' % i,
+            'alleleName' : 'endonuclease-mediated mutation 1, The Jackson Laboratory',
+            'mutationKeyList' : [1003],
+            'strainOfOriginKey' : 1,
+            'inheritanceModeKey' : 1005,
+            'alleleTypeKey' : makeGenTar.EM_TYPE_KEY,
+            'subTypeKeyList' : [1006],
+            'alleleStatusKey' : makeGenTar.APPROVED_KEY,
+            'transmissionKey' : 1007,
+            'collectionKey' : 1008,
+            'markerStatusKey' : 4268545,
+            'refKey' : 100,
+            'createdByKey' : 1 })
+
+    def setup():
+        for attr in ['fpAlleleFile', 'fpMutationFile', 'fpRefFile',
+                'fpAccFile', 'fpNoteFile', 'fpAnnotFile', 'fpNewAlleleRptFile']:
+            setattr(makeAllele, attr, io.StringIO())
+        for attr in ['alleleKey', 'refAssocKey', 'accKey', 'noteKey',
+                'mgiKey', 'annotKey', 'alleleMutationKey']:
+            setattr(makeAllele, attr, 1)
+
+    def writeAlleles():
+        for r in resolved:
+            makeAllele.writeAllele(r)
+
+    return {'writeAllele' : (writeAlleles, setup)}
+
+#
+# MAIN
+#
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'emalload micro-benchmarks')
+    parser.add_argument('--rows', type = int, default = 2000)
+    parser.add_argument('--report-rows', type = int, default = 50000)
+    parser.add_argument('--repeat', type = int, default = 11)
+    parser.add_argument('--only', default = '')
+    parser.add_argument('--baseline', default = os.path.join(benchDir, 'microBaseline.json'))
+    parser.add_argument('--save-baseline', action = 'store_true')
+    parser.add_argument('--threshold', type = float,
+        default = float(os.getenv('MICRO_THRESHOLD', '0.25')))
+    args = parser.parse_args()
+
+    workDir = tempfile.mkdtemp(prefix = 'emalmicro.')
+    fixture = makeFixture(workDir, args.rows, args.report_rows)
+    inputFile = os.path.join(workDir, 'gentar_crispr_file.txt')
+    open(inputFile, 'w').write(fixture['colony'])
+
+    # the scripts read their configuration from the environment
+    os.environ.update(runBenchmark.runEnv(workDir, inputFile,
+        os.path.join(workDir, 'mgd.sqlite'), os.path.join(workDir, 'metrics.json')))
+
+    # the scripts print progress; keep it out of the timings
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    benchmarks, restoreLookup = impcBenchmarks(fixture, workDir)
+    benchmarks.update(alleleBenchmarks(args.rows))
+    sys.stdout.close()
+    sys.stdout = stdout
+
+    onlyList = [s for s in str.split(args.only, ',') if s]
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        baseline = json.load(open(args.baseline, 'r'))
+
+    results = {}
+    regressed = []
+    print('%-24s %12s %12s %10s' % ('benchmark', 'median ms', 'iqr ms', 'change'))
+    for name in sorted(benchmarks):
+        if onlyList and name not in onlyList:
+            continue
+        function, setup = benchmarks[name]
+        if not name.startswith('lookup.'):
+            restoreLookup()
+        sys.stdout = open(os.devnull, 'w')
+        times = timeIt(function, setup, args.repeat)
+        sys.stdout.close()
+        sys.stdout = stdout
+        results[name] = summarize(times)
+
+        change = ''
+        if name in baseline and baseline[name]['median'] > 0:
+            ratio = results[name]['median'] / baseline[name]['median'] - 1
+            change = '%+.1f%%' % (ratio * 100)
+            if ratio > args.threshold:
+                regressed.append(name)
+                change += ' !'
+        print('%-24s %12.3f %12.3f %10s' % (name, results[name]['median'],
+            results[name]['iqr'], change))
+
+    shutil.rmtree(workDir)
+
+    if args.save_baseline:
+        baseline.update(results)
+        fp = open(args.baseline, 'w')
+        fp.write('%s\n' % json.dumps(baseline, indent = 1, sort_keys = True))
+        fp.close()
+        print('baseline saved: %s' % args.baseline)
+    elif regressed:
+        print('slower than baseline by more than %s%%: %s' % \
+            (args.threshold * 100, str.join(', ', regressed)))
+        sys.exit(1)
+
+    sys.exit(0)
@@ -0,0 +1,203 @@
+#
+#  runBenchmark.py
+###########################################################################
+#
+#  Purpose:
+#
+#       End-to-end throughput benchmark of makeIMPC.py and makeAllele.py.
+#	For each size, generates a synthetic GenTar file and MGI snapshot
+#	(makeGenTar.py), runs the scripts against the SQLite stand-in for
+#	the database (lib/db.py) in debug mode (no bcp), and appends the
+#	rows/sec, peak memory and per-stage times to the results file.
+#
+#  Usage:
+#
+#      runBenchmark.py [--sizes 10000,100000,1000000] [--mix ...]
+#	   [--db-alleles N] [--lookup-mode full|selective]
+#	   [--qc-engine python|sqlite] [--workdir dir] [--results file]
+#
+#  Inputs:
+#
+#	../impc.config.default - allele type/subtype settings
+#
+#  Outputs:
+#
+#	results file (default results.jsonl), one JSON record per size:
+#	    commit, date, rows, mix, and per script: status, wall,
+#	    rowsPerSec, maxrss and the stage records of the metrics file
+#
+#  Exit Codes:
+#
+#      0:  Successful completion
+#      1:  A benchmarked script failed
+#
+#  Notes:
+#
+#	makeAllele.py needs the MGI pylib modules loadlib, sourceloadlib
+#	and mgi_utils on the python path; they run against the stand-in.
+#
+###########################################################################
+
+import sys
+import os
+import re
+import json
+import time
+import argparse
+import subprocess
+
+benchDir = os.path.dirname(os.path.abspath(__file__))
+installDir = os.path.dirname(benchDir)
+binDir = os.path.join(installDir, 'bin')
+
+sys.path.insert(0, binDir)
+import emalMetrics
+import makeGenTar
+
+configFinder = re.compile(r"^(\w+)=(?:'([^']*)'|(\S*))", re.M)
+
+#
+# Purpose: Read the literal settings of the default configuration
+# Returns: dictionary {name: value, ...}
+#
+def readConfig():
+    config = {}
+    text = open(os.path.join(installDir, 'impc.config.default'), 'r').read()
+    for match in configFinder.finditer(text):
+        value = match.group(2) if match.group(2) is not None else match.group(3)
+        if '$' not in value:
+            config[match.group(1)] = value
+    return config
+
+#
+# Purpose: Build the environment of a benchmark run
+# Returns: dictionary of environment variables
+#
+def runEnv(workDir, inputFile, dbFile, metricsFile):
+    env = dict(os.environ)
+    env.update(readConfig())
+    env.update({
+        'OUTPUTDIR' : workDir,
+        'LOG_DIAG' : os.path.join(workDir, 'emalload.diag.log'),
+        'LOG_CUR' : os.path.join(workDir, 'emalload.cur.log'),
+        'QC_FILE' : os.path.join(workDir, 'emalload_qc.rpt'),
+        'QC_SPOOL_DIR' : workDir,
+        'SOURCE_COPY_INPUT_FILE' : inputFile,
+        'ALLELE_FILE' : os.path.join(workDir, 'allele_file.txt'),
+        'CID_NOTE_FILE' : os.path.join(workDir, 'cid_noteload.txt'),
+        'CID_NOTE_BCP' : os.path.join(workDir, 'MGI_Note_cid.bcp'),
+        'NEW_ALLELE_RPT' : os.path.join(workDir, 'MGI_impc_crispr_allele.rpt'),
+        'CHECKPOINT_DIR' : os.path.join(workDir, 'checkpoint'),
+        'METRICS_FILE' : metricsFile,
+        'CID_NOTELOAD_INPROCESS' : 'false',
+        'LOG_DEBUG' : 'true',
+        'HOST' : 'benchmark',
+        'PG_DBUTILS' : workDir,
+        'BENCH_DB' : dbFile,
+        'PYTHONPATH' : os.pathsep.join([os.path.join(benchDir, 'lib'),
+            env.get('PYTHONPATH', '')]) })
+    return env
+
+#
+# Purpose: Run one script as a stage of the benchmark
+# Returns: exit status
+#
+def runScript(script, env):
+    fpOut = open(os.path.join(env['OUTPUTDIR'], script + '.out'), 'w')
+    before = time.time()
+    status = subprocess.call([sys.executable, os.path.join(binDir, script)],
+        cwd = binDir, env = env, stdout = fpOut, stderr = subprocess.STDOUT)
+    fpOut.close()
+    emalMetrics.metricsFile = env['METRICS_FILE']
+    emalMetrics.writeRecord({'stage' : script, 'script' : 'runBenchmark.py',
+        'wall' : round(time.time() - before, 3), 'status' : status})
+    return status
+
+#
+# Purpose: Benchmark one input size
+# Returns: the result record
+#
+def benchmark(rows, args, commit):
+    workDir = os.path.join(args.workdir, str(rows))
+    if not os.path.isdir(workDir):
+        os.makedirs(workDir)
+    inputFile = os.path.join(workDir, 'gentar_crispr_file.txt')
+    dbFile = os.path.join(workDir, 'mgd.sqlite')
+    metricsFile = os.path.join(workDir, 'emalload.metrics.json')
+    if os.path.exists(metricsFile):
+        os.remove(metricsFile)
+
+    start = time.time()
+    outcomes = makeGenTar.generate(rows, inputFile, dbFile, args.mix, args.db_alleles)
+    generateTime = time.time() - start
+
+    env = runEnv(workDir, inputFile, dbFile, metricsFile)
+    if args.lookup_mode:
+        env['LOOKUP_MODE'] = args.lookup_mode
+    if args.qc_engine:
+        env['QC_ENGINE'] = args.qc_engine
+    result = {
+        'commit' : commit,
+        'date' : time.strftime('%Y-%m-%d %H:%M:%S'),
+        'rows' : rows,
+        'mix' : args.mix,
+        'dbAlleles' : args.db_alleles,
+        'lookupMode' : env.get('LOOKUP_MODE'),
+        'qcEngine' : env.get('QC_ENGINE'),
+        'outcomes' : outcomes,
+        'generate' : round(generateTime, 3),
+        'scripts' : {} }
+
+    for script in ['makeIMPC.py', 'makeAllele.py']:
+        if runScript(script, env) != 0:
+            break
+
+    # gather the stage records written by the scripts and the runner
+    stages = [json.loads(line) for line in open(metricsFile, 'r')]
+    for record in stages:
+        if record['script'] == 'runBenchmark.py':
+            entry = result['scripts'].setdefault(record['stage'], {})
+            entry['status'] = record['status']
+            entry['wall'] = record['wall']
+            entry['rowsPerSec'] = round(rows / max(record['wall'], 0.001), 1)
+        else:
+            entry = result['scripts'].setdefault(record['script'], {})
+            entry.setdefault('stages', {})[record['stage']] = record
+            entry['maxrss'] = max(entry.get('maxrss', 0), record.get('maxrss', 0))
+    return result
+
+#
+# MAIN
+#
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'emalload end-to-end benchmark')
+    parser.add_argument('--sizes', default = '10000,100000,1000000')
+    parser.add_argument('--mix', default = makeGenTar.DEFAULT_MIX)
+    parser.add_argument('--db-alleles', type = int, default = 50000)
+    parser.add_argument('--lookup-mode', choices = ['full', 'selective'])
+    parser.add_argument('--qc-engine', choices = ['python', 'sqlite'])
+    parser.add_argument('--workdir', default = os.path.join(benchDir, 'work'))
+    parser.add_argument('--results', default = os.path.join(benchDir, 'results.jsonl'))
+    args = parser.parse_args()
+
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+            cwd = installDir).decode().strip()
+    except:
+        commit = 'unknown'
+
+    failed = 0
+    for rows in [int(s) for s in str.split(args.sizes, ',')]:
+        result = benchmark(rows, args, commit)
+        fp = open(args.results, 'a')
+        fp.write('%s\n' % json.dumps(result, sort_keys = True))
+        fp.close()
+        for script in sorted(result['scripts']):
+            entry = result['scripts'][script]
+            print('%s rows %s: status %s wall %s rows/sec %s maxrss %s' % \
+                (rows, script, entry.get('status'), entry.get('wall'),
+                entry.get('rowsPerSec'), entry.get('maxrss')))
+            if entry.get('status'):
+                failed = 1
+
+    sys.exit(failed)
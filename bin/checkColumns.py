@@ -12,7 +12,7 @@
 #      checkColumns.py  filename numColumns	
 #
 #      where:
-#          filename = path to the input file
+#          filename = path to the input file (may be gzip or zstd compressed)
 #
 #  Env Vars:
 #
@@ -36,6 +36,7 @@
 
 
 import sys
+import emalFile
 
 USAGE = 'Usage: checkColumns.py  inputFile numColumns'
 TAB = '\t'
@@ -74,7 +75,7 @@ def openFile ():
     global fpInput
 
     try:
-        fpInput = open(inputFile, 'r')
+        fpInput = emalFile.openFile(inputFile)
     except:
         print('Cannot open input file: ' + inputFile)
         sys.exit(1)
@@ -90,7 +91,7 @@ def openFile ():
 def checkColumns ():
     global errors
     lineNum = 1
-    for line in fpInput.readlines():
+    for line in fpInput:
         colError = 0
         lineNum = lineNum + 1
         columns = list(map(str.strip, str.split(line, TAB)))
@@ -0,0 +1,189 @@
+#
+#  emalArchive.py
+###########################################################################
+#
+#  Purpose:
+#
+#       Content-addressed archive of the GenTar input file and the
+#	reports of each run. Files are stored once, compressed, under the
+#	sha256 of their (decompressed) content, so an input identical to a
+#	previous one costs nothing but an index entry. The index maps the
+#	run timestamp to the input hash and the report hashes.
+#
+#  Usage:
+#
+#      emalArchive.py store timestamp inputFile [reportFile ...]
+#	   archive the input file and reports of the run 'timestamp'
+#
+#      emalArchive.py get timestamp [fileName]
+#	   without fileName, print the index entry of the run;
+#	   with fileName (basename of the input file or a report), write
+#	   the archived file to stdout
+#
+#      emalArchive.py list
+#	   print the index
+#
+#  Env Vars:
+#
+#	ARCHIVE_STORE - directory of the object store and index
+#	ARCHIVE_COMPRESSION - compression of the stored objects (emalFile.py)
+#
+#  Inputs:
+#
+#	${ARCHIVE_STORE}/index - one line per run:
+#	    timestamp<TAB>inputName=hash<TAB>reportName=hash ...
+#	    the first name=hash is the input file
+#
+#  Outputs:
+#
+#	${ARCHIVE_STORE}/objects/<hash[:2]>/<hash>[.gz|.zst]
+#
+#  Exit Codes:
+#
+#      0:  Successful completion
+#      1:  An exception occurred
+#
+#  Notes:  Report files that do not exist are not archived.
+#
+###########################################################################
+
+import sys
+import os
+import glob
+import emalFile
+
+USAGE = 'Usage: emalArchive.py store timestamp inputFile [reportFile ...]\n' + \
+        '       emalArchive.py get timestamp [fileName]\n' + \
+        '       emalArchive.py list'
+TAB = '\t'
+CRT = '\n'
+
+storeDir = os.getenv('ARCHIVE_STORE')
+indexFile = None
+objectDir = None
+
+#
+# Purpose: Find the stored object for a hash
+# Returns: path of the object file or None
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def findObject(digest):
+    found = glob.glob(os.path.join(objectDir, digest[:2], digest + '*'))
+    if found:
+        return found[0]
+    return None
+
+#
+# Purpose: Store a file under the hash of its content if not already stored
+# Returns: the hash
+# Assumes: Nothing
+# Effects: writes to the file system
+# Throws: OSError if a file cannot be read or written
+#
+def storeFile(fileName):
+    digest = emalFile.hashFile(fileName)
+    if findObject(digest) is not None:
+        return digest
+
+    subDir = os.path.join(objectDir, digest[:2])
+    if not os.path.isdir(subDir):
+        os.makedirs(subDir)
+
+    # compress to a temporary name, then rename so a partial object
+    # is never found
+    tmpBase = os.path.join(subDir, '.%s.%s' % (digest, os.getpid()))
+    tmpName = emalFile.compressFile(fileName, tmpBase)
+    suffix = tmpName[len(tmpBase):]
+    os.rename(tmpName, os.path.join(subDir, digest + suffix))
+    return digest
+
+#
+# Purpose: Read the index
+# Returns: dictionary {timestamp: [(name, hash), ...], ...}
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def readIndex():
+    indexDict = {}
+    if not os.path.exists(indexFile):
+        return indexDict
+    for line in open(indexFile, 'r'):
+        tokens = str.split(line[:-1], TAB)
+        indexDict[tokens[0]] = [tuple(str.split(t, '=')) for t in tokens[1:]]
+    return indexDict
+
+#
+# Purpose: Archive the input file and reports of a run
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: writes to the file system
+# Throws: OSError if a file cannot be read or written
+#
+def store(timestamp, inputFile, reportFiles):
+    if not os.path.isdir(objectDir):
+        os.makedirs(objectDir)
+
+    entries = []
+    for fileName in [inputFile] + reportFiles:
+        if not os.path.exists(fileName):
+            continue
+        digest = storeFile(fileName)
+        entries.append('%s=%s' % (os.path.basename(fileName), digest))
+        print('%s %s' % (digest, fileName))
+
+    fp = open(indexFile, 'a')
+    fp.write('%s%s%s%s' % (timestamp, TAB, str.join(TAB, entries), CRT))
+    fp.close()
+    return
+
+#
+# Purpose: Print the index entry of a run, or write one of its files
+#	to stdout
+# Returns: 0 if found, else 1
+# Assumes: Nothing
+# Effects: writes to stdout
+# Throws: Nothing
+#
+def get(timestamp, fileName = None):
+    indexDict = readIndex()
+    if timestamp not in indexDict:
+        sys.stderr.write('No archived run: %s%s' % (timestamp, CRT))
+        return 1
+
+    for name, digest in indexDict[timestamp]:
+        if fileName is None:
+            print('%s%s%s' % (name, TAB, digest))
+        elif name == os.path.basename(fileName):
+            emalFile.catFile(findObject(digest))
+            return 0
+
+    if fileName is None:
+        return 0
+    sys.stderr.write('%s not archived for run %s%s' % (fileName, timestamp, CRT))
+    return 1
+
+#
+# MAIN
+#
+if __name__ == '__main__':
+    if not storeDir:
+        print('ARCHIVE_STORE is not defined')
+        sys.exit(1)
+    indexFile = os.path.join(storeDir, 'index')
+    objectDir = os.path.join(storeDir, 'objects')
+
+    if len(sys.argv) >= 4 and sys.argv[1] == 'store':
+        store(sys.argv[2], sys.argv[3], sys.argv[4:])
+        sys.exit(0)
+    elif len(sys.argv) in (3, 4) and sys.argv[1] == 'get':
+        sys.exit(get(*sys.argv[2:]))
+    elif len(sys.argv) == 2 and sys.argv[1] == 'list':
+        if os.path.exists(indexFile):
+            sys.stdout.write(open(indexFile, 'r').read())
+        sys.exit(0)
+
+    print(USAGE)
+    sys.exit(1)
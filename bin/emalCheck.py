@@ -0,0 +1,460 @@
+#
+#  emalCheck.py
+###########################################################################
+#
+#  Purpose:
+#
+#       QC of a single GenTar record, for curators: which 7.2 rules an
+#	input line goes through, which of them fire and the MGI alleles it
+#	matches, without running the load or querying the database.
+#
+#	The line is run through createAlleleFile() of makeIMPC.py, so the
+#	rules are those of the load. The lookups come from the lookup
+#	snapshot, a SQLite copy of the makeIMPC.py lookups written by the
+#	load (and refreshed by the loader daemon); only the entries the
+#	line needs are read from it. The database queries of the QC
+#	(queryMGIType, queryMarkerIDs, findAlleleBySymbol) are answered
+#	from the snapshot as well.
+#
+#	The decision path is the list of the Requirement comments of
+#	createAlleleFile() whose branch was taken for the line: a
+#	requirement on an if (or elif) is in the path when the body of the
+#	if runs, one on an else when the else runs.
+#
+#  Usage:
+#
+#      emalCheck.py (--colony id | --allele id | --marker id) [--input file]
+#	   check each line of the input file (default SOURCE_COPY_INPUT_FILE)
+#	   with the colony ID, allele ID or marker ID
+#
+#      emalCheck.py --line line
+#	   check an input line (9 tab-delimited columns)
+#
+#  Env Vars:
+#
+#	See the configuration file
+#
+#	LOOKUP_SNAPSHOT - the lookup snapshot
+#
+#  Outputs:
+#
+#	The check of each line on stdout
+#
+#  Exit Codes:
+#
+#      0:  Successful completion
+#      1:  An exception occurred, or no input line was found
+#
+#  Notes:
+#
+#	The snapshot has the MGI IDs of alleles and markers only; an ID of
+#	another MGI type is reported as not in MGI (7.2.C1) by the check.
+#
+###########################################################################
+
+import sys
+import os
+import io
+import re
+import time
+import sqlite3
+import inspect
+import argparse
+import tempfile
+import db
+import emalFile
+import emalQC
+
+CRT = '\n'
+TAB = '\t'
+
+snapshotFile = os.getenv('LOOKUP_SNAPSHOT')
+
+# the snapshot connection of the check
+conn = None
+
+# the columns of an allele in the snapshot, in Allele() argument order
+ALLELE_COLUMNS = 'ak, aid, asym, ast, at, mid, ms, mk, cid'
+
+SCHEMA = '''
+create table meta (name text, value text);
+create table allele (ak integer, aid text, asym text, ast text, at text,
+    mid text, ms text, mk integer, cid text);
+create table colonyAllele (colonyKey text, pos integer, ak integer, aid text,
+    asym text, ast text, at text, mid text, ms text, mk integer, cid text);
+create table marker (id text, value text);
+create table markerAcc (mk integer, accid text);
+create table labCode (abbreviation text, term text);
+create table strain (name text, strain text);
+'''
+
+INDEXES = '''
+create index allele_idx1 on allele (aid);
+create index allele_idx2 on allele (asym);
+create index allele_idx3 on allele (mid);
+create index colonyAllele_idx1 on colonyAllele (colonyKey);
+create index marker_idx1 on marker (id);
+create index markerAcc_idx1 on markerAcc (mk);
+'''
+
+requirementFinder = re.compile(r'7\.2\.?[A-Z]')
+ifFinder = re.compile(r'(el)?if\b')
+
+#
+# Purpose: Write the lookups of makeIMPC.py to the lookup snapshot
+# Returns: Nothing
+# Assumes: the lookups have been loaded (in full), db connection
+# Effects: writes the snapshot; it is replaced when complete, so a
+#	check never reads a partial snapshot
+# Throws: sqlite3.Error, OSError if the snapshot cannot be written
+#
+def writeSnapshot(impc, fileName):
+    tmpFile = '%s.%s' % (fileName, os.getpid())
+    if os.path.exists(tmpFile):
+        os.remove(tmpFile)
+    out = sqlite3.connect(tmpFile)
+    out.executescript(SCHEMA)
+
+    out.execute('insert into meta values (?, ?)',
+        ('created', time.strftime('%Y-%m-%d %H:%M:%S')))
+    out.executemany('insert into allele values (?,?,?,?,?,?,?,?,?)',
+        [(a.ak, a.aid, a.asym, a.ast, a.at, a.mid, a.ms, a.mk, a.cid)
+        for a in impc.alleleByIDDict.values()])
+    out.executemany('insert into colonyAllele values (?,?,?,?,?,?,?,?,?,?,?)',
+        [(key, pos, a.ak, a.aid, a.asym, a.ast, a.at, a.mid, a.ms, a.mk, a.cid)
+        for key, alleleList in impc.colonyToAlleleDict.items()
+        for pos, a in enumerate(alleleList)])
+    out.executemany('insert into marker values (?,?)', impc.markerDict.items())
+    out.executemany('insert into labCode values (?,?)', impc.labCodeDict.items())
+    out.executemany('insert into strain values (?,?)', impc.strainDict.items())
+
+    # the marker IDs for the secondary marker ID check (queryMarkerIDs)
+    results = db.sql('''select _Object_key, accid
+        from ACC_Accession
+        where _MGIType_key = 2
+        and _LogicalDB_key = 1''', 'auto')
+    out.executemany('insert into markerAcc values (?,?)',
+        [(r['_Object_key'], r['accid']) for r in results])
+
+    out.executescript(INDEXES)
+    out.commit()
+    out.close()
+    os.replace(tmpFile, fileName)
+    return
+
+#
+# Purpose: Query the snapshot
+# Returns: list of rows
+# Assumes: the snapshot is open
+# Effects: Nothing
+# Throws: sqlite3.Error
+#
+def snapshotQuery(command, args = ()):
+    return conn.execute(command, args).fetchall()
+
+#
+# Purpose: Open the snapshot and set up makeIMPC.py to check lines
+#	against it
+# Returns: the creation date of the snapshot
+# Assumes: Nothing
+# Effects: Sets global variables; sets the state of makeIMPC.py
+# Throws: sqlite3.Error if the snapshot cannot be read
+#
+def openSnapshot(impc, fileName):
+    global conn
+
+    # the QC of makeIMPC.py, answered from the snapshot; the spools of
+    # the check are kept apart from those of a load; no suggestions
+    # (QC_SUGGEST_K), as the snapshot lookups are read per line
+    os.environ['QC_SUGGEST_K'] = '0'
+    impc.configure()
+    impc.queryMGIType = queryMGIType
+    impc.queryMarkerIDs = queryMarkerIDs
+    impc.findAlleleBySymbol = findAlleleBySymbol
+    emalQC.spoolDir = tempfile.mkdtemp(prefix = 'emalcheck.')
+    emalQC.jsonFile = None
+
+    conn = sqlite3.connect('file:%s?mode=ro' % fileName, uri = True)
+    impc.labCodeDict.update(snapshotQuery('select abbreviation, term from labCode'))
+    impc.strainDict.update(snapshotQuery('select name, strain from strain'))
+    return snapshotQuery("select value from meta where name = 'created'")[0][0]
+
+#
+# Purpose: Load the lookup entries an input line needs from the snapshot
+# Returns: Nothing
+# Assumes: the snapshot is open
+# Effects: Sets the lookups of makeIMPC.py
+# Throws: sqlite3.Error
+#
+def loadEntries(impc, tokens):
+    markerID, colonyID, alleleID = tokens[1], tokens[2], tokens[8]
+
+    key = impc.colonyKey(colonyID)
+    rows = snapshotQuery('''select %s from colonyAllele where colonyKey = ?
+        order by pos''' % ALLELE_COLUMNS, (key,))
+    if rows:
+        impc.colonyToAlleleDict[key] = [impc.Allele(*r) for r in rows]
+
+    for r in snapshotQuery('select %s from allele where aid = ?' % \
+            ALLELE_COLUMNS, (alleleID,)):
+        impc.alleleByIDDict[alleleID] = impc.Allele(*r)
+
+    for r in snapshotQuery('select value from marker where id = ?', (markerID,)):
+        impc.markerDict[markerID] = r[0]
+    return
+
+#
+# Purpose: The MGI type of an ID, from the snapshot (queryMGIType)
+# Returns: '' if the ID is not an allele or marker ID, else the table name
+# Assumes: the snapshot is open
+# Effects: Nothing
+# Throws: sqlite3.Error
+#
+def queryMGIType(id):
+    if snapshotQuery('select 1 from allele where aid = ?', (id,)):
+        return 'ALL_Allele'
+    if snapshotQuery('select 1 from marker where id = ?', (id,)):
+        return 'MRK_Marker'
+    return ''
+
+#
+# Purpose: The MGI IDs of a marker, from the snapshot (queryMarkerIDs)
+# Returns: list of {'accid' : id}
+# Assumes: the snapshot is open
+# Effects: Nothing
+# Throws: sqlite3.Error
+#
+def queryMarkerIDs(markerKey):
+    return [{'accid' : r[0]} for r in \
+        snapshotQuery('select accid from markerAcc where mk = ?', (markerKey,))]
+
+#
+# Purpose: The alleles with a symbol, from the snapshot (findAlleleBySymbol)
+# Returns: list of {'status', 'symbol', 'accid', '_Allele_key'}
+# Assumes: the snapshot is open
+# Effects: adds the alleles to the allele lookup of makeIMPC.py, as
+#	the 7.2.H2 check looks the matched allele up by its ID
+# Throws: sqlite3.Error
+#
+def findAlleleBySymbol(symbol):
+    import makeIMPC
+
+    results = []
+    for r in snapshotQuery('select %s from allele where asym = ?' % \
+            ALLELE_COLUMNS, (symbol,)):
+        allele = makeIMPC.Allele(*r)
+        makeIMPC.alleleByIDDict[allele.aid] = allele
+        results.append({'status' : allele.ast, 'symbol' : allele.asym,
+            'accid' : allele.aid, '_Allele_key' : allele.ak})
+    return results
+
+#
+# Purpose: Find the Requirement comments of createAlleleFile() and the
+#	line whose execution means the branch of the requirement was taken
+# Returns: list of (line number, requirement text), in source order
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def requirementLines(impc):
+    lines, start = inspect.getsourcelines(impc.createAlleleFile)
+
+    def codeOf(j):
+        return str.strip(lines[j].partition('#')[0])
+
+    def nextCode(j):
+        # the next line of code after line j (an else is not traced)
+        j += 1
+        while j < len(lines) and codeOf(j) in ('', 'else:'):
+            j += 1
+        return j
+
+    requirementList = []
+    for i, line in enumerate(lines):
+        code, sep, comment = line.partition('#')
+        if not sep or not requirementFinder.search(comment) \
+                or 'Requirement' not in comment and 'BEGIN' not in comment:
+            continue
+        text = str.join(' ', str.split(comment.replace('Requirement', '') \
+            .replace('BEGIN', '')))
+
+        # the line itself, or the next line of code
+        j = i
+        if str.strip(code) in ('', 'else:'):
+            j = nextCode(i)
+
+        # the condition of an if (or elif) runs whether or not its
+        # branch is taken: the first line of its body
+        if ifFinder.match(codeOf(j)):
+            while j < len(lines) and not codeOf(j).endswith(':'):
+                j += 1
+            j = nextCode(j)
+        requirementList.append((start + j, text))
+    return requirementList
+
+#
+# Purpose: Run createAlleleFile() on one input line, tracing its lines
+# Returns: (QC entries [(rule, category, {field: value})], decision path
+#	[requirement text], outcome, allele file line)
+# Assumes: the snapshot is open
+# Effects: Sets the state of makeIMPC.py
+# Throws: the exceptions of createAlleleFile()
+#
+def checkLine(impc, line, requirementList):
+    impc.resetQC()
+    emalQC.closeInput()
+    impc.fpIMPC = io.BytesIO(('header%s%s%s' % (CRT, line, CRT)).encode())
+    impc.fpAllele = io.StringIO()
+    impc.fpNoteload = io.StringIO()
+    loadEntries(impc, [str.strip(t) for t in str.split(line, TAB)] + [''] * 9)
+
+    # {line number: order of its first execution}
+    executedDict = {}
+    code = impc.createAlleleFile.__code__
+
+    def traceLine(frame, event, arg):
+        if event == 'line':
+            executedDict.setdefault(frame.f_lineno, len(executedDict))
+        return traceLine
+
+    def traceCall(frame, event, arg):
+        if frame.f_code is code:
+            return traceLine
+        return None
+
+    sys.settrace(traceCall)
+    try:
+        impc.createAlleleFile()
+    finally:
+        sys.settrace(None)
+
+    entryList = []
+    for spool in emalQC.spoolList:
+        for entry in spool.entries():
+            entryList.append((spool.rule, spool.name,
+                dict(zip(spool.fieldNames, entry[2:]))))
+
+    pathList = [text for lineNum, text in sorted(
+        [r for r in requirementList if r[0] in executedDict],
+        key = lambda r: executedDict[r[0]])]
+
+    if impc.allelesFoundCt:
+        outcome = 'allele found in MGI'
+    elif impc.linesLoadedCt:
+        outcome = 'new allele'
+    else:
+        outcome = 'skipped'
+    return entryList, pathList, outcome, impc.fpAllele.getvalue()
+
+#
+# Purpose: Find the lines of the input file with a colony, allele or
+#	marker ID
+# Returns: list of (line number, line)
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: OSError if the file cannot be read
+#
+def findLines(impc, fileName, colonyID = None, alleleID = None, markerID = None):
+    lineList = []
+    fp = emalFile.openFile(fileName)
+    fp.readline()
+    for lineNum, line in enumerate(fp, 2):
+        tokens = [str.strip(t) for t in str.split(line[:-1], TAB)] + [''] * 9
+        if colonyID is not None and impc.colonyKey(tokens[2]) == impc.colonyKey(colonyID) \
+                or alleleID is not None and tokens[8] == alleleID \
+                or markerID is not None and tokens[1] == markerID:
+            lineList.append((lineNum, line.rstrip('\r\n')))
+    fp.close()
+    return lineList
+
+#
+# Purpose: Write the MGI alleles matched by an ID
+# Returns: Nothing
+# Assumes: the snapshot is open
+# Effects: writes to stdout
+# Throws: sqlite3.Error
+#
+def writeMatches(label, rows):
+    if not rows:
+        print('    %s: none' % label)
+    for r in rows:
+        print('    %s: %s%s%s%s%s%s%s%s%s%s%s' % (label, r[1], TAB, r[2], TAB,
+            r[3], TAB, r[5], TAB, r[6], TAB, r[8]))
+    return
+
+#
+# Purpose: Write the check of one input line
+# Returns: Nothing
+# Assumes: the snapshot is open
+# Effects: writes to stdout
+# Throws: sqlite3.Error
+#
+def writeCheck(impc, lineNum, line, requirementList):
+    entryList, pathList, outcome, alleleLine = checkLine(impc, line, requirementList)
+    tokens = [str.strip(t) for t in str.split(line, TAB)] + [''] * 9
+
+    print('Line %s: %s' % (lineNum, line))
+    print('Decision path:')
+    for text in pathList:
+        print('    %s' % text)
+    print('QC:')
+    for rule, category, fieldDict in entryList:
+        print('    %s %s %s' % (rule, category, str.join(', ',
+            ['%s=%s' % (k, v) for k, v in fieldDict.items()])))
+    if not entryList:
+        print('    no errors')
+    print('Outcome: %s' % outcome)
+    if alleleLine:
+        print('    %s' % alleleLine.rstrip(CRT))
+
+    print('MGI alleles (ID, symbol, status, marker ID, marker symbol, colony IDs):')
+    writeMatches('colony ID', snapshotQuery('''select %s from colonyAllele
+        where colonyKey = ? order by pos''' % ALLELE_COLUMNS,
+        (impc.colonyKey(tokens[2]),)))
+    if tokens[8]:
+        writeMatches('allele ID', snapshotQuery('select %s from allele where aid = ?' % \
+            ALLELE_COLUMNS, (tokens[8],)))
+    if tokens[7]:
+        writeMatches('symbol', snapshotQuery('select %s from allele where asym = ?' % \
+            ALLELE_COLUMNS, (tokens[7],)))
+    print('')
+    return
+
+#
+# MAIN
+#
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'emalload single record QC')
+    group = parser.add_mutually_exclusive_group(required = True)
+    group.add_argument('--colony')
+    group.add_argument('--allele')
+    group.add_argument('--marker')
+    group.add_argument('--line')
+    parser.add_argument('--input', default = os.getenv('SOURCE_COPY_INPUT_FILE'))
+    parser.add_argument('--snapshot', default = snapshotFile)
+    args = parser.parse_args()
+
+    if not args.snapshot or not os.path.exists(args.snapshot):
+        print('Lookup snapshot not found: %s' % args.snapshot)
+        sys.exit(1)
+
+    import makeIMPC as impc
+
+    created = openSnapshot(impc, args.snapshot)
+    print('Lookup snapshot: %s (%s)%s' % (args.snapshot, created, CRT))
+
+    if args.line is not None:
+        lineList = [(1, args.line)]
+    else:
+        lineList = findLines(impc, args.input, args.colony, args.allele, args.marker)
+        if not lineList:
+            print('Not in %s' % args.input)
+
+    requirementList = requirementLines(impc)
+    for lineNum, line in lineList:
+        writeCheck(impc, lineNum, line, requirementList)
+
+    emalQC.removeSpools()
+    os.rmdir(emalQC.spoolDir)
+    conn.close()
+    sys.exit(int(not lineList))
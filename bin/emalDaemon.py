@@ -0,0 +1,355 @@
+#
+#  emalDaemon.py
+###########################################################################
+#
+#  Purpose:
+#
+#       The warm loader daemon: a long-running process that keeps the
+#	makeIMPC.py lookups in memory, so a new GenTar file is QC'd
+#	without the cold start of a scheduled run (Python startup, database
+#	connect and the full lookup load).
+#
+#	Every DAEMON_POLL_SECONDS the daemon checks the content of
+#	SOURCE_INPUT_FILE; when it has changed the load (emalload.sh) is
+#	run. The QC step of the load (emalload.py) asks the daemon, over
+#	its unix socket, to run the QC (makeIMPC.runWarm) on the warm
+#	lookups. The other steps of the load are run by emalload.py as
+#	always.
+#
+#	Every DAEMON_REFRESH_SECONDS, after each load and before each QC,
+#	the lookups whose source tables have changed (row count or latest
+#	modification date) are reloaded (makeIMPC.refreshLookups).
+#
+#  Usage:
+#
+#      emalDaemon.py start config
+#	   run the daemon (in the foreground, see emalDaemon.sh)
+#
+#      emalDaemon.py qc
+#	   run the QC of SOURCE_COPY_INPUT_FILE in the daemon, as run
+#	   RUN_ID; the output of the QC is written to stdout
+#
+#      emalDaemon.py status
+#	   print the state of the daemon
+#
+#      emalDaemon.py stop
+#	   stop the daemon
+#
+#  Env Vars:
+#
+#	See the configuration file (DAEMON_*)
+#
+#	DAEMON_SOCKET - the unix socket of the daemon
+#	DAEMON_POLL_SECONDS - input file poll interval
+#	DAEMON_REFRESH_SECONDS - lookup refresh interval
+#
+#  Exit Codes:
+#
+#      0:  Successful completion
+#      1:  An exception occurred (qc: the QC failed)
+#      2:  No daemon is listening on DAEMON_SOCKET
+#
+#  Notes:
+#
+#	The daemon runs one load at a time and a QC request is served by
+#	the daemon process itself, so the lookups are never refreshed
+#	while a QC is running.
+#
+###########################################################################
+
+import sys
+import os
+import io
+import time
+import select
+import signal
+import socket
+import contextlib
+import subprocess
+import traceback
+import db
+import emalFile
+import emalSql
+import makeIMPC
+
+CRT = '\n'
+
+USAGE = 'Usage: emalDaemon.py start config | qc | status | stop'
+
+socketFile = os.getenv('DAEMON_SOCKET')
+pollSeconds = float(os.getenv('DAEMON_POLL_SECONDS') or 30)
+refreshSeconds = float(os.getenv('DAEMON_REFRESH_SECONDS') or 600)
+inputFile = os.getenv('SOURCE_INPUT_FILE')
+lastRunFile = os.path.join(os.getenv('INPUTDIR') or '.', 'lastrun')
+emalload = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'emalload.sh')
+
+# 0 when the daemon is to stop
+running = 1
+
+# the load in progress (subprocess.Popen), None if none
+loadProcess = None
+
+# the (size, modification time) and the hash of the input file last seen
+inputStat = None
+inputHash = None
+
+# the time of the last lookup load or refresh; 0 if the lookups have
+# to be loaded again (after a database error)
+refreshTime = 0
+
+# the state reported by 'status'
+# {name: value, ...}
+stateDict = {}
+
+#
+# Purpose: Write a message to the daemon log (stdout)
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: writes to stdout
+# Throws: Nothing
+#
+def log(message):
+    print('%s %s' % (time.strftime('%Y-%m-%d %H:%M:%S'), message))
+    sys.stdout.flush()
+    return
+
+#
+# Purpose: Load the lookups or reload those whose tables have changed
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Sets global variables; queries the database
+# Throws: Nothing
+#
+def refresh():
+    global refreshTime
+
+    start = time.time()
+    try:
+        if refreshTime == 0:
+            makeIMPC.loadWarm()
+            nameList = list(makeIMPC.lookupSourceDict)
+        else:
+            nameList = makeIMPC.refreshLookups()
+    except:
+        log('lookup refresh failed%s%s' % (CRT, traceback.format_exc()))
+        # reconnect and load the lookups again at the next refresh
+        try:
+            db.useOneConnection(0)
+        except:
+            pass
+        refreshTime = 0
+        return
+
+    refreshTime = time.time()
+    stateDict['refreshed'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    if nameList:
+        stateDict['reloaded'] = str.join(', ', nameList)
+        log('lookups reloaded: %s (%.2f sec, lookup memory %.1f MB)' % \
+            (stateDict['reloaded'], refreshTime - start,
+            makeIMPC.lookupBytes / 1048576.0))
+        makeIMPC.writeSnapshot()
+    return
+
+#
+# Purpose: Check whether the content of the input file has changed
+# Returns: 1 if it has changed since it was last seen, else 0
+# Assumes: Nothing
+# Effects: Sets global variables; reads the input file if its size or
+#	modification time has changed
+# Throws: Nothing
+#
+def inputChanged():
+    global inputStat, inputHash
+
+    try:
+        st = os.stat(inputFile)
+        if (st.st_size, st.st_mtime) == inputStat:
+            return 0
+        digest = emalFile.hashFile(inputFile)
+    except OSError:
+        return 0
+
+    inputStat = (st.st_size, st.st_mtime)
+    if digest == inputHash:
+        return 0
+    inputHash = digest
+    stateDict['input'] = digest
+    return 1
+
+#
+# Purpose: Run the load (emalload.sh) of a new input file
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Sets global variables; starts emalload.sh
+# Throws: Nothing
+#
+def startLoad(config):
+    global loadProcess
+
+    log('new input file %s (%s), starting %s' % (inputFile, inputHash, emalload))
+    loadProcess = subprocess.Popen(['sh', emalload, config])
+    stateDict['load'] = 'running since %s' % time.strftime('%Y-%m-%d %H:%M:%S')
+    return
+
+#
+# Purpose: Serve one request of a client
+# Returns: Nothing
+# Assumes: the lookups are loaded
+# Effects: Sets global variables; runs the QC (qc)
+# Throws: Nothing
+#
+def serveRequest(conn):
+    global running
+
+    request = str.split(conn.makefile('r').readline())
+    request, argList = (request[0], request[1:]) if request else ('', [])
+    status = 0
+    output = io.StringIO()
+
+    if request == 'qc':
+        start = time.time()
+        # the QC of a load sees the database as a cold run does: the
+        # lookups whose tables changed since the last refresh are reloaded
+        refresh()
+        if refreshTime == 0:
+            output.write('lookup refresh failed, see the daemon log%s' % CRT)
+            status = 1
+        else:
+            try:
+                with contextlib.redirect_stdout(output):
+                    status = makeIMPC.runWarm(*argList[:1])
+            except SystemExit as e:
+                status = e.code or 0
+            except:
+                output.write(traceback.format_exc())
+                status = 1
+        stateDict['qc'] = 'status %s at %s (%.2f sec)' % \
+            (status, time.strftime('%Y-%m-%d %H:%M:%S'), time.time() - start)
+        log('qc %s' % stateDict['qc'])
+    elif request == 'status':
+        output.write('pid: %s%s' % (os.getpid(), CRT))
+        for name in sorted(stateDict):
+            output.write('%s: %s%s' % (name, stateDict[name], CRT))
+    elif request == 'stop':
+        running = 0
+    else:
+        output.write('Unknown request: %s%s' % (request, CRT))
+        status = 1
+
+    try:
+        conn.sendall(('%s%s%s' % (status, CRT, output.getvalue())).encode())
+    except OSError:
+        pass
+    conn.close()
+    return
+
+#
+# Purpose: Stop the daemon at the next poll (SIGTERM)
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Sets global variables
+# Throws: Nothing
+#
+def stop(signum, frame):
+    global running
+
+    running = 0
+    return
+
+#
+# Purpose: Run the daemon until it is stopped
+# Returns: 0
+# Assumes: the configuration has been sourced
+# Effects: creates the socket, runs the loads
+# Throws: socket.error if the socket cannot be created
+#
+def serve(config):
+    global inputStat, inputHash, loadProcess
+
+    if os.path.exists(socketFile):
+        os.remove(socketFile)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socketFile)
+    server.listen(5)
+    signal.signal(signal.SIGTERM, stop)
+
+    # the loads run emalload.sh, which sends its QC to this daemon
+    os.environ['DAEMON_SOCKET'] = socketFile
+
+    log('starting, pid %s' % os.getpid())
+    stateDict['started'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    emalSql.install()
+    refresh()
+
+    # an input file already loaded (lastrun is newer) is not loaded again
+    if os.path.exists(lastRunFile) and os.path.exists(inputFile) \
+            and os.path.getmtime(lastRunFile) > os.path.getmtime(inputFile):
+        inputChanged()
+
+    while running:
+        readable, writable, errors = select.select([server], [], [], pollSeconds)
+        if readable:
+            conn, address = server.accept()
+            serveRequest(conn)
+
+        if loadProcess is not None and loadProcess.poll() is not None:
+            log('%s exited with status %s' % (emalload, loadProcess.returncode))
+            stateDict['load'] = 'status %s at %s' % \
+                (loadProcess.returncode, time.strftime('%Y-%m-%d %H:%M:%S'))
+            loadProcess = None
+            # pick up the alleles and notes of the load
+            refresh()
+
+        if loadProcess is None:
+            if refreshTime == 0 or time.time() - refreshTime >= refreshSeconds:
+                refresh()
+            if running and inputChanged():
+                startLoad(config)
+
+    log('stopping')
+    if loadProcess is not None:
+        loadProcess.wait()
+    server.close()
+    os.remove(socketFile)
+    db.useOneConnection(0)
+    return 0
+
+#
+# Purpose: Send a request to the daemon and write its output to stdout
+# Returns: the status of the request, 2 if no daemon is listening
+# Assumes: Nothing
+# Effects: writes to stdout
+# Throws: Nothing
+#
+def sendRequest(request):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socketFile)
+    except (OSError, TypeError):
+        return 2
+
+    client.sendall(('%s%s' % (request, CRT)).encode())
+    reply = b''
+    data = client.recv(65536)
+    while data:
+        reply += data
+        data = client.recv(65536)
+    client.close()
+
+    status, output = str.split(reply.decode() or '1%s' % CRT, CRT, 1)
+    sys.stdout.write(output)
+    return int(status)
+
+#
+# MAIN
+#
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == 'start':
+        sys.exit(serve(sys.argv[2]))
+    elif len(sys.argv) == 2 and sys.argv[1] in ('qc', 'status', 'stop'):
+        if sys.argv[1] == 'qc' and os.getenv('RUN_ID'):
+            sys.exit(sendRequest('qc %s' % os.getenv('RUN_ID')))
+        sys.exit(sendRequest(sys.argv[1]))
+
+    print(USAGE)
+    sys.exit(1)
@@ -0,0 +1,82 @@
+#!/bin/sh
+#
+#  emalDaemon.sh
+###########################################################################
+#
+#  Purpose:
+#
+#      This script is a wrapper around the warm loader daemon
+#	(emalDaemon.py), which keeps the makeIMPC.py lookups in memory and
+#	runs the load (emalload.sh) when a new input file arrives
+#
+Usage="Usage: emalDaemon.sh config [stop|status]"
+#
+#  Env Vars:
+#
+#      See the configuration file
+#
+#  Inputs:  None
+#
+#  Outputs:
+#
+#      - Daemon log file (${DAEMON_LOG})
+#
+#  Exit Codes:
+#
+#      0:  Successful completion
+#      1:  Fatal error occurred
+#
+#  Assumes:  Nothing
+#
+#  Implementation:
+#
+#      This script will perform following steps:
+#
+#      1) Source the configuration file to establish the environment.
+#      2) Run emalDaemon.py in the background, or send it a request.
+#
+#  Notes:  None
+#
+###########################################################################
+
+cd `dirname $0`
+
+if [ $# -lt 1 ]
+then
+    echo ${Usage}
+    exit 1
+fi
+
+CONFIG=$1
+
+#
+# Make sure the configuration file exists and source it.
+#
+if [ -f ${CONFIG} ]
+then
+    . ${CONFIG}
+else
+    echo "Missing configuration file: ${CONFIG}"
+    exit 1
+fi
+
+if [ $# -gt 1 ]
+then
+    ${PYTHON} ./emalDaemon.py $2
+    exit $?
+fi
+
+#
+# Start the daemon unless it is already running
+#
+${PYTHON} ./emalDaemon.py status > /dev/null
+if [ $? -ne 2 ]
+then
+    echo "emalDaemon.py is already running: ${DAEMON_SOCKET}"
+    exit 1
+fi
+
+CONFIG=`cd \`dirname ${CONFIG}\`; pwd`/`basename ${CONFIG}`
+nohup ${PYTHON} ./emalDaemon.py start ${CONFIG} >> ${DAEMON_LOG} 2>&1 &
+echo "emalDaemon.py started, see ${DAEMON_LOG}"
+exit 0
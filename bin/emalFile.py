@@ -0,0 +1,205 @@
+#
+#  emalFile.py
+###########################################################################
+#
+#  Purpose:
+#
+#       Read and archive (optionally) compressed GenTar input files.
+#	gzip and zstd input is detected from the file's magic number and
+#	decompressed as a stream, so the loaders never need an uncompressed
+#	copy on disk.
+#
+#  Usage:
+#
+#	As a library:
+#
+#	    fp = emalFile.openFile(fileName)
+#
+#	From the wrapper scripts:
+#
+#	    emalFile.py cat fileName
+#		writes the (decompressed) file to stdout
+#
+#	    emalFile.py compress fileName archiveName
+#		writes fileName to archiveName plus a suffix for the
+#		compression method (ARCHIVE_COMPRESSION) and prints the
+#		name of the archive file. A file that is already compressed
+#		is copied as is.
+#
+#  Env Vars:
+#
+#	ARCHIVE_COMPRESSION - gzip, zstd or none (default gzip)
+#
+#  Exit Codes:
+#
+#      0:  Successful completion
+#      1:  An exception occurred
+#
+#  Notes:
+#
+#	zstd uses the standard library compression.zstd module (python 3.14)
+#	if available, otherwise the zstandard package.
+#
+###########################################################################
+
+import sys
+import os
+import io
+import gzip
+import hashlib
+import shutil
+
+USAGE = 'Usage: emalFile.py cat fileName\n' + \
+        '       emalFile.py compress fileName archiveName'
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# {compression method: archive file suffix, ...}
+suffixDict = {'gzip' : '.gz', 'zstd' : '.zst', 'none' : ''}
+
+# copy buffer size
+BLOCKSIZE = 1024 * 1024
+
+#
+# Purpose: Find the compression method of a file from its magic number
+# Returns: 'gzip', 'zstd' or 'none'
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: OSError if the file cannot be read
+#
+def compressionOf(fileName):
+    fp = open(fileName, 'rb')
+    magic = fp.read(4)
+    fp.close()
+    if magic[:2] == GZIP_MAGIC:
+        return 'gzip'
+    if magic == ZSTD_MAGIC:
+        return 'zstd'
+    return 'none'
+
+#
+# Purpose: Open a binary zstd stream for reading or writing
+# Returns: binary file object
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: ImportError if no zstd module is installed
+#
+def openZstd(fileName, mode):
+    try:
+        from compression import zstd
+        return zstd.open(fileName, mode)
+    except ImportError:
+        pass
+
+    import zstandard
+    if mode == 'rb':
+        return zstandard.ZstdDecompressor().stream_reader(open(fileName, 'rb'),
+                read_across_frames = True, closefd = True)
+    return zstandard.ZstdCompressor().stream_writer(open(fileName, 'wb'),
+                closefd = True)
+
+#
+# Purpose: Open a file, compressed or not, for reading as bytes
+# Returns: binary file object of the decompressed content
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: OSError if the file cannot be opened
+#
+def openBinary(fileName):
+    method = compressionOf(fileName)
+    if method == 'gzip':
+        return gzip.open(fileName, 'rb')
+    if method == 'zstd':
+        return openZstd(fileName, 'rb')
+    return open(fileName, 'rb')
+
+#
+# Purpose: Open a file, compressed or not, for reading as text
+# Returns: text file object
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: OSError if the file cannot be opened
+#
+def openFile(fileName):
+    if compressionOf(fileName) == 'none':
+        return open(fileName, 'r')
+    return io.TextIOWrapper(openBinary(fileName))
+
+#
+# Purpose: Compute the sha256 of the decompressed content of a file
+# Returns: hex digest
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: OSError if the file cannot be read
+#
+def hashFile(fileName):
+    digest = hashlib.sha256()
+    fpIn = openBinary(fileName)
+    block = fpIn.read(BLOCKSIZE)
+    while block:
+        digest.update(block)
+        block = fpIn.read(BLOCKSIZE)
+    fpIn.close()
+    return digest.hexdigest()
+
+#
+# Purpose: Write a file to stdout decompressing it if needed
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: writes to stdout
+# Throws: OSError if the file cannot be read
+#
+def catFile(fileName):
+    fpIn = openBinary(fileName)
+    shutil.copyfileobj(fpIn, sys.stdout.buffer, BLOCKSIZE)
+    fpIn.close()
+    return
+
+#
+# Purpose: Write a compressed copy of a file
+# Returns: the name of the compressed file (archiveName plus suffix)
+# Assumes: Nothing
+# Effects: writes to the file system
+# Throws: OSError if a file cannot be read or written
+#
+def compressFile(fileName, archiveName, method = None):
+    if method is None:
+        method = os.getenv('ARCHIVE_COMPRESSION', 'gzip')
+    if method not in suffixDict:
+        raise ValueError('Unknown compression method: %s' % method)
+
+    # already compressed; don't compress again
+    inMethod = compressionOf(fileName)
+    if inMethod != 'none':
+        archiveName = archiveName + suffixDict[inMethod]
+        shutil.copyfile(fileName, archiveName)
+        shutil.copystat(fileName, archiveName)
+        return archiveName
+
+    archiveName = archiveName + suffixDict[method]
+    fpIn = open(fileName, 'rb')
+    if method == 'gzip':
+        fpOut = gzip.open(archiveName, 'wb')
+    elif method == 'zstd':
+        fpOut = openZstd(archiveName, 'wb')
+    else:
+        fpOut = open(archiveName, 'wb')
+    shutil.copyfileobj(fpIn, fpOut, BLOCKSIZE)
+    fpOut.close()
+    fpIn.close()
+    shutil.copystat(fileName, archiveName)
+    return archiveName
+
+#
+# MAIN
+#
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == 'cat':
+        catFile(sys.argv[2])
+    elif len(sys.argv) == 4 and sys.argv[1] == 'compress':
+        print(compressFile(sys.argv[2], sys.argv[3]))
+    else:
+        print(USAGE)
+        sys.exit(1)
+    sys.exit(0)
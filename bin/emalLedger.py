@@ -0,0 +1,236 @@
+#
+#  emalLedger.py
+###########################################################################
+#
+#  Purpose:
+#
+#       The allele ledger: a cumulative, append-only SQLite record of
+#	every allele this load created and every allele it annotated
+#	with a colony ID note, with the run, the hash of the input file
+#	and the input line, indexed by colony ID and by allele, so the
+#	provenance of an allele can be looked up without querying MGD.
+#
+#	The QC (makeIMPC.py) stages the alleles of the allele file and
+#	the colony ID notes of the run (stage()); once the load has
+#	committed them, 'record' appends them to the ledger. The alleles
+#	created are matched to their new MGI IDs by symbol in the new
+#	allele report of makeAllele.py.
+#
+#  Usage:
+#
+#      emalLedger.py record [--alleles file]
+#	   record the staged colony ID notes of the last run and, with
+#	   --alleles, the alleles of the new allele report (NEW_ALLELE_RPT)
+#
+#      emalLedger.py query (--colony id | --allele id-or-symbol)
+#	   print the ledger entries of the colony or allele
+#
+#      emalLedger.py runs
+#	   print the recorded runs and their entry counts
+#
+#  Env Vars:
+#
+#	LEDGER_FILE - the ledger; not written if not set
+#
+#  Outputs:
+#
+#	${LEDGER_FILE} table entry (append-only):
+#	    seq, run, inputHash, line, action ('created', 'annotated'),
+#	    alleleID, alleleSymbol, markerID, colonyID, recorded (date)
+#
+#	table run: run, inputHash, inputFile, staged, recorded (date,
+#	    null until the run is recorded)
+#
+#	table pending: the staged entries of the last run, removed when
+#	    the run is recorded
+#
+#  Exit Codes:
+#
+#      0:  Successful completion
+#      1:  An exception occurred
+#
+#  Notes:
+#
+#	Only the last staged run can be recorded: a run that failed
+#	before it was recorded is dropped when the next run is staged.
+#	A makeAllele.py --resume records the run it resumes.
+#
+###########################################################################
+
+import sys
+import os
+import time
+import sqlite3
+import argparse
+
+CRT = '\n'
+TAB = '\t'
+
+ledgerFile = os.getenv('LEDGER_FILE')
+
+SCHEMA = '''
+    create table if not exists run (run text primary key, inputHash text,
+        inputFile text, staged text, recorded text);
+    create table if not exists pending (run text, action text, line integer,
+        alleleID text, alleleSymbol text, markerID text, colonyID text);
+    create table if not exists entry (seq integer primary key, run text,
+        inputHash text, line integer, action text, alleleID text,
+        alleleSymbol text, markerID text, colonyID text, recorded text);
+    create index if not exists entry_idx1 on entry (colonyID collate nocase);
+    create index if not exists entry_idx2 on entry (alleleID);
+    create index if not exists entry_idx3 on entry (alleleSymbol);
+    create index if not exists entry_idx4 on entry (run);
+    create trigger if not exists entry_update before update on entry
+        begin select raise(abort, 'the ledger is append-only'); end;
+    create trigger if not exists entry_delete before delete on entry
+        begin select raise(abort, 'the ledger is append-only'); end;'''
+
+#
+# Purpose: Open the ledger, creating its tables if needed
+# Returns: sqlite3 connection
+# Assumes: Nothing
+# Effects: creates the ledger file
+# Throws: sqlite3.Error if the ledger cannot be opened
+#
+def connect():
+    conn = sqlite3.connect(ledgerFile)
+    conn.executescript(SCHEMA)
+    return conn
+
+#
+# Purpose: Stage the entries of a run, to be recorded by record()
+#	once the load has committed them
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: writes the ledger; the staged entries of earlier runs
+#	that were not recorded are removed
+# Throws: sqlite3.Error if the ledger cannot be written
+#
+def stage(run,          # str.- the run (RUN_ID)
+        inputHash,      # str.- sha256 of the input file
+        inputFile,      # str.- the input file
+        rowList):       # list - (action, line, allele ID, allele symbol,
+                        #   marker ID, colony ID); the allele ID of a
+                        #   created allele is ''
+    if not ledgerFile:
+        return
+
+    conn = connect()
+    conn.execute('delete from pending')
+    conn.execute('delete from run where recorded is null')
+    conn.execute('insert or replace into run values (?,?,?,?,null)',
+        (run, inputHash, inputFile, time.strftime('%Y-%m-%d %H:%M:%S')))
+    conn.executemany('insert into pending values (?,?,?,?,?,?,?)',
+        [(run,) + tuple(r) for r in rowList])
+    conn.commit()
+    conn.close()
+    return
+
+#
+# Purpose: Append the staged entries of the last run to the ledger
+# Returns: (the run, number of entries), (None, 0) if no run is staged
+# Assumes: the load of the staged run has committed
+# Effects: writes the ledger
+# Throws: sqlite3.Error if the ledger cannot be written, OSError if
+#	the new allele report cannot be read
+#
+def record(newAlleleFile = None): # the new allele report, None if the
+                                  #   run created no alleles
+    conn = connect()
+    r = conn.execute('''select run, inputHash from run where recorded is null
+        order by run desc limit 1''').fetchone()
+    if r is None:
+        conn.close()
+        return (None, 0)
+    run, inputHash = r
+    recorded = time.strftime('%Y-%m-%d %H:%M:%S')
+
+    entryList = []
+    for r in conn.execute('''select line, alleleID, alleleSymbol, markerID, colonyID
+            from pending where run = ? and action = 'annotated' order by line''', (run,)):
+        entryList.append((run, inputHash, r[0], 'annotated') + tuple(r[1:]) + (recorded,))
+
+    # the new allele report: allele ID, symbol, name, marker ID, marker
+    # symbol, colony ID
+    if newAlleleFile is not None:
+        lineDict = dict(conn.execute('''select alleleSymbol, line from pending
+            where run = ? and action = 'created' ''', (run,)))
+        for line in open(newAlleleFile, 'r'):
+            tokens = str.split(line[:-1], TAB)
+            if len(tokens) < 6 or not tokens[0]:
+                continue
+            entryList.append((run, inputHash, lineDict.get(tokens[1]), 'created',
+                tokens[0], tokens[1], tokens[3], tokens[5], recorded))
+
+    conn.executemany('''insert into entry (run, inputHash, line, action, alleleID,
+        alleleSymbol, markerID, colonyID, recorded) values (?,?,?,?,?,?,?,?,?)''',
+        entryList)
+    conn.execute('update run set recorded = ? where run = ?', (recorded, run))
+    conn.execute('delete from pending where run = ?', (run,))
+    conn.commit()
+    conn.close()
+    return (run, len(entryList))
+
+#
+# Purpose: Look up the ledger entries of a colony or an allele
+# Returns: list of entry rows, oldest first
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: sqlite3.Error if the ledger cannot be read
+#
+def query(colonyID = None, allele = None): # allele - MGI ID or symbol
+    if colonyID is not None:
+        where, args = 'colonyID = ? collate nocase', (colonyID,)
+    else:
+        where, args = 'alleleID = ? or alleleSymbol = ?', (allele, allele)
+
+    conn = sqlite3.connect(ledgerFile)
+    results = conn.execute('''select run, inputHash, line, action, alleleID,
+        alleleSymbol, markerID, colonyID, recorded from entry where %s
+        order by seq''' % where, args).fetchall()
+    conn.close()
+    return results
+
+#
+# MAIN
+#
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'emalload allele ledger')
+    subparsers = parser.add_subparsers(dest = 'command')
+    recordParser = subparsers.add_parser('record')
+    recordParser.add_argument('--alleles')
+    queryParser = subparsers.add_parser('query')
+    group = queryParser.add_mutually_exclusive_group(required = True)
+    group.add_argument('--colony')
+    group.add_argument('--allele')
+    subparsers.add_parser('runs')
+    args = parser.parse_args()
+
+    if not ledgerFile:
+        print('LEDGER_FILE is not set')
+        sys.exit(args.command != 'record')
+
+    if args.command == 'record':
+        run, count = record(args.alleles)
+        if run is None:
+            print('Ledger: no staged run')
+        else:
+            print('Ledger: run %s, %s entries recorded' % (run, count))
+    elif args.command in ('query', 'runs') and not os.path.exists(ledgerFile):
+        print('Ledger not found: %s' % ledgerFile)
+        sys.exit(1)
+    elif args.command == 'query':
+        for r in query(args.colony, args.allele):
+            print(str.join(TAB, [str(v) if v is not None else '' for v in r]))
+    elif args.command == 'runs':
+        conn = sqlite3.connect(ledgerFile)
+        for r in conn.execute('''select r.run, r.inputHash, r.recorded, count(e.seq)
+                from run r left join entry e on e.run = r.run
+                group by r.run order by r.run'''):
+            print(str.join(TAB, [str(v) if v is not None else '' for v in r]))
+        conn.close()
+    else:
+        parser.print_usage()
+        sys.exit(1)
+
+    sys.exit(0)
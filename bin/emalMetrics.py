@@ -0,0 +1,178 @@
+#
+#  emalMetrics.py
+###########################################################################
+#
+#  Purpose:
+#
+#       Record per-stage timing and resource metrics for an emalload run.
+#	Each stage is appended to the metrics file as one JSON record
+#	(JSON Lines) so runs can be compared for regressions and capacity.
+#
+#  Usage:
+#
+#	As a library (python stages):
+#
+#	    emalMetrics.startStage('qc')
+#	    ...
+#	    emalMetrics.endStage('qc', rowsIn=n, rowsOut=m, counts={...})
+#
+#	From the wrapper scripts (shell stages):
+#
+#	    emalMetrics.py run stage command [args ...]
+#		runs the command and records wall time, CPU time and
+#		peak RSS of the command; exits with the command's status
+#
+#	    emalMetrics.py mark stage startSeconds
+#		records the wall time from startSeconds (date +%s) to now
+#
+#  Env Vars:
+#
+#	METRICS_FILE - the metrics file; if not set nothing is recorded
+#
+#  Outputs:
+#
+#	One JSON record per stage:
+#	    stage, script, wall, cpu (seconds), maxrss (KB), status
+#	    and optionally rowsIn, rowsOut and counts
+#
+#	maxrss is the peak RSS of the process (or child) up to the end of
+#	the stage as reported by getrusage; it is not reset between stages.
+#
+#  Exit Codes:
+#
+#      0:  Successful completion
+#      1:  An exception occurred
+#      n:  exit status of the command (run)
+#
+#  Notes:  None
+#
+###########################################################################
+
+import sys
+import os
+import time
+import json
+import resource
+import subprocess
+
+USAGE = 'Usage: emalMetrics.py run stage command [args ...]\n' + \
+        '       emalMetrics.py mark stage startSeconds'
+
+metricsFile = os.getenv('METRICS_FILE')
+
+# {stage: (wall start, cpu start), ...}
+stageStart = {}
+
+#
+# Purpose: Append one stage record to the metrics file
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: writes to the file system
+# Throws: Nothing
+#
+def writeRecord(record):
+    if not metricsFile:
+        return
+    try:
+        fp = open(metricsFile, 'a')
+        fp.write('%s\n' % json.dumps(record, sort_keys=True))
+        fp.close()
+    except:
+        # metrics must never fail the load
+        pass
+    return
+
+#
+# Purpose: Note the start of a stage in this process
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Sets global variables.
+# Throws: Nothing
+#
+def startStage(stage):
+    stageStart[stage] = (time.time(), time.process_time())
+    return
+
+#
+# Purpose: Record a stage started with startStage in this process
+# Returns: Nothing
+# Assumes: startStage has been called for 'stage'
+# Effects: writes to the file system
+# Throws: Nothing
+#
+def endStage(stage, rowsIn = None, rowsOut = None, counts = None, status = 0):
+    if stage not in stageStart:
+        return
+    wallStart, cpuStart = stageStart.pop(stage)
+    record = {
+        'stage' : stage,
+        'script' : os.path.basename(sys.argv[0]),
+        'wall' : round(time.time() - wallStart, 3),
+        'cpu' : round(time.process_time() - cpuStart, 3),
+        'maxrss' : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'status' : status }
+    if rowsIn is not None:
+        record['rowsIn'] = rowsIn
+    if rowsOut is not None:
+        record['rowsOut'] = rowsOut
+    if counts is not None:
+        record['counts'] = counts
+    writeRecord(record)
+    return
+
+#
+# Purpose: Run a command (blocking) and record it as a stage using the
+#	child resource usage
+# Returns: the exit status of the command
+# Assumes: Nothing
+# Effects: writes to the file system
+# Throws: Nothing
+#
+def runCommand(stage, command, shell = False):
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    wallStart = time.time()
+    if shell:
+        script = os.path.basename(str.split(command)[0])
+    else:
+        script = os.path.basename(command[0])
+    status = subprocess.call(command, shell = shell)
+    wall = time.time() - wallStart
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    writeRecord({
+        'stage' : stage,
+        'script' : script,
+        'wall' : round(wall, 3),
+        'cpu' : round((after.ru_utime - before.ru_utime) + \
+                (after.ru_stime - before.ru_stime), 3),
+        'maxrss' : after.ru_maxrss,
+        'status' : status })
+    return status
+
+#
+# Purpose: Record the wall time of a stage run by the wrapper script
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: writes to the file system
+# Throws: Nothing
+#
+def markStage(stage, startSeconds):
+    writeRecord({
+        'stage' : stage,
+        'script' : 'shell',
+        'wall' : round(time.time() - startSeconds, 3),
+        'status' : 0 })
+    return
+
+#
+# MAIN
+#
+if __name__ == '__main__':
+    if len(sys.argv) < 4 or sys.argv[1] not in ('run', 'mark'):
+        print(USAGE)
+        sys.exit(1)
+
+    if sys.argv[1] == 'run':
+        sys.exit(runCommand(sys.argv[2], sys.argv[3:]))
+
+    markStage(sys.argv[2], float(sys.argv[3]))
+    sys.exit(0)
@@ -0,0 +1,99 @@
+#
+#  emalProfile.py
+###########################################################################
+#
+#  Purpose:
+#
+#       Opt-in CPU and memory profiling of the stages of the emalload
+#	scripts. With LOG_PROFILE=true each stage run through run() is
+#	profiled with cProfile and tracemalloc and its statistics are
+#	written to LOGDIR; otherwise run() just calls the stage.
+#
+#  Usage:
+#
+#	if emalProfile.run('initialize', initialize) != 0:
+#	    ...
+#
+#  Env Vars:
+#
+#	LOG_PROFILE - 'true' to profile the stages
+#	LOGDIR - directory of the profile files
+#
+#  Outputs:
+#
+#	${LOGDIR}/<script>.<stage>.prof - cProfile statistics (pstats)
+#	${LOGDIR}/<script>.<stage>.prof.txt - the top functions by
+#	    cumulative time and the top allocations (tracemalloc) by line
+#
+#  Notes:
+#
+#	tracemalloc slows the stage down noticeably; the profiled
+#	timings are for comparing functions, not for the run metrics.
+#
+###########################################################################
+
+import sys
+import os
+import io
+import pstats
+import cProfile
+import tracemalloc
+
+CRT = '\n'
+
+profile = os.getenv('LOG_PROFILE') == 'true'
+profileDir = os.getenv('LOGDIR') or '.'
+
+# number of functions and allocations listed
+TOP = 30
+
+#
+# Purpose: Run a stage, profiled if LOG_PROFILE is 'true'
+# Returns: the return value of the stage
+# Assumes: Nothing
+# Effects: writes the profile files
+# Throws: the exceptions of the stage
+#
+def run(stage, function, *args):
+    if not profile:
+        return function(*args)
+
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    try:
+        return profiler.runcall(function, *args)
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        writeProfile(stage, profiler, snapshot, peak)
+
+#
+# Purpose: Write the profile files of a stage
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: writes to the file system
+# Throws: Nothing
+#
+def writeProfile(stage, profiler, snapshot, peak):
+    fileName = os.path.join(profileDir, '%s.%s.prof' % \
+        (os.path.basename(sys.argv[0]), stage))
+    try:
+        profiler.dump_stats(fileName)
+
+        text = io.StringIO()
+        stats = pstats.Stats(profiler, stream = text)
+        stats.sort_stats('cumulative').print_stats(TOP)
+
+        fp = open(fileName + '.txt', 'w')
+        fp.write('Stage: %s%s%s' % (stage, CRT, CRT))
+        fp.write(text.getvalue())
+        fp.write('%sPeak traced memory: %.1f MB%s' % (CRT, peak / 1048576.0, CRT))
+        fp.write('Top allocations by line:%s' % CRT)
+        for stat in snapshot.statistics('lineno')[:TOP]:
+            fp.write('%s%s' % (stat, CRT))
+        fp.close()
+    except:
+        # profiling must never fail the load
+        pass
+    return
@@ -0,0 +1,399 @@
+#
+#  emalQC.py
+###########################################################################
+#
+#  Purpose:
+#
+#       QC report spools and the machine-readable QC output.
+#
+#	Each QC category of makeIMPC.py writes its report entries to its
+#	own spool file as the errors are found; the QC report is assembled
+#	by streaming the spools in report order, so the size of the report
+#	does not drive memory.
+#
+#	A spooled entry is a compact tuple (line number, input line
+#	reference, rule fields). If the input file is not compressed it is
+#	memory-mapped and the reference is the byte offset of the line; the
+#	line text is read from the map only when the report is rendered.
+#	A compressed input cannot be mapped and the reference is the line.
+#
+#	Each entry is also written as one JSON record to the structured QC
+#	file, and at the end of the run the records are indexed in a SQLite
+#	database by colony ID, marker ID and allele ID, so the QC history
+#	of an object can be looked up without scanning the reports.
+#
+#  Usage:
+#
+#      emalQC.py query [--run run] (--colony id | --marker id | --allele id)
+#	   print the QC records of the object (all indexed runs by default)
+#
+#      emalQC.py runs
+#	   print the indexed runs and their record counts
+#
+#  Env Vars:
+#
+#	QC_SPOOL_DIR - directory of the spool files; a temporary directory
+#	    if not set
+#	QC_JSON_FILE - the structured QC file; not written if not set
+#	QC_INDEX - the SQLite QC index; not written if not set
+#	QC_INDEX_RUNS - number of runs kept in the index (default 30)
+#
+#  Outputs:
+#
+#	${QC_SPOOL_DIR}/qc_<name>.spool (marshalled entry tuples),
+#	removed by removeSpools()
+#
+#	${QC_JSON_FILE}, one record per report entry:
+#	    {"rule": rule code, "category": spool name,
+#	     "line": input line number,
+#	     "input": {the 9 GenTar columns by name},
+#	     "fields": {the rule fields by name (db* are MGI values)}}
+#
+#	${QC_INDEX} table qc:
+#	    run, rule, line, colonyID, markerID, alleleID (input values),
+#	    dbAlleleID (the MGI allele of the rule, if any), record (JSON)
+#
+#  Exit Codes:
+#
+#      0:  Successful completion
+#      1:  An exception occurred
+#
+###########################################################################
+
+import sys
+import os
+import json
+import time
+import mmap
+import marshal
+import sqlite3
+import argparse
+import tempfile
+import emalFile
+
+CRT = '\n'
+TAB = '\t'
+
+# the GenTar input columns
+INPUT_FIELDS = ['markerSymbol', 'markerID', 'colonyID', 'strain',
+    'alleleClass', 'alleleType', 'alleleSubType', 'alleleSymbol', 'alleleID']
+
+spoolDir = os.getenv('QC_SPOOL_DIR')
+jsonFile = os.getenv('QC_JSON_FILE')
+indexFile = os.getenv('QC_INDEX')
+indexRuns = int(os.getenv('QC_INDEX_RUNS') or 30)
+
+# the run, as the archive timestamp (RUN_ID of emalload.sh)
+run = os.getenv('RUN_ID') or time.strftime('%Y%m%d.%H%M')
+
+fpJson = None
+
+# the memory-mapped input file, None if it is compressed
+inputMap = None
+
+# the spools that have been created, in creation order
+spoolList = []
+
+class Spool:
+    #
+    # Is: the report entries of one QC category
+    # Has: a rule code, the names of the rule fields, a spool file,
+    #	the number of entries
+    # Does: appends entries as they are found, copies them to the report
+    #
+    def __init__(self, name,    # str.- file name of the spool
+            rule,               # str.- rule code of the category
+            fieldNames = None,  # list - names of the rule fields
+            suffix = ''):       # str.- appended to each report entry
+        self.name = name
+        self.rule = rule
+        self.fieldNames = fieldNames if fieldNames is not None else []
+        self.suffix = suffix
+        self.fileName = None
+        self.fp = None
+        self.count = 0
+        spoolList.append(self)
+
+    def open(self):
+        global spoolDir
+
+        if not spoolDir:
+            spoolDir = tempfile.mkdtemp(prefix = 'emalqc.')
+        elif not os.path.isdir(spoolDir):
+            os.makedirs(spoolDir)
+        self.fileName = os.path.join(spoolDir, 'qc_%s.spool' % self.name)
+        self.fp = open(self.fileName, 'w+b')
+
+    def append(self, lineNum, lineRef, *fields):
+        # lineRef from lineRef(): an offset if the input is mapped
+        if inputMap is not None and type(lineRef) != int:
+            raise ValueError('line %s: input line referenced by value' % lineNum)
+        if self.fp is None:
+            self.open()
+        fields = tuple([str(f) for f in fields])
+        marshal.dump((lineNum, lineRef) + fields, self.fp)
+        self.count += 1
+
+        if fpJson is not None:
+            writeRecord(self, lineNum, getLine(lineRef), fields)
+
+    def __len__(self):
+        return self.count
+
+    def entries(self):
+        # the entry tuples (line number, line reference, rule fields...),
+        # in the order they were appended
+        if self.count == 0:
+            return
+        self.fp.flush()
+        self.fp.seek(0)
+        for i in range(self.count):
+            yield marshal.load(self.fp)
+        self.fp.seek(0, os.SEEK_END)
+
+    def copyTo(self, fp):
+        # report entry: line number, rule fields, input line;
+        # entries are separated, not terminated, by CRT
+        for i, entry in enumerate(self.entries()):
+            if i:
+                fp.write(CRT)
+            fp.write('%s%s' % (str.join(TAB, (str(entry[0]),) + entry[2:] + \
+                (getLine(entry[1]),)), self.suffix))
+
+    def clear(self):
+        if self.fp is not None:
+            self.fp.close()
+            os.remove(self.fileName)
+        self.fp = None
+        self.fileName = None
+        self.count = 0
+
+#
+# Purpose: Memory-map the input file if it is not compressed
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Sets global variables
+# Throws: IOError if the file cannot be read
+#
+def openInput(fileName):
+    global inputMap
+
+    closeInput()
+    if emalFile.compressionOf(fileName) == 'none' and os.path.getsize(fileName) > 0:
+        fp = open(fileName, 'rb')
+        inputMap = mmap.mmap(fp.fileno(), 0, access = mmap.ACCESS_READ)
+        fp.close()
+    return
+
+#
+# Purpose: Unmap the input file
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Sets global variables
+# Throws: Nothing
+#
+def closeInput():
+    global inputMap
+
+    if inputMap is not None:
+        inputMap.close()
+        inputMap = None
+    return
+
+#
+# Purpose: Reference an input line for a spool entry
+# Returns: the byte offset of the line if the input is mapped, else the line
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def lineRef(offset, line):
+    if inputMap is not None:
+        return offset
+    return line
+
+#
+# Purpose: Decode an input line as it reads in text mode
+# Returns: the line
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: UnicodeDecodeError
+#
+def decodeLine(rawLine):
+    line = rawLine.decode()
+    if line.endswith('\r\n'):
+        line = line[:-2] + CRT
+    return line
+
+#
+# Purpose: Get the text of a referenced input line
+# Returns: the line, with its CRT
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def getLine(lineRef):
+    if type(lineRef) != int:
+        return lineRef
+    end = inputMap.find(b'\n', lineRef)
+    if end == -1:
+        end = len(inputMap) - 1
+    return decodeLine(inputMap[lineRef:end + 1])
+
+#
+# Purpose: Remove the spool files
+# Returns: Nothing
+# Assumes: the QC report has been written
+# Effects: removes files from the file system
+# Throws: Nothing
+#
+def removeSpools():
+    for spool in spoolList:
+        spool.clear()
+    return
+
+#
+# Purpose: Open the structured QC file, if configured
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: creates the file
+# Throws: IOError if the file cannot be opened
+#
+def openJson():
+    global fpJson
+
+    if jsonFile:
+        fpJson = open(jsonFile, 'w')
+    return
+
+#
+# Purpose: Write one report entry to the structured QC file
+# Returns: Nothing
+# Assumes: openJson() has been called
+# Effects: writes to the file system
+# Throws: Nothing
+#
+def writeRecord(spool, lineNum, line, fields):
+    if line.endswith(CRT):
+        line = line[:-1]
+    tokens = [str.strip(t) for t in str.split(line, TAB)]
+    tokens += [''] * (len(INPUT_FIELDS) - len(tokens))
+    record = {
+        'rule' : spool.rule,
+        'category' : spool.name,
+        'line' : lineNum,
+        'input' : dict(zip(INPUT_FIELDS, tokens)),
+        'fields' : dict(zip(spool.fieldNames, [str(f) for f in fields])) }
+    fpJson.write('%s%s' % (json.dumps(record, sort_keys = True), CRT))
+    return
+
+#
+# Purpose: Close the structured QC file and index its records
+# Returns: Nothing
+# Assumes: openJson() has been called
+# Effects: writes the index; runs beyond QC_INDEX_RUNS are removed from it
+# Throws: sqlite3.Error if the index cannot be written
+#
+def writeIndex():
+    global fpJson
+
+    if fpJson is None:
+        return
+    fpJson.close()
+    fpJson = None
+    if not indexFile:
+        return
+
+    conn = sqlite3.connect(indexFile)
+    conn.executescript('''
+        create table if not exists qc (run text, rule text, line integer,
+            colonyID text, markerID text, alleleID text, dbAlleleID text,
+            record text);
+        create index if not exists qc_idx1 on qc (colonyID collate nocase);
+        create index if not exists qc_idx2 on qc (markerID);
+        create index if not exists qc_idx3 on qc (alleleID);
+        create index if not exists qc_idx4 on qc (dbAlleleID);
+        create index if not exists qc_idx5 on qc (run);''')
+    conn.execute('delete from qc where run = ?', (run,))
+
+    rows = []
+    for text in open(jsonFile, 'r'):
+        record = json.loads(text)
+        fields = record['fields']
+        rows.append((run, record['rule'], record['line'],
+            record['input']['colonyID'], record['input']['markerID'],
+            record['input']['alleleID'],
+            fields.get('dbAlleleID', fields.get('dbMatchAlleleID')),
+            text[:-1]))
+        if len(rows) == 10000:
+            conn.executemany('insert into qc values (?,?,?,?,?,?,?,?)', rows)
+            rows = []
+    conn.executemany('insert into qc values (?,?,?,?,?,?,?,?)', rows)
+
+    runList = [r[0] for r in conn.execute(
+        'select distinct run from qc order by run desc')]
+    for oldRun in runList[indexRuns:]:
+        conn.execute('delete from qc where run = ?', (oldRun,))
+    conn.commit()
+    conn.close()
+    return
+
+#
+# Purpose: Look up the QC records of an object in the index
+# Returns: list of (run, record)
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: sqlite3.Error if the index cannot be read
+#
+def query(colonyID = None, markerID = None, alleleID = None, runName = None):
+    if colonyID is not None:
+        where, value = 'colonyID = ? collate nocase', colonyID
+    elif markerID is not None:
+        where, value = 'markerID = ?', markerID
+    else:
+        where, value = '(alleleID = ? or dbAlleleID = ?)', alleleID
+
+    args = [value] * where.count('?')
+    if runName is not None:
+        where += ' and run = ?'
+        args.append(runName)
+
+    conn = sqlite3.connect(indexFile)
+    results = conn.execute('''select run, record from qc where %s
+        order by run desc, line''' % where, args).fetchall()
+    conn.close()
+    return [(r[0], json.loads(r[1])) for r in results]
+
+#
+# MAIN
+#
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'emalload QC index')
+    subparsers = parser.add_subparsers(dest = 'command')
+    queryParser = subparsers.add_parser('query')
+    queryParser.add_argument('--run')
+    group = queryParser.add_mutually_exclusive_group(required = True)
+    group.add_argument('--colony')
+    group.add_argument('--marker')
+    group.add_argument('--allele')
+    subparsers.add_parser('runs')
+    args = parser.parse_args()
+
+    if not indexFile or not os.path.exists(indexFile):
+        print('QC index not found: %s' % indexFile)
+        sys.exit(1)
+
+    if args.command == 'query':
+        for runName, record in query(args.colony, args.marker, args.allele, args.run):
+            print('%s%s%s%s%s%s%s' % (runName, TAB, record['rule'], TAB,
+                record['line'], TAB, json.dumps(record, sort_keys = True)))
+    elif args.command == 'runs':
+        conn = sqlite3.connect(indexFile)
+        for r in conn.execute('select run, count(*) from qc group by run order by run'):
+            print('%s%s%s' % (r[0], TAB, r[1]))
+        conn.close()
+    else:
+        parser.print_usage()
+        sys.exit(1)
+
+    sys.exit(0)
@@ -0,0 +1,566 @@
+#
+#  emalQCSql.py
+###########################################################################
+#
+#  Purpose:
+#
+#       Relational QC engine for makeIMPC.py (QC_ENGINE=sqlite).
+#
+#	The input file and the lookups of makeIMPC.py (alleles, colony ID
+#	notes, markers, strains, lab codes, allele type translations) are
+#	loaded into an in-memory SQLite database, and the 7.2.x decision
+#	tree of createAlleleFile() is evaluated as set-based queries: one
+#	table of the checks of every line, one of the branch of each line
+#	and its flags, one of the new alleles. The per-line database
+#	queries of the python engine (MGI type of an allele ID not in MGI,
+#	secondary marker IDs, alleles by symbol) are resolved in batches.
+#
+#	The QC entries of all categories are selected in the order the
+#	python engine finds them (line, check, position) and appended to
+#	the same spools, so the allele file, the colony ID note file, the
+#	QC report and the structured QC file are the same as those of the
+#	python engine.
+#
+#  Usage:
+#
+#	emalQCSql.createAlleleFile(impc)	# impc - the makeIMPC module
+#
+#  Notes:
+#
+#	The python helpers of makeIMPC.py (lower case, colony ID key,
+#	symbol match and the parsed symbol) are registered as SQL
+#	functions, so the comparisons are exactly those of the python
+#	engine.
+#
+###########################################################################
+
+import sqlite3
+import db
+import emalQC
+
+TAB = '\t'
+CRT = '\n'
+
+# values per batched database query
+BATCH = 500
+
+# the QC categories by check, in the order the python engine checks them:
+# (spool of makeIMPC, number of rule fields)
+CHECKS = [
+    None,
+    ('strainNotInMgiList', 0),
+    ('missingRequiredValueList', 1),
+    ('markerIdNotInMgiList', 0),
+    ('unknownAlleleClassList', 0),
+    ('unknownAlleleTypeList', 0),
+    ('unknownSubTypeList', 0),
+    ('alleleIdNotInMGIList', 1),
+    ('alleleIdMatchAlleleStatusDiscrepList', 1),
+    ('alleleIdMatchMarkerIdMismatchList', 4),
+    ('alleleIdMatchAlleleSSMismatchList', 2),
+    ('alleleIdMatchColonyIDMismatchList', 3),
+    ('alleleIdMatchColonyIdMatchToMultiList', 7),
+    ('alleleIdMatchColonyIdMatchToDiffAlleleList', 7),
+    ('cidMatchToMultiList', 2),
+    ('cidMatchAlleleStatusDiscrepList', 3),
+    ('cidMatchMarkerIdMismatchList', 2),
+    ('cidMatchAlleleSSMismatchList', 2),
+    ('symbolMatchAlleleStatusDiscrepList', 3),
+    ('symbolMatchColonyIdMismatchList', 3),
+    ('symbolMatchMultiAlleleList', 2),
+    ('badNomenList', 1),
+    ('labCodeNotInMgiList', 1),
+    ('atTransKeyNotInMgiList', 1),
+    ('badNomenList', 1) ]
+
+# the QC entries: (line, line reference, check, position, rule fields)
+ENTRY_SQL = '''
+    select lineNum, lineRef, 1, 0, null, null, null, null, null, null, null
+        from base where strainBad
+    union all
+    select lineNum, lineRef, 2, 0, missing, null, null, null, null, null, null
+        from base where missing != ''
+    union all
+    select lineNum, lineRef, 3, 0, null, null, null, null, null, null, null
+        from base where missing = '' and markerBad
+    union all
+    select lineNum, lineRef, 4, 0, null, null, null, null, null, null, null
+        from base where missing = '' and classBad
+    union all
+    select lineNum, lineRef, 5, 0, null, null, null, null, null, null, null
+        from base where missing = '' and typeBad
+    union all
+    select lineNum, lineRef, 6, 0, null, null, null, null, null, null, null
+        from base where missing = '' and subTypeBad
+    union all
+    select lineNum, lineRef, 7, 0, objectType, null, null, null, null, null, null
+        from flag where c1
+    union all
+    select lineNum, lineRef, 8, 0, d_ast, null, null, null, null, null, null
+        from flag where d3
+    union all
+    select lineNum, lineRef, 9, 0, alleleID, alleleSymbol, d_mid, d_ms, null, null, null
+        from flag where d1
+    union all
+    select lineNum, lineRef, 10, 0, d_aid, d_asym, null, null, null, null, null
+        from flag where d2
+    union all
+    select lineNum, lineRef, 11, 0, alleleID, d_asym, d_cid, null, null, null, null
+        from flag where d4a
+    union all
+    select f.lineNum, f.lineRef, 12, c.pos, f.alleleID, f.d_asym, f.d_cid,
+            c.aid, c.asym, c.at, c.cid
+        from flag f, colonyAllele c
+        where f.d4bMulti and c.cidKey = f.cidKey
+    union all
+    select lineNum, lineRef, 13, 0, alleleID, d_asym, d_cid, c0_aid, c0_asym, c0_at, c0_cid
+        from flag where d4bDiff
+    union all
+    select f.lineNum, f.lineRef, 14, c.pos, c.aid, c.asym, null, null, null, null, null
+        from flag f, colonyAllele c
+        where f.f1 and c.cidKey = f.cidKey
+    union all
+    select lineNum, lineRef, 15, 0, c0_aid, c0_asym, c0_ast, null, null, null, null
+        from flag where f3
+    union all
+    select lineNum, lineRef, 16, 0, c0_aid, c0_asym, null, null, null, null, null
+        from flag where f2a
+    union all
+    select lineNum, lineRef, 17, 0, c0_aid, c0_asym, null, null, null, null, null
+        from flag where f2b
+    union all
+    select lineNum, lineRef, 18, 0, s0_accid, s0_asym, s0_status, null, null, null, null
+        from flag where h1
+    union all
+    select lineNum, lineRef, 19, 0, s0_accid, s0_asym, h_cid, null, null, null, null
+        from flag where h2
+    union all
+    select f.lineNum, f.lineRef, 20, s.pos, s.accid, s.asym, null, null, null, null, null
+        from flag f, symbolMatch s
+        where f.h3 and s.symbol = f.alleleSymbol
+    union all
+    select lineNum, lineRef, 21, 0, alleleSymbol, null, null, null, null, null, null
+        from nw where badNomen
+    union all
+    select lineNum, lineRef, 22, 0, labCode, null, null, null, null, null, null
+        from nw where labCodeBad
+    union all
+    select lineNum, lineRef, 23, 0, impcKey, null, null, null, null, null, null
+        from nw where impcKeyBad
+    union all
+    select lineNum, lineRef, 24, 0, alleleSymbol, null, null, null, null, null, null
+        from nw where seqNumBad
+    order by 1, 3, 4'''
+
+#
+# Purpose: Quote a value for a batched database query
+# Returns: the quoted value
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def quote(value):
+    return "'%s'" % str.replace(str(value), "'", "''")
+
+#
+# Purpose: Run a database query for a list of values, in batches
+# Returns: the result set of all batches
+# Assumes: db connection; command has one %s for the quoted values
+# Effects: Nothing
+# Throws: Nothing
+#
+def batchQuery(command, valueList):
+    results = []
+    for i in range(0, len(valueList), BATCH):
+        results += db.sql(command % str.join(',', \
+            [quote(v) for v in valueList[i:i + BATCH]]), 'auto')
+    return results
+
+#
+# Purpose: Make a python function null safe, as SQL functions are
+# Returns: function returning null if an argument is null
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def nullSafe(function):
+    return lambda *args: None if None in args else function(*args)
+
+#
+# Purpose: Open the in-memory database and register the python helpers
+# Returns: the connection
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def connect(impc):
+    conn = sqlite3.connect(':memory:')
+    for name, n, function in [('pylower', 1, str.lower),
+            ('symbolsMatch', 2, impc.symbolsMatch),
+            ('isBadNomen', 1, lambda s: impc.parseAlleleSymbol(s).isBadNomen),
+            ('labCode', 1, lambda s: impc.parseAlleleSymbol(s).labCode),
+            ('seqNum', 1, lambda s: impc.parseAlleleSymbol(s).seqNum)]:
+        conn.create_function(name, n, nullSafe(function), deterministic = True)
+    return conn
+
+#
+# Purpose: Load the lookups of makeIMPC into tables
+# Returns: Nothing
+# Assumes: makeIMPC initialize() has been called
+# Effects: creates tables
+# Throws: Nothing
+#
+def loadLookups(conn, impc):
+    conn.executescript('''
+        create table marker (markerID text primary key, symbol text);
+        create table allele (aid text primary key, ak, asym, ast, at,
+            mid, ms, mk, cid);
+        create table colonyAllele (cidKey text, pos integer, aid, asym, ast,
+            at, mid, cid, primary key (cidKey, pos));
+        create table colonyCount (cidKey text primary key, n integer);
+        create table strain (name text primary key, strain text);
+        create table strainTrans (gentar text primary key, mgi text);
+        create table labCode (code text primary key, name text);
+        create table typeTrans (impcKey text primary key, mgiValue text);
+        create table impcType (type text primary key);
+        create table impcSubType (type text primary key);''')
+
+    conn.executemany('insert into marker values (?,?)',
+        [(k, str.split(v, '|')[1]) for k, v in impc.markerDict.items()])
+    conn.executemany('insert into allele values (?,?,?,?,?,?,?,?,?)',
+        [(a.aid, a.ak, a.asym, a.ast, a.at, a.mid, a.ms, a.mk, a.cid) \
+            for a in impc.alleleByIDDict.values()])
+    rows = []
+    for cidKey, alleleList in impc.colonyToAlleleDict.items():
+        for pos, a in enumerate(alleleList):
+            rows.append((cidKey, pos, a.aid, a.asym, a.ast, a.at, a.mid, a.cid))
+    conn.executemany('insert into colonyAllele values (?,?,?,?,?,?,?,?)', rows)
+    conn.executemany('insert into colonyCount values (?,?)',
+        [(k, len(v)) for k, v in impc.colonyToAlleleDict.items()])
+    conn.executemany('insert into strain values (?,?)', impc.strainDict.items())
+    conn.executemany('insert into strainTrans values (?,?)', impc.strainTransDict.items())
+    conn.executemany('insert into labCode values (?,?)', impc.labCodeDict.items())
+    conn.executemany('insert into typeTrans values (?,?)', impc.alleleTypeTransDict.items())
+    conn.executemany('insert or ignore into impcType values (?)',
+        [(t,) for t in impc.impcAlleleTypeList])
+    conn.executemany('insert or ignore into impcSubType values (?)',
+        [(t,) for t in impc.impcSubTypeList])
+    return
+
+#
+# Purpose: Load the input file into table line
+# Returns: the number of the last line (the header is line 1)
+# Assumes: impc.fpIMPC is open at the start of the file
+# Effects: creates a table
+# Throws: Nothing
+#
+def loadInput(conn, impc):
+    conn.execute('''create table line (lineNum integer primary key, lineRef,
+        markerID, colonyID, cidKey, strain, alleleClass, alleleType,
+        alleleSubType, alleleSymbol, alleleID)''')
+
+    header = impc.fpIMPC.readline()
+    lineNum = 1 # ignoring header
+    offset = len(header) # byte offset of the line
+    rows = []
+    for rawLine in impc.fpIMPC:
+        lineNum += 1
+        line = emalQC.decodeLine(rawLine)
+        lineRef = emalQC.lineRef(offset, line)
+        offset += len(rawLine)
+        tokens = list(map(str.strip, line[:-1].split('\t')))
+        rows.append((lineNum, lineRef, tokens[1], tokens[2],
+            impc.colonyKey(tokens[2]), str.strip(tokens[3]), tokens[4],
+            tokens[5], tokens[6], tokens[7], tokens[8]))
+        if len(rows) == 10000:
+            conn.executemany('insert into line values (?,?,?,?,?,?,?,?,?,?,?)', rows)
+            rows = []
+    conn.executemany('insert into line values (?,?,?,?,?,?,?,?,?,?,?)', rows)
+    return lineNum
+
+#
+# Purpose: Evaluate the required value checks (7.2.A1) of every line
+#	and select the lines that pass into the branch table
+# Returns: Nothing
+# Assumes: loadLookups() and loadInput() have been called
+# Effects: creates tables base and branch
+# Throws: Nothing
+#
+def checkLines(conn):
+    conn.executescript('''
+        create table base as
+        select l.*,
+            coalesce(s.strain, 'Not Specified') as mgiStrain,
+            s.strain is null as strainBad,
+            trim((case when l.markerID = '' then 'Marker ID, ' else '' end)
+                || (case when l.colonyID = '' then 'Colony ID, ' else '' end)
+                || (case when l.alleleClass = '' then 'Allele Class (type), ' else '' end)
+                || (case when l.alleleType = '' then 'Allele (mutation) Type, ' else '' end)
+                || (case when l.alleleSymbol = '' then 'Allele Symbol, ' else '' end),
+                ', ') as missing,
+            m.markerID is null as markerBad,
+            m.symbol as markerSymbol,
+            pylower(l.alleleClass) != 'endonuclease-mediated' as classBad,
+            pylower(l.alleleType) not in (select type from impcType) as typeBad,
+            l.alleleSubType != ''
+                and pylower(l.alleleSubType) not in (select type from impcSubType)
+                as subTypeBad
+        from line l
+        left join strainTrans t on t.gentar = l.strain
+        left join strain s on s.name = coalesce(t.mgi, l.strain)
+        left join marker m on m.markerID = l.markerID;
+
+        create table branch as
+        select b.lineNum, b.lineRef, b.markerID, b.colonyID, b.cidKey,
+            b.alleleType, b.alleleSubType, b.alleleSymbol, b.alleleID,
+            b.mgiStrain, b.markerSymbol,
+            d.ak as d_ak, d.aid as d_aid, d.asym as d_asym, d.ast as d_ast,
+            d.mid as d_mid, d.ms as d_ms, d.mk as d_mk, d.cid as d_cid,
+            coalesce(cc.n, 0) as cidCount,
+            c0.aid as c0_aid, c0.asym as c0_asym, c0.ast as c0_ast,
+            c0.at as c0_at, c0.mid as c0_mid, c0.cid as c0_cid
+        from base b
+        left join allele d on b.alleleID != '' and d.aid = b.alleleID
+        left join colonyCount cc on cc.cidKey = b.cidKey
+        left join colonyAllele c0 on c0.cidKey = b.cidKey and c0.pos = 0
+        where b.missing = ''
+        and not (b.markerBad or b.classBad or b.typeBad or b.subTypeBad);''')
+    return
+
+#
+# Purpose: Resolve the per-line database queries of the branches in
+#	batches: the MGI type of allele IDs not in MGI (7.2.C1), the
+#	marker IDs of the allele markers (7.2.D1), the alleles by symbol
+#	of lines without an allele ID or colony ID match (7.2.H)
+# Returns: Nothing
+# Assumes: db connection, checkLines() has been called
+# Effects: creates tables mgiType, markerAcc, symbolMatch, symbolCount
+# Throws: Nothing
+#
+def resolveQueries(conn):
+    conn.executescript('''
+        create table mgiType (accid text primary key, types text);
+        create table markerAcc (mk integer, accid text, primary key (mk, accid));
+        create table symbolMatch (symbol text, pos integer, status, accid,
+            asym, ak, primary key (symbol, pos));
+        create table symbolCount (symbol text primary key, n integer);''')
+
+    # as queryMGIType(); exclude VOC_Evidence (25)
+    idList = [r[0] for r in conn.execute('''select distinct alleleID from branch
+        where alleleID != '' and d_aid is null''')]
+    typeDict = {}
+    for r in batchQuery('''select a.accid, am.tableName
+            from ACC_Accession a, ACC_MGIType am
+            where a.accid in (%s)
+            and a._LogicalDB_key = 1
+            and a.prefixPart = 'MGI:'
+            and a._MGIType_key not in (25)
+            and a._MGIType_key = am._MGIType_key''', idList):
+        typeDict.setdefault(r['accid'], []).append(r['tableName'])
+    conn.executemany('insert into mgiType values (?,?)',
+        [(k, str.join(', ', v)) for k, v in typeDict.items()])
+
+    keyList = [r[0] for r in conn.execute('''select distinct d_mk from branch
+        where d_ast = 'Approved' and markerID != d_mid''')]
+    conn.executemany('insert or ignore into markerAcc values (?,?)',
+        [(r['_Object_key'], r['accid']) for r in batchQuery('''select _Object_key, accid
+            from ACC_Accession
+            where _MGIType_key = 2
+            and _LogicalDB_key = 1
+            and _Object_key in (%s)''', keyList)])
+
+    # as findAlleleBySymbol()
+    symbolList = [r[0] for r in conn.execute('''select distinct alleleSymbol from branch
+        where alleleID = '' and cidCount = 0''')]
+    matchDict = {}
+    for r in batchQuery('''select t.term as status, a.symbol, aa.accid, a._Allele_key
+            from ALL_Allele a, VOC_Term t, ACC_Accession aa
+            where a.symbol in (%s)
+            and a._Allele_Status_key = t._Term_key
+            and aa._Object_key = a._Allele_key
+            and aa._MGIType_key = 11
+            and aa._LogicalDB_key = 1
+            and aa.preferred = 1
+            and aa.prefixPart = 'MGI:' ''', symbolList):
+        matchDict.setdefault(r['symbol'], []).append(r)
+    rows = []
+    for symbol, results in matchDict.items():
+        for pos, r in enumerate(results):
+            rows.append((symbol, pos, r['status'], r['accid'], r['symbol'], r['_Allele_key']))
+    conn.executemany('insert into symbolMatch values (?,?,?,?,?,?)', rows)
+    conn.executemany('insert into symbolCount values (?,?)',
+        [(k, len(v)) for k, v in matchDict.items()])
+    return
+
+#
+# Purpose: Evaluate the branch checks (7.2.C - 7.2.H) and the new
+#	allele checks (7.2.I, 7.2.A1g, nomenclature)
+# Returns: Nothing
+# Assumes: resolveQueries() has been called
+# Effects: creates tables flag and nw
+# Throws: Nothing
+#
+def checkBranches(conn):
+    conn.executescript('''
+        create table q as
+        select r.*,
+            coalesce(sc.n, 0) as symCount,
+            s0.status as s0_status, s0.accid as s0_accid, s0.asym as s0_asym,
+            s0.ak as s0_ak, h.cid as h_cid,
+            coalesce(mt.types, '') as objectType,
+            r.d_aid is not null and r.d_ast = 'Approved' as dOk,
+            r.alleleID = '' and r.cidCount > 0 as e,
+            r.alleleID = '' and r.cidCount = 0 as g
+        from branch r
+        left join symbolCount sc on r.alleleID = '' and r.cidCount = 0
+            and sc.symbol = r.alleleSymbol
+        left join symbolMatch s0 on s0.symbol = sc.symbol and s0.pos = 0
+        left join allele h on h.aid = s0.accid
+        left join mgiType mt on mt.accid = r.alleleID;
+
+        create table f as
+        select q.*,
+            alleleID != '' and d_aid is null as c1,
+            d_aid is not null and d_ast != 'Approved' as d3,
+            dOk and markerID != d_mid and not exists (select 1 from markerAcc
+                where mk = d_mk and accid = markerID) as d1,
+            dOk and not symbolsMatch(alleleSymbol, d_asym) as d2,
+            dOk and d_cid != '' and pylower(colonyID) != pylower(d_cid) as d4a,
+            dOk and cidCount > 1 as d4bMulti,
+            dOk and cidCount = 1 and alleleID != c0_aid as d4bDiff,
+            e and cidCount > 1 as f1,
+            e and c0_ast != 'Approved' as f3,
+            e and c0_ast = 'Approved' and markerID != c0_mid as f2a,
+            e and c0_ast = 'Approved' and not symbolsMatch(alleleSymbol, c0_asym) as f2b,
+            g and symCount = 1 and s0_status != 'Approved' as h1,
+            g and symCount = 1 and coalesce(h_cid, '') != '' as h2,
+            g and symCount > 1 as h3,
+            g and symCount = 0 as isNew
+        from q;
+
+        create table flag as
+        select f.*,
+            (dOk and not (d1 or d2 or d4a or d4bMulti or d4bDiff))
+            or (e and not (f1 or f3 or f2a or f2b))
+            or (g and symCount = 1 and not (h1 or h2)) as found
+        from f;
+
+        create table n0 as
+        select lineNum, lineRef, markerID, markerSymbol, colonyID, mgiStrain,
+            alleleSymbol,
+            isBadNomen(alleleSymbol) as badNomen,
+            labCode(alleleSymbol) as labCode,
+            seqNum(alleleSymbol) as seqNum,
+            case when alleleSubType = '' then pylower(alleleType)
+                else pylower(alleleType) || '|' || pylower(alleleSubType)
+                end as impcKey
+        from flag where isNew;
+
+        create table n1 as
+        select n0.*,
+            labCode not in (select code from labCode) as labCodeBad,
+            impcKey not in (select impcKey from typeTrans) as impcKeyBad
+        from n0;
+
+        create table nw as
+        select n1.*,
+            not (badNomen or labCodeBad or impcKeyBad) and seqNum is null as seqNumBad,
+            not (badNomen or labCodeBad or impcKeyBad or seqNum is null) as ok,
+            lc.name as labName, tt.mgiValue
+        from n1
+        left join labCode lc on lc.code = n1.labCode
+        left join typeTrans tt on tt.impcKey = n1.impcKey;''')
+    return
+
+#
+# Purpose: The suggestions of a QC entry (makeIMPC suggest())
+# Returns: the rule fields to add to the entry, () if none
+# Assumes: loadInput() has been called
+# Effects: Nothing
+# Throws: Nothing
+#
+def suggest(conn, impc, spool, r):
+    if impc.suggestK <= 0 or spool.name not in impc.suggestSpoolDict:
+        return ()
+    kind = impc.suggestSpoolDict[spool.name]
+    if kind == 'labCode':
+        return impc.suggest(kind, r[4])
+    alleleSymbol, colonyID = conn.execute('''select alleleSymbol, colonyID
+        from line where lineNum = ?''', (r[0],)).fetchone()
+    if kind == 'symbol':
+        return impc.suggest(kind, alleleSymbol, impc.alleleLabel(r[5], r[4]))
+    return impc.suggest(kind, colonyID)
+
+#
+# Purpose: Run the QC of the input file with the relational engine,
+#	as makeIMPC createAlleleFile()
+# Returns: 0
+# Assumes: makeIMPC initialize() has been called
+# Effects: writes the QC spools, the allele file and the colony ID note
+#	file; sets the counts of makeIMPC
+# Throws: Nothing
+#
+def createAlleleFile(impc):
+    conn = connect(impc)
+    loadLookups(conn, impc)
+    lastLineNum = loadInput(conn, impc)
+    checkLines(conn)
+    resolveQueries(conn)
+    checkBranches(conn)
+
+    # the QC entries, in the order of the python engine
+    spoolList = [None] + [(getattr(impc, name), n) for name, n in CHECKS[1:]]
+    for r in conn.execute(ENTRY_SQL):
+        spool, n = spoolList[r[2]]
+        spool.append(r[0], r[1], *(r[4:4 + n] + suggest(conn, impc, spool, r)))
+
+    # colony ID notes of the alleles found (7.2.D4, 7.2.H4)
+    for r in conn.execute('''select lineNum, d_aid, colonyID, d_ak from flag
+            where found and dOk and d_cid = ''
+            union all
+            select lineNum, s0_accid, colonyID, s0_ak from flag
+            where found and g
+            order by 1'''):
+        impc.fpNoteload.write('%s%s%s%s' % (r[1], TAB, r[2], CRT))
+        impc.cidNoteList.append((r[3], r[2], r[0], r[1]))
+
+    # counts; a line with a colony ID matching n alleles (7.2.F1) is
+    # counted as skipped n + 1 times, as in the python engine
+    impc.allelesFoundCt += conn.execute('select count(*) from flag where found').fetchone()[0]
+    impc.linesSkippedCt += conn.execute('''select
+            (select count(*) from base where missing != ''
+                or markerBad or classBad or typeBad or subTypeBad)
+            + (select coalesce(sum(cidCount), 0) from flag where f1)
+            + (select count(*) from flag where not found and not isNew)
+            + (select count(*) from nw where not ok)''').fetchone()[0]
+    impc.lineNum = lastLineNum
+
+    # the new alleles
+    for r in conn.execute('''select lineNum, lineRef, markerID, markerSymbol,
+            colonyID, mgiStrain, alleleSymbol, seqNum, labName, mgiValue
+            from nw where ok order by lineNum'''):
+        lineNum, lineRef, markerID, markerSymbol, colonyID, strain, \
+            calcAlleleSymbol, sequenceNum, labName, mgiValue = r
+        mgiAlleleType = mgiValue
+        mgiSubType = ''
+        if str.find(mgiValue, '|') != -1:
+            mgiAlleleType, mgiSubType = str.split(mgiValue, '|')
+        alleleName = impc.alleleNameTemplate % (sequenceNum, labName)
+        alleleLine = str.join(TAB, map(str, [markerID, markerSymbol, mgiAlleleType,
+            impc.alleleDescription, colonyID, strain, calcAlleleSymbol,
+            alleleName, impc.inHeritMode, 'Endonuclease-mediated', mgiSubType,
+            impc.alleleStatus, impc.transmissionState, impc.alleleCollection,
+            impc.jNumber, impc.createdBy])) + CRT
+        impc.calcAlleleDict.setdefault(calcAlleleSymbol, []).append( \
+            [alleleLine, lineNum, lineRef])
+
+    for key in impc.calcAlleleDict:
+        if len(impc.calcAlleleDict[key]) > 1: # dupe in input
+            for l in impc.calcAlleleDict[key]:
+                impc.dupeAlleleInInputList.append(l[1], l[2])
+        else:
+            impc.linesLoadedCt += 1
+            impc.fpAllele.write(impc.calcAlleleDict[key][0][0])
+
+    conn.close()
+    return 0
@@ -0,0 +1,205 @@
+#
+#  emalSql.py
+###########################################################################
+#
+#  Purpose:
+#
+#       SQL statement timing for the emalload scripts, installed as the
+#	db module's sql log function (db.set_sqlLogFunction).
+#
+#	Each statement is reduced to a fingerprint (literals replaced by
+#	'?', white space collapsed) so the per-line queries of the load
+#	group together; the call count, total/mean/max latency and rows
+#	returned are kept per fingerprint. Optionally the plan of a select
+#	slower than a threshold is captured with explain analyze, once per
+#	fingerprint. The summary is written to the diagnostic log at the
+#	end of the run.
+#
+#  Usage:
+#
+#	emalSql.install(previousFunction)	# chained, may be None
+#	...
+#	emalSql.writeSummary(fpLogDiag)
+#
+#  Env Vars:
+#
+#	SQL_STATS - 'true' to collect the statement statistics
+#	SQL_EXPLAIN_MS - capture the plan of selects slower than this
+#	    (milliseconds); no plans if not set or 0
+#
+#  Notes:
+#
+#	Statements with side effects (nextval, setval, ACC_setMax) and
+#	non-select statements are never explained. The explain itself is
+#	run through db.sql and is not counted.
+#
+###########################################################################
+
+import os
+import re
+import db
+
+TAB = '\t'
+CRT = '\n'
+
+sqlStats = os.getenv('SQL_STATS') == 'true'
+explainMs = float(os.getenv('SQL_EXPLAIN_MS') or 0)
+
+# {fingerprint: [count, total seconds, max seconds, rows], ...}
+statDict = {}
+
+# {fingerprint: [plan line, ...], ...}
+planDict = {}
+
+# the sql log function installed before this one, called after it
+chainFunction = None
+
+# set while a plan is captured, so its statements are not logged
+inExplain = 0
+
+literalFinder = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+spaceFinder = re.compile(r'\s+')
+noExplainFinder = re.compile(r'nextval|setval|ACC_setMax', re.I)
+
+#
+# Purpose: Reduce a statement to its fingerprint
+# Returns: the fingerprint
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def fingerprint(command):
+    return str.strip(spaceFinder.sub(' ', literalFinder.sub('?', command)))
+
+#
+# Purpose: Install the statement timing as the sql log function
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Sets global variables, sets the db sql log function
+# Throws: Nothing
+#
+def install(previousFunction = None):
+    global chainFunction
+
+    chainFunction = previousFunction
+    if sqlStats:
+        db.set_sqlLogFunction(logFunction)
+    elif previousFunction is not None:
+        db.set_sqlLogFunction(previousFunction)
+    return
+
+#
+# Purpose: The sql log function: time the statements of one db.sql call
+# Returns: Nothing
+# Assumes: called by the db module with the keywords below
+# Effects: Sets global variables
+# Throws: Nothing
+#
+def logFunction(start = None, end = None, queries = [], results = [], **kw):
+    if inExplain:
+        return
+
+    seconds = (end - start) / max(len(queries), 1)
+    for i, command in enumerate(queries):
+        key = fingerprint(command)
+        rows = 0
+        if i < len(results) and type(results[i]) == list:
+            rows = len(results[i])
+        stat = statDict.get(key)
+        if stat is None:
+            statDict[key] = [1, seconds, seconds, rows]
+        else:
+            stat[0] += 1
+            stat[1] += seconds
+            stat[2] = max(stat[2], seconds)
+            stat[3] += rows
+        if explainMs and seconds * 1000 > explainMs and key not in planDict:
+            explain(key, command)
+
+    if chainFunction is not None:
+        chainFunction(start = start, end = end, queries = queries,
+            results = results, **kw)
+    return
+
+#
+# Purpose: Capture the plan of a slow select
+# Returns: Nothing
+# Assumes: database connection
+# Effects: Sets global variables; runs the statement again
+# Throws: Nothing
+#
+def explain(key, command):
+    global inExplain
+
+    if not str.lower(str.lstrip(command)).startswith('select') \
+            or noExplainFinder.search(command):
+        return
+
+    inExplain = 1
+    try:
+        results = db.sql('explain analyze %s' % command, 'auto')
+        planDict[key] = [str(list(r.values())[0]) for r in results]
+    except:
+        planDict[key] = ['explain failed']
+    inExplain = 0
+    return
+
+#
+# Purpose: Add the statistics of another process (a worker)
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Sets global variables
+# Throws: Nothing
+#
+def merge(otherStatDict, otherPlanDict = {}):
+    for key, other in otherStatDict.items():
+        stat = statDict.get(key)
+        if stat is None:
+            statDict[key] = list(other)
+        else:
+            stat[0] += other[0]
+            stat[1] += other[1]
+            stat[2] = max(stat[2], other[2])
+            stat[3] += other[3]
+    for key in otherPlanDict:
+        planDict.setdefault(key, otherPlanDict[key])
+    return
+
+#
+# Purpose: Clear the statistics
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Sets global variables
+# Throws: Nothing
+#
+def reset():
+    statDict.clear()
+    planDict.clear()
+    return
+
+#
+# Purpose: Write the statement statistics, by total time, and the
+#	captured plans
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: writes to fp
+# Throws: Nothing
+#
+def writeSummary(fp):
+    if not statDict:
+        return
+
+    fp.write('%sSQL statements by total time%s' % (CRT, CRT))
+    fp.write('Count%sTotal ms%sMean ms%sMax ms%sRows%sStatement%s' % \
+        (TAB, TAB, TAB, TAB, TAB, CRT))
+    for key in sorted(statDict, key = lambda k: -statDict[k][1]):
+        count, total, maxSeconds, rows = statDict[key]
+        fp.write('%s%s%.1f%s%.3f%s%.3f%s%s%s%s%s' % (count, TAB, total * 1000,
+            TAB, total * 1000 / count, TAB, maxSeconds * 1000, TAB, rows, TAB,
+            key[:200], CRT))
+
+    for key in planDict:
+        fp.write('%sPlan: %s%s' % (CRT, key[:200], CRT))
+        for line in planDict[key]:
+            fp.write('    %s%s' % (line, CRT))
+    return
@@ -0,0 +1,136 @@
+#
+#  emalSuggest.py
+###########################################################################
+#
+#  Purpose:
+#
+#       Character n-gram index of MGI values (allele symbols, colony IDs,
+#	lab codes), to suggest the nearest MGI values for a mismatched
+#	input value in the QC report.
+#
+#	Values are compared case- and white space-insensitively, so a
+#	case or white space variant is an exact match. The candidates are
+#	the values sharing the most n-grams with the input, counted over
+#	the n-grams that are not common to a large part of the values
+#	(such as '<em' in allele symbols); they are ranked by the Dice
+#	coefficient of their n-gram sets. Short values (lab codes) are
+#	indexed by 2-grams, as a typo leaves few 3-grams of them intact.
+#
+#  Usage:
+#
+#	index = emalSuggest.NgramIndex(valueList, labelList, n)
+#	labelList = index.query(value, k)
+#
+#  Notes:
+#
+#	The index is built in memory in one pass over the values; build
+#	it only when the first suggestion is needed, so a run without
+#	mismatches does not pay for it. The result of each query is kept,
+#	so a value repeated on many lines is looked up once.
+#
+###########################################################################
+
+import heapq
+import itertools
+import collections
+
+# candidates rescored per query
+POOL = 50
+
+# lowest Dice coefficient of a suggestion
+MIN_SCORE = 0.3
+
+#
+# Purpose: Normalize a value for comparison
+# Returns: the value, case folded, without white space
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def normalize(value):
+    return str.join('', str.split(str.casefold(value)))
+
+#
+# Purpose: The n-grams of a normalized value, with start and end markers
+# Returns: set of n-grams
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def ngrams(value, n):
+    padded = '\x02%s\x03' % value
+    return {padded[i:i + n] for i in range(max(len(padded) - n + 1, 1))}
+
+class NgramIndex:
+    #
+    # Is: a character n-gram index of a set of values
+    # Has: the normalized values, their labels, the values by n-gram
+    # Does: finds the values nearest to a string
+    #
+    def __init__(self, valueList,   # list - the values
+            labelList = None,       # list - the label of each value;
+                                    #   the value if None
+            n = 3):                 # int. - n-gram size
+        self.n = n
+        self.valueList = [normalize(v) for v in valueList]
+        self.labelList = labelList if labelList is not None else list(valueList)
+
+        # {n-gram: [value number, ...], ...}
+        self.postingDict = collections.defaultdict(list)
+        for i, value in enumerate(self.valueList):
+            for gram in ngrams(value, n):
+                self.postingDict[gram].append(i)
+
+        # n-grams of more values than this are not counted
+        self.maxPostings = max(1000, len(self.valueList) // 200)
+
+        # the result of each query, as the input values of a bad batch
+        # repeat (a wrong lab code, a wrong colony ID prefix)
+        # {(value, k): [label, ...], ...}
+        self.resultDict = {}
+
+    def __len__(self):
+        return len(self.valueList)
+
+    def query(self, value, k):
+        # the labels of the k nearest values, nearest first
+        if (value, k) not in self.resultDict:
+            self.resultDict[(value, k)] = self.search(normalize(value), k)
+        return self.resultDict[(value, k)]
+
+    def search(self, value, k):
+        # the labels of the k nearest values to a normalized value
+        gramSet = ngrams(value, self.n)
+        postingLists = [self.postingDict[g] for g in gramSet if g in self.postingDict]
+        if not postingLists:
+            return []
+
+        # count shared n-grams over the selective n-grams; if all are
+        # common use the three rarest
+        selective = [p for p in postingLists if len(p) <= self.maxPostings]
+        if not selective:
+            selective = sorted(postingLists, key = len)[:3]
+        counter = collections.Counter(itertools.chain.from_iterable(selective))
+
+        # the pool is the values sharing the most n-grams; ties by label,
+        # so the suggestions do not depend on the order of the values
+        poolList = heapq.nsmallest(POOL, counter.items(),
+            key = lambda c: (-c[1], self.labelList[c[0]]))
+
+        scoreList = []
+        for i, count in poolList:
+            candidateSet = ngrams(self.valueList[i], self.n)
+            score = 2.0 * len(gramSet & candidateSet) / \
+                (len(gramSet) + len(candidateSet))
+            if score >= MIN_SCORE:
+                scoreList.append((-score, self.labelList[i]))
+        scoreList.sort()
+
+        # a label once, at its best score
+        labelList = []
+        for score, label in scoreList:
+            if label not in labelList:
+                labelList.append(label)
+                if len(labelList) == k:
+                    break
+        return labelList
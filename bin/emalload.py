@@ -0,0 +1,645 @@
+#
+#  emalload.py
+###########################################################################
+#
+#  Purpose:
+#
+#       Runs the steps of the EMAL load as a dependency graph, for
+#	emalload.sh and makeIMPC.sh: each step (node) starts as soon as
+#	the steps it depends on have succeeded, so independent steps run
+#	at the same time:
+#
+#	    copy --+-- sanity checks (3) -- sanity --+
+#	           |                                  +-- qc --+-- qcdiff ----------+
+#	           +-- lookups (prefetch) ------------+        |                    +-- archive
+#	                                                       +-- reserveNotes --+ |
+#	                                                            noteload -----+-+-- ledger
+#	                                                            makeAllele ---+
+#
+#	The sanity checks run while makeIMPC.py loads its lookups in this
+#	process; the QC (makeIMPC.runQC) starts when both are done. The
+#	colony ID noteload (mginoteload) and makeAllele.py run at the same
+#	time: before they start, a block of MGI_Note keys is reserved for
+#	makeAllele.py (mgi_note_seq is moved past it), so the notes of the
+#	noteload, which takes its keys from mgi_note_seq, cannot collide
+#	with those of the new alleles. The archive runs beside the ledger.
+#
+#	Each node is reported as the job stream checkStatus does, '<step>
+#	successful' or '<step> failed', with its time and attempts; a
+#	summary of all nodes follows. Idempotent nodes (copy, sanity
+#	checks, qcdiff, ledger, archive) are retried LOAD_RETRIES times.
+#	After a failure no new node is started. The wrapper scripts keep
+#	preload, checkStatus (of this script) and shutDown.
+#
+#  Usage:
+#
+#      emalload.py load
+#	   the load of emalload.sh
+#
+#      emalload.py resume
+#	   resume makeAllele.py from its checkpoint (emalload.sh), then
+#	   the ledger and the archive, as the failed run (its RUN_ID and
+#	   input copy); touches lastrun if SOURCE_INPUT_FILE is still the
+#	   input of the failed run
+#
+#      emalload.py qc
+#	   the QC and colony ID noteload of makeIMPC.sh
+#
+#  Env Vars:
+#
+#	See the configuration file
+#
+#	LOAD_WORKERS - number of nodes run at the same time
+#	LOAD_RETRIES - number of retries of an idempotent node
+#	LOAD_RETRY_SECONDS - wait before a retry
+#
+#  Outputs:
+#
+#	The node reports are written to stdout (the LOG of the wrapper)
+#	${SANITY_RPT} - the sanity report
+#
+#  Exit Codes:
+#
+#      0:  Successful completion
+#      1:  A node failed (or the sanity checks found errors)
+#
+#  Notes:
+#
+#	The CPU time in the metrics file of a command run beside others
+#	may include that of the others (see emalMetrics.runCommand).
+#
+###########################################################################
+
+import sys
+import os
+import time
+import json
+import shutil
+import threading
+import traceback
+import subprocess
+import concurrent.futures
+import db
+import emalFile
+import emalMetrics
+import emalLedger
+
+CRT = '\n'
+
+USAGE = 'Usage: emalload.py load | resume | qc'
+
+binDir = os.path.dirname(os.path.abspath(__file__))
+python = os.getenv('PYTHON') or sys.executable
+workers = int(os.getenv('LOAD_WORKERS') or 4)
+retries = int(os.getenv('LOAD_RETRIES') or 2)
+retrySeconds = float(os.getenv('LOAD_RETRY_SECONDS') or 30)
+DEBUG = os.getenv('LOG_DEBUG')
+
+# serializes the node reports
+logLock = threading.Lock()
+
+# the sections of the sanity report and their status
+# {check: (status, report text), ...}
+sanityDict = {}
+
+# the start of the sanity checks
+sanityStart = None
+
+# the first MGI_Note key reserved for makeAllele.py, None if none
+reservedNoteKey = None
+
+# 1 if the notes of the run are loaded by the noteload node
+runNoteload = 0
+
+# the checkpoint of the failed run being resumed (see makeAllele.py)
+resumeCheckpoint = {}
+
+class Node:
+    #
+    # Is: one step of the load
+    # Has: a name, the step message of its report, the function that
+    #	runs it, the nodes it depends on, a number of retries, its
+    #	status, attempts, time and a note
+    # Does: runs the step, retrying it
+    #
+    def __init__(self, name,    # str.- name of the node
+            title,              # str.- step message (checkStatus)
+            function,           # function - runs the step; returns the
+                                #   exit status of the step
+            depends = [],       # list - names of the nodes it depends on
+            retries = 0):       # int. - retries if it fails
+        self.name = name
+        self.title = title
+        self.function = function
+        self.depends = depends
+        self.retries = retries
+        self.status = 'pending'
+        self.attempts = 0
+        self.seconds = 0.0
+        self.note = ''
+
+    def run(self):
+        start = time.time()
+        status = 1
+        while self.attempts <= self.retries:
+            self.attempts += 1
+            try:
+                status = self.function(self)
+            except SystemExit as e:
+                status = e.code or 0
+            except:
+                log(traceback.format_exc())
+                status = 1
+            if status == 0 or self.attempts > self.retries:
+                break
+            log('%s failed (attempt %s), retrying in %s sec' % \
+                (self.title, self.attempts, retrySeconds))
+            time.sleep(retrySeconds)
+        self.seconds = time.time() - start
+        self.status = 'successful' if status == 0 else 'failed'
+        log('%s %s (%.2f sec%s%s)' % (self.title, self.status, self.seconds,
+            ', %s attempts' % self.attempts if self.attempts > 1 else '',
+            ', %s' % self.note if self.note else ''))
+        return status
+
+#
+# Purpose: Write a message to the log (stdout)
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: writes to stdout
+# Throws: Nothing
+#
+def log(message):
+    with logLock:
+        sys.stdout.write('%s%s' % (message, CRT))
+        sys.stdout.flush()
+    return
+
+#
+# Purpose: Run the nodes of a graph, each once the nodes it depends on
+#	have succeeded, up to LOAD_WORKERS at a time
+# Returns: 0 if all nodes succeeded, else 1
+# Assumes: the nodes are listed after the nodes they depend on
+# Effects: runs the nodes, writes the summary to stdout
+# Throws: Nothing
+#
+def runGraph(nodeList):
+    nodeDict = dict([(n.name, n) for n in nodeList])
+    pendingList = list(nodeList)
+    runningDict = {}
+    failed = 0
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        while pendingList or runningDict:
+            # after a failure nothing new is started
+            for node in list(pendingList):
+                statusList = [nodeDict[d].status for d in node.depends]
+                if failed or 'failed' in statusList or 'not run' in statusList:
+                    node.status = 'not run'
+                    pendingList.remove(node)
+                elif statusList.count('successful') == len(statusList):
+                    node.status = 'running'
+                    pendingList.remove(node)
+                    runningDict[pool.submit(node.run)] = node
+
+            if not runningDict:
+                break
+            doneSet, notDoneSet = concurrent.futures.wait(runningDict,
+                return_when = concurrent.futures.FIRST_COMPLETED)
+            for future in doneSet:
+                if future.result() != 0:
+                    failed = 1
+                del runningDict[future]
+
+    log('%sLoad steps:' % CRT)
+    for node in nodeList:
+        log('    %-16s %-10s %8.2f sec  %s attempt(s)  %s' % (node.name,
+            node.status, node.seconds, node.attempts, node.note))
+    return failed
+
+#
+# Purpose: Run a command as a metrics stage
+# Returns: the exit status of the command
+# Assumes: Nothing
+# Effects: runs the command; its output goes to stdout
+# Throws: Nothing
+#
+def runCommand(stage, command):
+    sys.stdout.flush()
+    return emalMetrics.runCommand(stage, command)
+
+#
+# Purpose: Copy the input file (node copy)
+# Returns: 0
+# Assumes: Nothing
+# Effects: Sets global variables; writes SOURCE_COPY_INPUT_FILE
+# Throws: OSError if the file cannot be copied
+#
+def copyInput(node):
+    global sanityStart
+
+    emalMetrics.startStage('copy')
+    if os.path.exists(os.getenv('SOURCE_COPY_INPUT_FILE')):
+        os.remove(os.getenv('SOURCE_COPY_INPUT_FILE'))
+    shutil.copyfile(os.getenv('SOURCE_INPUT_FILE'), os.getenv('SOURCE_COPY_INPUT_FILE'))
+    emalMetrics.endStage('copy')
+    sanityStart = time.time()
+    return 0
+
+#
+# Purpose: Check the input file for duplicate lines (node sanityDup)
+# Returns: 0
+# Assumes: the input file has been copied
+# Effects: Sets global variables
+# Throws: Nothing
+#
+def checkDupLines(node):
+    pipe = subprocess.run('%s %s/emalFile.py cat %s | sort | uniq -d' % \
+        (python, binDir, os.getenv('SOURCE_COPY_INPUT_FILE')), shell = True,
+        stdout = subprocess.PIPE, universal_newlines = True)
+    if pipe.returncode != 0:
+        return pipe.returncode
+    text = 'Duplicate Lines%s---------------%s%s' % (CRT, CRT, pipe.stdout)
+    sanityDict['dup'] = (int(pipe.stdout != ''), text)
+    return 0
+
+#
+# Purpose: Check the input file for lines with missing columns
+#	(node sanityColumns)
+# Returns: 0, the status of checkColumns.py if it fails
+# Assumes: the input file has been copied
+# Effects: Sets global variables
+# Throws: Nothing
+#
+def checkColumns(node):
+    pipe = subprocess.run([python, os.path.join(binDir, 'checkColumns.py'),
+        os.getenv('SOURCE_COPY_INPUT_FILE'), os.getenv('NUM_COLUMNS')],
+        stdout = subprocess.PIPE, universal_newlines = True)
+    if pipe.returncode not in (0, 1) or (pipe.returncode == 1 and not pipe.stdout):
+        return pipe.returncode
+    text = '%s%sLines With Missing Columns%s--------------------------%s%s' % \
+        (CRT, CRT, CRT, CRT, pipe.stdout)
+    sanityDict['columns'] = (int(pipe.stdout != ''), text)
+    return 0
+
+#
+# Purpose: Check that the input file has a minimum number of lines
+#	(node sanityLineCount)
+# Returns: 0
+# Assumes: the input file has been copied
+# Effects: Sets global variables
+# Throws: OSError if the file cannot be read
+#
+def checkLineCount(node):
+    inputFile = os.getenv('SOURCE_COPY_INPUT_FILE')
+    minLines = int(os.getenv('FILE_MIN_SIZE'))
+    count = 0
+    fpIn = emalFile.openBinary(inputFile)
+    block = fpIn.read(emalFile.BLOCKSIZE)
+    while block:
+        count += block.count(b'\n')
+        block = fpIn.read(emalFile.BLOCKSIZE)
+    fpIn.close()
+
+    text = ''
+    if count < minLines:
+        text = '%s%s**** WARNING ****%s%s has %s lines.%sExpecting at least %s lines.%s' % \
+            (CRT, CRT, CRT, inputFile, count, CRT, minLines, CRT)
+    sanityDict['lineCount'] = (int(count < minLines), text)
+    return 0
+
+#
+# Purpose: Write the sanity report (node sanity)
+# Returns: 1 if the sanity checks found errors, else 0
+# Assumes: the sanity check nodes have been run
+# Effects: writes SANITY_RPT
+# Throws: OSError if the report cannot be written
+#
+def writeSanity(node):
+    fp = open(os.getenv('SANITY_RPT'), 'w')
+    for check in ['dup', 'columns', 'lineCount']:
+        fp.write(sanityDict[check][1])
+    fp.close()
+    emalMetrics.markStage('sanity', sanityStart)
+
+    if max([status for status, text in sanityDict.values()]) != 0:
+        log('Sanity errors detected. See %s' % os.getenv('SANITY_RPT'))
+        return 1
+    return 0
+
+#
+# Purpose: Load the makeIMPC.py lookups (node lookups); skipped if the
+#	warm loader daemon will run the QC
+# Returns: 0, 1 if the files cannot be opened
+# Assumes: the input file has been copied
+# Effects: loads the lookups into makeIMPC, opens its files
+# Throws: the exceptions of makeIMPC.initialize
+#
+def loadLookups(node):
+    if daemonRunning():
+        node.note = 'skipped, the loader daemon runs the QC'
+        return 0
+
+    import emalSql
+    import emalProfile
+    import makeIMPC
+
+    emalSql.install()
+    emalMetrics.startStage('lookup')
+    status = emalProfile.run('initialize', makeIMPC.initialize)
+    if status != 0:
+        return status
+    emalMetrics.endStage('lookup', counts = makeIMPC.lookupCounts())
+    node.note = 'lookup memory %.1f MB' % (makeIMPC.lookupBytes / 1048576.0)
+    return status
+
+#
+# Purpose: Check whether the warm loader daemon is listening
+# Returns: 1 if DAEMON_SOCKET is a socket, else 0
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def daemonRunning():
+    socketFile = os.getenv('DAEMON_SOCKET')
+    if not socketFile or not os.path.exists(socketFile):
+        return 0
+    import stat
+    return int(stat.S_ISSOCK(os.stat(socketFile).st_mode))
+
+#
+# Purpose: Run the QC and create the allele file (node qc): in the
+#	loader daemon if it is listening, else with the lookups of the
+#	lookups node
+# Returns: the status of the QC
+# Assumes: the lookups node has been run
+# Effects: writes the QC report, the allele and colony ID note files;
+#	loads the colony ID notes if CID_NOTELOAD_INPROCESS is 'true'
+# Throws: the exceptions of makeIMPC.runQC
+#
+def runQC(node):
+    global runNoteload
+
+    import makeIMPC
+
+    status = 2
+    if daemonRunning():
+        import emalDaemon
+        status = emalDaemon.sendRequest('qc %s' % os.getenv('RUN_ID'))
+        node.note = 'loader daemon'
+    if status == 2:
+        if makeIMPC.fpIMPC is None:
+            emalMetrics.startStage('lookup')
+            if makeIMPC.initialize() != 0:
+                return 1
+            emalMetrics.endStage('lookup', counts = makeIMPC.lookupCounts())
+        status = makeIMPC.runQC()
+        node.note = ''
+
+    # the notes are loaded by the noteload node
+    runNoteload = int(status == 0 and DEBUG != 'true' \
+        and os.getenv('CID_NOTELOAD_INPROCESS') != 'true' \
+        and os.path.exists(os.getenv('CID_NOTE_FILE')) \
+        and os.path.getsize(os.getenv('CID_NOTE_FILE')) > 0)
+    return status
+
+#
+# Purpose: Compare the QC errors with those of the previous load
+#	(node qcdiff); a run without QC records resolves them all
+# Returns: the status of qcDiff.py
+# Assumes: the QC has been run
+# Effects: writes QC_DIFF_RPT; a load (not a QC preview) replaces the
+#	stored keys (QC_DIFF_KEYS)
+# Throws: Nothing
+#
+def runQCDiff(node, preview = 0):
+    if not os.getenv('QC_JSON_FILE'):
+        node.note = 'skipped, no QC_JSON_FILE'
+        return 0
+    argList = [python, os.path.join(binDir, 'qcDiff.py')]
+    if preview:
+        argList.append('--preview')
+    return runCommand('qcdiff', argList)
+
+#
+# Purpose: Reserve the MGI_Note keys of makeAllele.py, so that the
+#	noteload can run at the same time (node reserveNotes)
+# Returns: 0
+# Assumes: the QC has been run; the noteload takes its keys from
+#	mgi_note_seq
+# Effects: Sets global variables; moves mgi_note_seq past the block
+# Throws: Nothing
+#
+def reserveNotes(node):
+    global reservedNoteKey
+
+    if not runNoteload:
+        node.note = 'skipped, no noteload beside makeAllele.py'
+        return 0
+
+    # at most a molecular note and a colony ID note per allele
+    fp = open(os.getenv('ALLELE_FILE'), 'r')
+    count = 2 * sum([1 for line in fp])
+    fp.close()
+    if count == 0:
+        node.note = 'skipped, no new alleles'
+        return 0
+
+    results = db.sql(''' select nextval('mgi_note_seq') as nextKey ''', 'auto')
+    reservedNoteKey = results[0]['nextKey']
+    db.sql(''' select setval('mgi_note_seq', %s) ''' % (reservedNoteKey + count - 1), None)
+    db.commit()
+    node.note = 'keys %s-%s' % (reservedNoteKey, reservedNoteKey + count - 1)
+    return 0
+
+#
+# Purpose: Load the colony ID notes with mginoteload (node noteload)
+# Returns: the status of the noteload
+# Assumes: the QC has been run
+# Effects: loads MGI_Note
+# Throws: Nothing
+#
+def runNoteloadNode(node):
+    if not runNoteload:
+        node.note = 'skipped'
+        return 0
+    return runCommand('noteload', [os.path.join(os.getenv('NOTELOAD'), 'mginoteload.csh'),
+        os.path.join(os.getenv('EMALLOAD'), 'impc_noteload.config')])
+
+#
+# Purpose: Create the new alleles (node makeAllele)
+# Returns: the status of makeAllele.py
+# Assumes: the QC has been run
+# Effects: loads the new alleles
+# Throws: Nothing
+#
+def runMakeAllele(node, argList = []):
+    env = dict(os.environ)
+    if reservedNoteKey is not None:
+        env['RESERVED_NOTE_KEY'] = str(reservedNoteKey)
+    sys.stdout.flush()
+    return subprocess.call([python, './makeAllele.py'] + argList, cwd = binDir,
+        env = env, stderr = subprocess.STDOUT)
+
+#
+# Purpose: Resume makeAllele.py from its checkpoint (node makeAllele
+#	of resume)
+# Returns: the status of makeAllele.py
+# Assumes: the checkpoint exists
+# Effects: loads the tables not committed by the failed run
+# Throws: Nothing
+#
+def runResume(node):
+    global resumeCheckpoint
+
+    resumeCheckpoint = json.load(open(os.path.join(os.getenv('CHECKPOINT_DIR'), 'checkpoint'), 'r'))
+    if resumeCheckpoint.get('run'):
+        os.environ['RUN_ID'] = resumeCheckpoint['run']
+    node.note = 'run %s' % os.getenv('RUN_ID')
+    return runMakeAllele(node, ['--resume'])
+
+#
+# Purpose: Note that the input file has been loaded, if it is still the
+#	input of the resumed run (node lastrun of resume); else leave it
+#	to the new load that follows in emalload.sh
+# Returns: 0
+# Assumes: the resume succeeded
+# Effects: touches ${INPUTDIR}/lastrun
+# Throws: Nothing
+#
+def markLastRun(node):
+    inputFile = os.getenv('SOURCE_INPUT_FILE')
+    if os.path.exists(inputFile) \
+            and emalFile.hashFile(inputFile) == resumeCheckpoint.get('input'):
+        open(os.path.join(os.getenv('INPUTDIR'), 'lastrun'), 'a').close()
+        os.utime(os.path.join(os.getenv('INPUTDIR'), 'lastrun'), None)
+        node.note = 'input loaded'
+    else:
+        node.note = 'SOURCE_INPUT_FILE has changed since run %s' % os.getenv('RUN_ID')
+    return 0
+
+#
+# Purpose: Set mgi_note_seq to the last MGI_Note key, once the noteload
+#	and makeAllele.py have both run (node noteSeq)
+# Returns: 0
+# Assumes: Nothing
+# Effects: updates mgi_note_seq
+# Throws: Nothing
+#
+def syncNoteSeq(node):
+    if reservedNoteKey is None:
+        node.note = 'skipped'
+        return 0
+    db.sql(''' select setval('mgi_note_seq', (select max(_Note_key) from MGI_Note)) ''', None)
+    db.commit()
+    return 0
+
+#
+# Purpose: Record the alleles and colony ID notes of the run in the
+#	allele ledger (node ledger)
+# Returns: 0
+# Assumes: the load of the run has committed
+# Effects: writes the ledger
+# Throws: sqlite3.Error if the ledger cannot be written
+#
+def recordLedger(node, newAlleleFile = None):
+    if DEBUG == 'true' or not emalLedger.ledgerFile:
+        node.note = 'skipped'
+        return 0
+    run, count = emalLedger.record(newAlleleFile)
+    node.note = 'run %s, %s entries' % (run, count)
+    return 0
+
+#
+# Purpose: Archive the input file and reports (node archive)
+# Returns: the status of emalArchive.py
+# Assumes: the reports have been written
+# Effects: writes the archive store
+# Throws: Nothing
+#
+def archive(node, reportList, inputName = 'SOURCE_INPUT_FILE'):
+    return runCommand('archive', [python, os.path.join(binDir, 'emalArchive.py'),
+        'store', os.getenv('RUN_ID') or time.strftime('%Y%m%d.%H%M'),
+        os.getenv(inputName)] + [os.getenv(r) or '' for r in reportList])
+
+#
+# Purpose: The nodes of the load of emalload.sh
+# Returns: list of Node
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def loadGraph():
+    return [
+        Node('copy', 'Copying input file', copyInput, [], retries),
+        Node('sanityDup', 'Duplicate lines check', checkDupLines, ['copy'], retries),
+        Node('sanityColumns', 'Missing columns check', checkColumns, ['copy'], retries),
+        Node('sanityLineCount', 'Line count check', checkLineCount, ['copy'], retries),
+        Node('sanity', 'Sanity checks', writeSanity,
+            ['sanityDup', 'sanityColumns', 'sanityLineCount']),
+        Node('lookups', 'makeIMPC.py lookups', loadLookups, ['copy']),
+        Node('qc', os.getenv('PREPROCESSOR') or 'makeIMPC.py', runQC, ['sanity', 'lookups']),
+        Node('qcdiff', 'qcDiff.py', runQCDiff, ['qc'], retries),
+        Node('reserveNotes', 'MGI_Note key reservation', reserveNotes, ['qc']),
+        Node('noteload', 'CID noteload', runNoteloadNode, ['reserveNotes']),
+        Node('makeAllele', 'makeAllele.py', runMakeAllele, ['reserveNotes']),
+        Node('noteSeq', 'mgi_note_seq update', syncNoteSeq, ['noteload', 'makeAllele']),
+        Node('ledger', 'emalLedger.py record',
+            lambda node: recordLedger(node, os.getenv('NEW_ALLELE_RPT')),
+            ['noteSeq'], retries),
+        Node('archive', 'Archive input file and reports',
+            lambda node: archive(node, ['SANITY_RPT', 'QC_FILE', 'QC_JSON_FILE',
+                'QC_DIFF_RPT', 'NEW_ALLELE_RPT']),
+            ['qcdiff', 'makeAllele'], retries) ]
+
+#
+# Purpose: The nodes of the resumed load of emalload.sh
+# Returns: list of Node
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def resumeGraph():
+    return [
+        Node('makeAllele', 'makeAllele.py --resume', runResume),
+        Node('ledger', 'emalLedger.py record',
+            lambda node: recordLedger(node, os.getenv('NEW_ALLELE_RPT')),
+            ['makeAllele'], retries),
+        Node('archive', 'Archive input file and reports',
+            lambda node: archive(node, ['SANITY_RPT', 'QC_FILE', 'QC_JSON_FILE',
+                'QC_DIFF_RPT', 'NEW_ALLELE_RPT'], 'SOURCE_COPY_INPUT_FILE'),
+            ['makeAllele'], retries),
+        Node('lastrun', 'lastrun', markLastRun, ['ledger', 'archive']) ]
+
+#
+# Purpose: The nodes of the QC and noteload of makeIMPC.sh
+# Returns: list of Node
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def qcGraph():
+    return [
+        Node('copy', 'Copying input file', copyInput, [], retries),
+        Node('lookups', 'makeIMPC.py lookups', loadLookups, ['copy']),
+        Node('qc', 'makeIMPC.py', runQC, ['lookups']),
+        Node('qcdiff', 'qcDiff.py --preview',
+            lambda node: runQCDiff(node, 1), ['qc'], retries),
+        Node('noteload', 'CID noteload', runNoteloadNode, ['qc']),
+        Node('ledger', 'emalLedger.py record', recordLedger, ['noteload'], retries),
+        Node('archive', 'Archive input file and reports',
+            lambda node: archive(node, ['QC_FILE', 'QC_JSON_FILE', 'QC_DIFF_RPT']),
+            ['qcdiff'], retries) ]
+
+#
+# MAIN
+#
+if __name__ == '__main__':
+    graphDict = {'load' : loadGraph, 'resume' : resumeGraph, 'qc' : qcGraph}
+    if len(sys.argv) != 2 or sys.argv[1] not in graphDict:
+        print(USAGE)
+        sys.exit(1)
+
+    status = runGraph(graphDict[sys.argv[1]]())
+    db.useOneConnection(0)
+    sys.exit(status)
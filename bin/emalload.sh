@@ -20,6 +20,7 @@ Usage="Usage: emalload.sh *load.config"
 #      - Log file (${LOG_DIAG})
 #      - Log file (${LOG_PROC})
 #      - Log file (${LOG_CUR})
+#      - Metrics file (${METRICS_FILE})
 #
 #  Exit Codes:
 #
@@ -34,7 +35,9 @@ Usage="Usage: emalload.sh *load.config"
 #
 #      1) Source the configuration file to establish the environment.
 #      2) Establish the log file.
-#      3) Copy the input file to the Input directory
+#      3) Run the load steps (emalload.py): copy the input file to the
+#         Input directory, sanity checks, QC, noteload, makeAllele.py,
+#         ledger and archive
 #
 #  Notes:  None
 #
@@ -70,9 +73,16 @@ fi
 LOG=${LOG_DIAG}
 rm -rf ${LOG}
 rm -rf ${LOG_CUR}
+rm -rf ${METRICS_FILE}
 touch ${LOG}
 touch ${LOG_CUR}
 
+#
+# The run: names the run in the QC index, the allele ledger and the archive
+#
+RUN_ID=`date '+%Y%m%d.%H%M'`
+export RUN_ID
+
 #
 #  Source the DLA library functions.
 #
@@ -95,6 +105,30 @@ fi
 # createArchive
 #
 preload ${OUTPUTDIR}
+
+#
+# If the previous run failed while bcp'ing the makeAllele.py files,
+# resume that load from its checkpoint: the QC and bcp files of the
+# failed run are reused and only the tables not yet committed are loaded,
+# archived as the failed run. If a table cannot be resumed (it has only
+# part of the rows of the run, or rows of another load in its key range),
+# makeAllele.py deletes the rows of the run and renames the checkpoint to
+# checkpoint.failed, so the next run is a new load; if that fails, the
+# checkpoint stays until an operator has removed it (see the makeAllele.py
+# diagnostics). After a resume, lastrun is touched only if the input file
+# is still the one the failed run loaded; a newer input file is loaded
+# below.
+#
+if [ -f ${CHECKPOINT_DIR}/checkpoint ]
+then
+    echo "" >> ${LOG}
+    date >> ${LOG}
+    echo "Resuming makeAllele.py from ${CHECKPOINT_DIR}" | tee -a ${LOG}
+    ${PYTHON} ${EMALLOAD}/bin/emalload.py resume >> ${LOG} 2>&1
+    STAT=$?
+    checkStatus ${STAT} "emalload.py resume ${CONFIG}"
+fi
+
 rm -f ${OUTPUTDIR}/*
 
 #
@@ -116,172 +150,17 @@ then
 fi
 
 #
-# copy source input file
-#
-echo "copying source input file..." >> ${LOG}
-date >> ${LOG}
-rm -rf ${SOURCE_COPY_INPUT_FILE}
-cp ${SOURCE_INPUT_FILE} ${SOURCE_COPY_INPUT_FILE}
-STAT=$?
-checkStatus ${STAT} "Copying input file"
-
-#
-# FUNCTION: Check for duplicate lines in an input file and write the lines
-#           to the sanity report.
-#
-checkDupLines ()
-{
-    FILE=$1    # The input file to check
-    REPORT=$2  # The sanity report to write to
-
-    echo "Duplicate Lines" >> ${REPORT}
-    echo "---------------" >> ${REPORT}
-    sort ${FILE} | uniq -d > ${TMP_FILE1}
-    cat ${TMP_FILE1} >> ${REPORT}
-    if [ `cat ${TMP_FILE1} | wc -l` -eq 0 ]
-    then
-        return 0
-    else
-        return 1
-    fi
-}
-
-#
-# FUNCTION: Check for lines with missing columns in an input file and write
-#           the line numbers to the sanity report.
-#
-checkColumns ()
-{
-    FILE=$1         # The input file to check
-    REPORT=$2       # The sanity report to write to
-    NUM_COLUMNS=$3  # The number of columns expected in each input record
-
-    echo "" >> ${REPORT}
-    echo "" >> ${REPORT}
-    echo "Lines With Missing Columns" >> ${REPORT}
-    echo "--------------------------" >> ${REPORT}
-    ${PYTHON} ${EMALLOAD}/bin/checkColumns.py ${FILE} ${NUM_COLUMNS} > ${TMP_FILE2}
-    cat ${TMP_FILE2} >> ${REPORT}
-    if [ `cat ${TMP_FILE2} | wc -l` -eq 0 ]
-    then
-        return 0
-    else
-        return 1
-    fi
-
-}
-
-#
-# FUNCTION: Check an input file to make sure it has a minimum number of lines.
-#
-checkLineCount ()
-{
-    FILE=$1        # The input file to check
-    REPORT=$2      # The sanity report to write to
-    NUM_LINES=$3   # The minimum number of lines expected in the input file
-
-    COUNT=`cat ${FILE} | wc -l | sed 's/ //g'`
-    if [ ${COUNT} -lt ${NUM_LINES} ]
-    then
-        echo "" >> ${REPORT}
-        echo "" >> ${REPORT}
-        echo "**** WARNING ****" >> ${REPORT}
-        echo "${FILE} has ${COUNT} lines." >> ${REPORT}
-        echo "Expecting at least ${NUM_LINES} lines." >> ${REPORT}
-        return 1
-    else
-        return 0
-    fi
-}
-
-#
-# Run sanity checks on the input file.
+# Run the load as a dependency graph (see emalload.py): copy, the sanity
+# checks beside the makeIMPC.py lookups, the QC, the qcdiff, the colony
+# ID noteload beside makeAllele.py, the ledger and the archive. Each
+# step is reported in the log; the load stops at the first failed step
+# (sanity errors are reported in ${SANITY_RPT}).
 #
-#
-# Create temporary files and make sure it is removed when this script
-# terminates.
-#
-TMP_FILE1=/tmp/`basename $0`.$$
-trap "rm -f ${TMP_FILE}" 0 1 2 15
-
-TMP_FILE2=/tmp/`basename $0`.$$
-trap "rm -f ${TMP_FILE}" 0 1 2 15
-
 echo "" >> ${LOG}
 date >> ${LOG}
-echo "Run sanity checks on the input file" >> ${LOG}
-SANITY_ERROR=0
-
-# reset SANITY_RPT
-rm -f ${SANITY_RPT}; >${SANITY_RPT}
- 
-checkDupLines  ${SOURCE_COPY_INPUT_FILE} ${SANITY_RPT}
-if [ $? -ne 0 ]
-then
-    SANITY_ERROR=1
-fi
-
-checkColumns  ${SOURCE_COPY_INPUT_FILE} ${SANITY_RPT} ${NUM_COLUMNS}
-if [ $? -ne 0 ]
-then
-    SANITY_ERROR=1
-fi
-
-checkLineCount  ${SOURCE_COPY_INPUT_FILE} ${SANITY_RPT} ${FILE_MIN_SIZE}
-if [ $? -ne 0 ]
-then
-    SANITY_ERROR=1
-fi
-
-if [ ${SANITY_ERROR} -ne 0 ]
-then
-    echo "Sanity errors detected. See ${SANITY_RPT}" | tee -a ${LOG}
-    shutDown
-    exit 1
-fi
-
-#
-# run pre-processor to do QC and create allele input file
-#
-${PYTHON} ${PREPROCESSOR} 2>&1 >> ${LOG}
+${PYTHON} ${EMALLOAD}/bin/emalload.py load >> ${LOG} 2>&1
 STAT=$?
-checkStatus ${STAT} "${PREPROCESSOR}"
-
-#
-# run noteload to add colony id notes to existing alleles
-# check to make sure the file exists and is not size 0
-#
-if [ "${LOG_DEBUG}" != "true" ]
-then
-    echo 'executing noteload' >> ${LOG}
-    if [ -s ${CID_NOTE_FILE} ]
-    then
-	echo 'cid file is not empty' >> ${LOG}
-	echo "" >> ${LOG}
-	date >> ${LOG}
-	${NOTELOAD}/mginoteload.csh ${EMALLOAD}/impc_noteload.config
-	STAT=$?
-	checkStatus ${STAT} "CID noteload ${CONFIG}"
-    fi
-fi
-#
-# Create alleles
-#
-echo "" >> ${LOG}
-date >> ${LOG}
-${PYTHON} ./makeAllele.py  2>&1 >> ${LOG}
-STAT=$?
-checkStatus ${STAT} "makeAllele.py ${CONFIG}"
-
-#
-# Archive a copy of the input file, adding a timestamp suffix.
-#
-echo "" >> ${LOG_DIAG}
-date >> ${LOG_DIAG}
-echo "Archive input file" >> ${LOG_DIAG}
-TIMESTAMP=`date '+%Y%m%d.%H%M'`
-ARC_FILE=`basename ${SOURCE_INPUT_FILE}`.${TIMESTAMP}
-cp -p ${SOURCE_INPUT_FILE} ${ARCHIVEDIR}/${ARC_FILE}
+checkStatus ${STAT} "emalload.py load ${CONFIG}"
 
 #
 # Touch the "lastrun" file to note when the load was run.
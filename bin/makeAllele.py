@@ -9,9 +9,19 @@
 #
 # Usage:
 #	makeAllele.py
+#	makeAllele.py --resume
+#	    resume a failed bcp from the checkpoint of the previous run
+#
+#	With ALLELE_WORKERS > 1 the bcp rows are generated in parallel
+#	(see processFileParallel)
+#
+#	Run by emalload.py beside the colony ID noteload, the MGI_Note keys
+#	start at RESERVED_NOTE_KEY, a block reserved by emalload.py, so the
+#	notes of the two loads cannot collide
 #
 # Envvars:
 #	see config file
+#	RESERVED_NOTE_KEY - first of the MGI_Note keys reserved for this run
 # Inputs:
 #
 #	A tab-delimited file in the format:
@@ -61,7 +71,25 @@
 #      2) Open files.
 #      3) Create bcp files
 #      4) Close files.
-#      5) Execute bcp
+#      5) Write a checkpoint of the bcp files and their key ranges
+#      6) Execute bcp, recording each table in the checkpoint as it commits
+#
+#      With --resume, steps 1-5 are skipped and only the tables not
+#      committed by the failed run are bcp'd from the checkpoint. The
+#      key blocks of the checkpoint are reserved (sequences) when it is
+#      written and a table is committed if the rows of this run (by key
+#      and content) are in the database. If a table has only part of
+#      them, or other rows in its key range, the resume is refused: the
+#      rows of this run are deleted from every table and the checkpoint
+#      is renamed checkpoint.failed, so the next run is a new load.
+#
+#      Parallel row generation (ALLELE_WORKERS > 1) splits the input
+#      into one chunk per worker. Each worker resolves its chunk on its
+#      own database connection and counts the keys of each table its
+#      alleles need; each chunk is then given the next block of keys of
+#      each table and a worker writes the bcp rows of the chunk to its
+#      own segment files. The segments are concatenated in chunk order,
+#      so the bcp files are the same as those of a serial run.
 #
 # History
 #
@@ -78,10 +106,19 @@
 
 import sys
 import os
+import io
+import json
+import shutil
+import contextlib
+import multiprocessing
 import db
 import mgi_utils
 import loadlib
 import sourceloadlib
+import emalFile
+import emalMetrics
+import emalSql
+import emalProfile
 
 #
 # from configuration file
@@ -90,10 +127,15 @@ inputFileName = os.getenv('ALLELE_FILE')
 outputDir = os.getenv('OUTPUTDIR')
 BCP_COMMAND = os.getenv('PG_DBUTILS') + '/bin/bcpin.csh'
 newAlleleRptFileName = os.getenv('NEW_ALLELE_RPT')
+checkpointDir = os.getenv('CHECKPOINT_DIR')
+checkpointFileName = checkpointDir + '/checkpoint'
 
 DEBUG = os.getenv('LOG_DEBUG')	# if 'true', in debug mode and  bcp files 
                                 # will not be bcp-ed into the database. Default is 'false'.
 
+alleleWorkers = int(os.getenv('ALLELE_WORKERS') or 1)	# row generation processes
+reservedNoteKey = os.getenv('RESERVED_NOTE_KEY')	# first reserved MGI_Note key
+
 fpDiagFile = ''		# diagnostic file descriptor
 fpErrorFile = ''	# error file descriptor
 fpInputFile = ''	# input file descriptor
@@ -134,6 +176,22 @@ mgiKey = 0              # ACC_AccessionMax.maxNumericPart
 annotKey = 0		# VOC_Annot._Annot_key
 alleleMutationKey = 0   # ALL_Allele_Mutation._Assoc_key
 
+# first key of each table, set by setPrimaryKeys
+# {table: key, ...}
+firstKeyDict = {}
+
+# the load checkpoint: the run, the hash of its input file and one
+# entry per table, in bcp order; a row of the run is identified by its
+# key and the value of its content column (field contentField of the
+# bcp file)
+# {'run', 'input', 'tables' : [{'table', 'keyColumn', 'contentColumn',
+#	'contentField', 'sequence', 'bcpFile', 'firstKey', 'lastKey',
+#	'rows', 'committed'}, ...]}
+checkpoint = {}
+
+linesReadCt = 0		# number of input lines read
+allelesWrittenCt = 0	# number of alleles written to the bcp files
+
 molecularNoteTypeKey = 1021      # MGI_Note._NoteType_key for molecular note
 colonyIdNoteTypeKey = 1041   	 # MGI_Note._NoteType_key for colony id note
 
@@ -162,6 +220,7 @@ def exit(
         sys.stderr.write('\n' + str(message) + '\n')
  
     try:
+        emalSql.writeSummary(fpDiagFile)
         fpDiagFile.write('\n\nEnd Date/Time: %s\n' % (mgi_utils.date()))
         fpErrorFile.write('\n\nEnd Date/Time: %s\n' % (mgi_utils.date()))
         fpDiagFile.close()
@@ -245,8 +304,8 @@ def initialize():
     except:
         exit(1, 'Could not open file %s\n' % annotFileName)
 
-    # Log all SQL
-    db.set_sqlLogFunction(db.sqlLogAll)
+    # Log all SQL, with statement timing (see emalSql.py)
+    emalSql.install(db.sqlLogAll)
 
     fpDiagFile.write('Start Date/Time: %s\n' % (mgi_utils.date()))
     fpDiagFile.write('Server: %s\n' % (db.get_sqlServer()))
@@ -296,8 +355,13 @@ def setPrimaryKeys():
     results = db.sql('select max(_Accession_key) + 1 as nextKey from ACC_Accession', 'auto')
     accKey = results[0]['nextKey']
 
-    results = db.sql(''' select nextval('mgi_note_seq') as nextKey ''', 'auto')
-    noteKey = results[0]['nextKey']
+    # the block reserved by emalload.py (see reserveNotes), else the
+    # next key of the sequence
+    if reservedNoteKey:
+        noteKey = int(reservedNoteKey)
+    else:
+        results = db.sql(''' select nextval('mgi_note_seq') as nextKey ''', 'auto')
+        noteKey = results[0]['nextKey']
 
     results = db.sql('''select max(maxNumericPart) + 1 as nextKey from ACC_AccessionMax 
         where prefixPart = '%s' ''' % (mgiPrefix), 'auto')
@@ -306,6 +370,188 @@ def setPrimaryKeys():
     results = db.sql(''' select nextval('voc_annot_seq') as nextKey ''', 'auto')
     annotKey = results[0]['nextKey']
 
+    firstKeyDict[alleleTable] = alleleKey
+    firstKeyDict[mutationTable] = alleleMutationKey
+    firstKeyDict[refTable] = refAssocKey
+    firstKeyDict[accTable] = accKey
+    firstKeyDict[noteTable] = noteKey
+    firstKeyDict[annotTable] = annotKey
+
+    return 0
+
+def initializeResume():
+    # Purpose: open the log files (append) and read the checkpoint
+    #   for --resume
+    # Returns: 1 if error, else 0
+    # Assumes: Nothing
+    # Effects: Sets global variables
+    # Throws: Nothing
+
+    global fpDiagFile, fpErrorFile, checkpoint
+
+    db.useOneConnection(1)
+
+    head, tail = os.path.split(inputFileName)
+
+    try:
+        fpDiagFile = open(outputDir + '/' + tail + '.diagnostics', 'a')
+        fpErrorFile = open(outputDir + '/' + tail + '.error', 'a')
+    except:
+        exit(1, 'Could not open log files in %s\n' % outputDir)
+
+    try:
+        checkpoint = json.load(open(checkpointFileName, 'r'))
+    except:
+        exit(1, 'Could not read checkpoint %s\n' % checkpointFileName)
+
+    fpDiagFile.write('\nResume Date/Time: %s\n' % (mgi_utils.date()))
+    fpDiagFile.write('Checkpoint: %s\n' % checkpointFileName)
+
+    return 0
+
+def saveCheckpoint():
+    # Purpose: write the checkpoint file
+    # Returns: 1 if error, else 0
+    # Assumes: Nothing
+    # Effects: writes to the file system
+    # Throws: Nothing
+
+    try:
+        fp = open(checkpointFileName + '.new', 'w')
+        json.dump(checkpoint, fp, indent = 1)
+        fp.close()
+        os.rename(checkpointFileName + '.new', checkpointFileName)
+    except:
+        return 1
+    return 0
+
+def writeCheckpoint():
+    # Purpose: save the bcp files and the key range of each table in
+    #   the checkpoint directory before anything is bcp'd
+    # Returns: 1 if error, else 0
+    # Assumes: processFile has been run, bcp files are closed
+    # Effects: writes to the file system
+    # Throws: Nothing
+
+    global checkpoint
+
+    # keys were assigned contiguously from firstKeyDict;
+    # the current value of each key is the next unused key
+    lastKeyDict = {
+        alleleTable : alleleKey - 1,
+        mutationTable : alleleMutationKey - 1,
+        refTable : refAssocKey - 1,
+        accTable : accKey - 1,
+        noteTable : noteKey - 1,
+        annotTable : annotKey - 1 }
+
+    if not os.path.isdir(checkpointDir):
+        os.makedirs(checkpointDir)
+
+    # the MGI_Note block reserved by emalload.py is already past the
+    # sequence; ACC_Accession keys are max + 1 (no sequence)
+    noteSequence = 'mgi_note_seq'
+    if reservedNoteKey:
+        noteSequence = None
+
+    # the run and the input file it loaded, for emalload.py resume
+    inputHash = ''
+    if os.path.exists(os.getenv('SOURCE_COPY_INPUT_FILE') or ''):
+        inputHash = emalFile.hashFile(os.getenv('SOURCE_COPY_INPUT_FILE'))
+
+    checkpoint = {'run' : os.getenv('RUN_ID') or '', 'input' : inputHash,
+        'tables' : []}
+    for table, keyColumn, contentColumn, contentField, sequence, fileName in [ \
+            (alleleTable, '_Allele_key', 'symbol', 8, 'all_allele_seq', alleleFileName), \
+            (mutationTable, '_Assoc_key', '_Allele_key', 1, 'all_allele_mutation_seq', mutationFileName), \
+            (refTable, '_Assoc_key', '_Object_key', 2, 'mgi_reference_assoc_seq', refFileName), \
+            (accTable, '_Accession_key', 'accID', 1, None, accFileName), \
+            (noteTable, '_Note_key', '_Object_key', 1, noteSequence, noteFileName), \
+            (annotTable, '_Annot_key', '_Object_key', 2, 'voc_annot_seq', annotFileName)]:
+
+        # link the bcp file so that it survives the clean up of the
+        # output directory by the next run
+        bcpFile = checkpointDir + '/' + os.path.basename(fileName)
+        if os.path.exists(bcpFile):
+            os.remove(bcpFile)
+        try:
+            os.link(fileName, bcpFile)
+        except OSError:
+            shutil.copyfile(fileName, bcpFile)
+
+        checkpoint['tables'].append({
+            'table' : table,
+            'keyColumn' : keyColumn,
+            'contentColumn' : contentColumn,
+            'contentField' : contentField,
+            'sequence' : sequence,
+            'bcpFile' : bcpFile,
+            'firstKey' : firstKeyDict[table],
+            'lastKey' : lastKeyDict[table],
+            'rows' : lastKeyDict[table] - firstKeyDict[table] + 1,
+            'committed' : False })
+
+    if saveCheckpoint() != 0:
+        return 1
+
+    # reserve the key blocks, so that no other load or insert takes
+    # a key of this run before it is bcp'd or resumed
+    for t in checkpoint['tables']:
+        if t['sequence'] is not None and t['rows'] > 0:
+            db.sql(''' select setval('%s', %s) ''' % (t['sequence'], t['lastKey']), None)
+    db.commit()
+
+    return 0
+
+def readRunRows(t):
+    # Purpose: find the rows of this run in a checkpoint table, by
+    #   their key and content
+    # Returns: tuple (list of the keys of the rows of this run, number
+    #   of the other rows in the key range)
+    # Assumes: database connection
+    # Effects: Nothing
+    # Throws: Nothing
+
+    if t['rows'] == 0:
+        return ([], 0)
+
+    # {key: content, ...}
+    contentDict = {}
+    fp = open(t['bcpFile'], 'r')
+    for line in fp:
+        tokens = str.split(line[:-1], '|')
+        contentDict[int(tokens[0])] = tokens[t['contentField']]
+    fp.close()
+
+    results = db.sql('''select %s as rowKey, %s as content from %s
+        where %s between %s and %s''' % \
+        (t['keyColumn'], t['contentColumn'], t['table'], t['keyColumn'],
+        t['firstKey'], t['lastKey']), 'auto')
+    keyList = [r['rowKey'] for r in results \
+        if contentDict.get(r['rowKey']) == str(r['content'])]
+    return (keyList, len(results) - len(keyList))
+
+def rollbackCheckpoint():
+    # Purpose: delete the rows of this run from the tables of the
+    #   checkpoint, identified by their content (not by key range, which
+    #   may hold rows of other loads); then move the checkpoint aside
+    # Returns: 1 if error, else 0
+    # Assumes: database connection, checkpoint has been read
+    # Effects: deletes from the db, renames the checkpoint
+    # Throws: Nothing
+
+    try:
+        for t in reversed(checkpoint['tables']):
+            keyList, otherCount = readRunRows(t)
+            for i in range(0, len(keyList), 1000):
+                db.sql('delete from %s where %s in (%s)' % (t['table'], t['keyColumn'],
+                    str.join(',', [str(k) for k in keyList[i:i + 1000]])), None)
+            fpDiagFile.write('%s: %s rows of this run deleted\n' % (t['table'], len(keyList)))
+        db.commit()
+        os.rename(checkpointFileName, checkpointFileName + '.failed')
+    except:
+        fpDiagFile.write('Could not roll back the checkpoint: %s\n' % str(sys.exc_info()[1]))
+        return 1
     return 0
 
 def bcpFiles():
@@ -320,21 +566,60 @@ def bcpFiles():
 
     closeFiles()
 
+    if writeCheckpoint() != 0:
+        fpDiagFile.write('Could not write checkpoint %s\n' % checkpointFileName)
+        return 1
+
+    return bcpCheckpoint()
+
+def bcpCheckpoint():
+    # Purpose: BCPs the tables of the checkpoint not yet committed,
+    #   in order, recording each one as it commits; then updates the
+    #   auto-sequences and removes the checkpoint
+    # Returns: 1 if error,  else 0
+    # Assumes: connection to the database, checkpoint has been written
+    #   or read
+    # Effects: copies data into the db
+    # Throws: Nothing
+
     bcpI = '%s %s %s' % (BCP_COMMAND, db.get_sqlServer(), db.get_sqlDatabase())
     bcpII = '"|" "\\n" mgd'
 
-    bcp1 = '%s %s "/" %s %s' % (bcpI, alleleTable, alleleFileName, bcpII)
-    bcp2 = '%s %s "/" %s %s' % (bcpI, mutationTable, mutationFileName, bcpII)
-    bcp3 = '%s %s "/" %s %s' % (bcpI, refTable, refFileName, bcpII)
-    bcp4 = '%s %s "/" %s %s' % (bcpI, accTable, accFileName, bcpII)
-    bcp5 = '%s %s "/" %s %s' % (bcpI, noteTable, noteFileName, bcpII)
-    bcp6 = '%s %s "/" %s %s' % (bcpI, annotTable, annotFileName, bcpII)
-
     db.commit()
 
-    for bcpCmd in [bcp1, bcp2, bcp3, bcp4, bcp5, bcp6]:
-        fpDiagFile.write('%s\n' % bcpCmd)
-        os.system(bcpCmd)
+    for t in checkpoint['tables']:
+        if t['committed']:
+            fpDiagFile.write('%s already committed\n' % t['table'])
+            continue
+
+        # a table is bcp'd in a single COPY, so the rows of this run are
+        # either all there (the failed run committed it but not the
+        # checkpoint), or not there at all
+        keyList, otherCount = readRunRows(t)
+        if len(keyList) == t['rows']:
+            fpDiagFile.write('%s found in the database\n' % t['table'])
+        elif len(keyList) != 0 or otherCount != 0:
+            fpDiagFile.write('%s has %s of %s rows of this run and %s other rows in key range %s-%s; cannot resume\n' % \
+                (t['table'], len(keyList), t['rows'], otherCount, t['firstKey'], t['lastKey']))
+            if rollbackCheckpoint() == 0:
+                fpDiagFile.write('The rows of this run were deleted and the checkpoint moved to %s.failed; the next run is a new load\n' % \
+                    checkpointFileName)
+            else:
+                fpDiagFile.write('Delete the rows of this run (see the bcp files in %s) and remove the checkpoint before the next run; until then each run resumes and fails\n' % \
+                    checkpointDir)
+            return 1
+        elif t['rows'] > 0:
+            bcpCmd = '%s %s "/" %s %s' % (bcpI, t['table'], t['bcpFile'], bcpII)
+            fpDiagFile.write('%s\n' % bcpCmd)
+            emalMetrics.runCommand('bcp.%s' % t['table'], bcpCmd, shell = True)
+            if len(readRunRows(t)[0]) != t['rows']:
+                fpDiagFile.write('bcp of %s failed\n' % t['table'])
+                return 1
+
+        t['committed'] = True
+        if saveCheckpoint() != 0:
+            fpDiagFile.write('Could not write checkpoint %s\n' % checkpointFileName)
+            return 1
 
     # update all_allele_mutation_seq auto-sequence
     db.sql(''' select setval('all_allele_mutation_seq', (select max(_Assoc_key) from ALL_Allele_Mutation)) ''', None)
@@ -353,198 +638,418 @@ def bcpFiles():
 
     db.commit()
 
+    # the load is complete
+    shutil.rmtree(checkpointDir, ignore_errors = True)
+
     return 0
 
-def processFile():
-    # Purpose: Read the input file, resolve values to keys. Create bcp files
-    # Returns: 1 if error,  else 0
-    # Assumes: file descriptors have been initialized
-    # Effects: exits if the line does not have 15 columns
+def resolveLine(line, lineNum):
+    # Purpose: resolve the values of one input line to keys
+    # Returns: dictionary of the values and keys of the allele,
+    #   None if the line has errors (errors are stored (via loadlib)
+    #   in the .error log)
+    # Assumes: database connection, file descriptors have been initialized
+    # Effects: exits if the line does not have 16 columns
+    # Throws: Nothing
+
+    print('%s: %s' % (lineNum, line))
+    # Split the line into tokens
+    tokens = line[:-1].split('\t')
+    try:
+        markerID = tokens[0]
+        markerSymbol = tokens[1]
+        mutationType = tokens[2] 	# IMPC allele type
+        description = tokens[3]
+        colonyID = tokens[4]
+        strainOfOrigin =  tokens[5]
+        alleleSymbol =  tokens[6]
+        alleleName =   tokens[7]
+        inheritanceMode =  tokens[8]
+        alleleType = tokens[9] 	# IMPC allele class
+        alleleSubType  = tokens[10]
+        alleleStatus = tokens[11]
+        transmission = tokens[12]
+        collection = tokens[13]
+        jNum = tokens[14]
+        createdBy  = tokens[15]
+
+    except:
+        print('exiting with invalid line')
+        exit(1, 'Invalid Line (%d): %s\n' % (lineNum, line))
+
+    print('validating data and getting keys')
+    # marker key
+    markerKey = loadlib.verifyMarker(markerID, lineNum, fpErrorFile)
+
+    # _vocab_key = 36 (Allele Molecular Mutation)
+    mutationList = str.split(mutationType, ';')
+    if len(mutationList) > 1:
+       print('mutationList: %s' % mutationList)
+    mutationKeyList = []
+    for m in mutationList:
+        mutationKey = loadlib.verifyTerm('', 36, m, lineNum, fpErrorFile)
+        if mutationKey != 0:
+            mutationKeyList.append(mutationKey)
+    if len(mutationKeyList) > 1:
+        print('mutationKeyList: %s' % mutationKeyList)
+    # strains
+    strainOfOriginKey = sourceloadlib.verifyStrain(strainOfOrigin, lineNum, fpErrorFile)
+
+
+    # _vocab_key = 35 (Allele Inheritance Mode)
+    inheritanceModeKey = loadlib.verifyTerm('', 35, inheritanceMode, lineNum, fpErrorFile)
+
+    # _vocab_key = 38 (Allele Type)
+    alleleTypeKey = loadlib.verifyTerm('', 38, alleleType, lineNum, fpErrorFile)
+
+    # _vocab_key = 93 (Allele Subtype)
+    subTypeList = str.split(alleleSubType, ';')
+    if len(subTypeList) > 1:
+       print('subTypeList: %s' % subTypeList)
+    subTypeKeyList = []
+    for s in subTypeList:
+        if s != '': # if we have a subtype, get it's key
+            subTypeKey = loadlib.verifyTerm('', 93, s, lineNum, fpErrorFile)
+            if subTypeKey != 0:
+                subTypeKeyList.append(subTypeKey)
+    if len(subTypeKeyList) > 1:
+        print('subTypeKeyList: %s' % subTypeKeyList)
+
+    # _vocab_key = 37 (Allele Status)
+    alleleStatusKey = loadlib.verifyTerm('', 37, alleleStatus, lineNum, fpErrorFile)
+
+    # _vocab_key = 61 (Allele Transmission)
+    transmissionKey = loadlib.verifyTerm('', 61, transmission, lineNum, fpErrorFile)
+
+    # _vocab_key = 92
+    collectionKey = loadlib.verifyTerm('', 92, collection, lineNum, fpErrorFile)
+
+    # _vocab_key = 73 (Marker-Allele Association Status)
+    # _term_key = 4268545 (Curated)
+    markerStatusKey = 4268545
+
+    # reference
+    refKey = loadlib.verifyReference(jNum, lineNum, fpErrorFile)
+
+    # creator
+    createdByKey = loadlib.verifyUser(createdBy, lineNum, fpErrorFile)
+    if createdByKey == 0:
+        return None
+
+    print('checking for missing data')
+    # if errors, continue to next record
+    # errors are stored (via loadlib) in the .error log
+    if markerKey == 0 \
+            or mutationKeyList == [] \
+            or strainOfOriginKey == 0 \
+            or inheritanceModeKey == 0 \
+            or alleleTypeKey == 0 \
+            or alleleStatusKey == 0 \
+            or transmissionKey == 0 \
+            or collectionKey == 0 \
+            or refKey == 0 \
+            or createdByKey == 0:
+        print('missing data, skipping this line')
+        return None
+
+    return {
+        'markerID' : markerID,
+        'markerSymbol' : markerSymbol,
+        'markerKey' : markerKey,
+        'description' : description,
+        'colonyID' : colonyID,
+        'alleleSymbol' : alleleSymbol,
+        'alleleName' : alleleName,
+        'mutationKeyList' : mutationKeyList,
+        'strainOfOriginKey' : strainOfOriginKey,
+        'inheritanceModeKey' : inheritanceModeKey,
+        'alleleTypeKey' : alleleTypeKey,
+        'subTypeKeyList' : subTypeKeyList,
+        'alleleStatusKey' : alleleStatusKey,
+        'transmissionKey' : transmissionKey,
+        'collectionKey' : collectionKey,
+        'markerStatusKey' : markerStatusKey,
+        'refKey' : refKey,
+        'createdByKey' : createdByKey }
+
+def writeAllele(r):
+    # Purpose: write the bcp rows of one resolved allele, assigning keys
+    # Returns: Nothing
+    # Assumes: file descriptors have been initialized, primary keys are set
+    # Effects: writes to the bcp files, increments the primary keys
     # Throws: Nothing
 
     global alleleKey, refAssocKey, accKey, noteKey, mgiKey, annotKey
-    global alleleLookup, alleleMutationKey
+    global alleleMutationKey, allelesWrittenCt
+
+    createdByKey = r['createdByKey']
+    refKey = r['refKey']
+
+    # if no errors, process the allele
+    print('writing to allele file')
+    # allele (isWildType = 0)
+    fpAlleleFile.write('%d|%s|%s|%s|%s|%s|%s|%s|%s|%s|0|%s|%s|%s|%s|%s|%s|%s|%s|%s|%s\n' \
+        % (alleleKey, r['markerKey'], r['strainOfOriginKey'], r['inheritanceModeKey'], \
+        r['alleleTypeKey'], r['alleleStatusKey'], r['transmissionKey'], \
+        r['collectionKey'], r['alleleSymbol'], r['alleleName'], \
+        isExtinct, isMixed, refKey, r['markerStatusKey'], \
+        createdByKey, createdByKey, createdByKey, loaddate, loaddate, loaddate))
+
+    # molecular mutation
+    for mutationKey in r['mutationKeyList']:
+        fpMutationFile.write('%s|%s|%s|%s|%s\n' \
+            % (alleleMutationKey, alleleKey, mutationKey, loaddate, loaddate))
+        alleleMutationKey += 1
+
+    # reference associations
+
+    # Original
+    fpRefFile.write('%s|%s|%s|%s|%s|%s|%s|%s|%s\n' \
+        % (refAssocKey, refKey, alleleKey, mgiTypeKey, origRefTypeKey, \
+                    createdByKey, createdByKey, loaddate, loaddate))
+    refAssocKey = refAssocKey + 1
+
+    # Molecular
+    fpRefFile.write('%s|%s|%s|%s|%s|%s|%s|%s|%s\n' \
+        % (refAssocKey, refKey, alleleKey, mgiTypeKey, molRefTypeKey, \
+                    createdByKey, createdByKey, loaddate, loaddate))
+    refAssocKey = refAssocKey + 1
+
+    # allele subtype
+    for subTypeKey in r['subTypeKeyList']:
+        fpAnnotFile.write('%s|%s|%s|%s|%s|%s|%s\n' \
+                % (annotKey, annotTypeKey, alleleKey, subTypeKey, \
+                        qualifierKey, loaddate, loaddate))
+        annotKey = annotKey + 1
+
+    # MGI Accession ID for the allele
+    alleleID = '%s%s' % (mgiPrefix, mgiKey)
+    fpAccFile.write('%s|%s|%s|%s|1|%d|%d|0|1|%s|%s|%s|%s\n' \
+        % (accKey, alleleID, mgiPrefix, mgiKey, alleleKey, mgiTypeKey, \
+           createdByKey, createdByKey, loaddate, loaddate))
+
+    # storing data in MGI_Note
+    # molecular note
+
+    if r['description'] != '':
+        fpNoteFile.write('%s|%s|%s|%s|%s|%s|%s|%s|%s\n' \
+            % (noteKey, alleleKey, mgiTypeKey, molecularNoteTypeKey, r['description'],\
+               createdByKey, createdByKey, loaddate, loaddate))
 
-    lineNum = 0
-    # For each line in the input file
+        noteKey = noteKey + 1
+
+    # colony ID note
+    fpNoteFile.write('%s|%s|%s|%s|%s|%s|%s|%s|%s\n' \
+        % (noteKey, alleleKey, mgiTypeKey, colonyIdNoteTypeKey, r['colonyID'], \
+           createdByKey, createdByKey, loaddate, loaddate))
+
+    noteKey = noteKey + 1
 
-    for line in fpInputFile.readlines():
+    # Print out a new text file and attach the new MGI Allele IDs 
+    # as the last field
+
+    fpNewAlleleRptFile.write('%s\t%s\t%s\t%s\t%s\t%s\n' \
+    % (mgi_utils.prvalue(alleleID), \
+    mgi_utils.prvalue(r['alleleSymbol']), \
+    mgi_utils.prvalue(r['alleleName']), \
+    mgi_utils.prvalue(r['markerID']), \
+    mgi_utils.prvalue(r['markerSymbol']), \
+    mgi_utils.prvalue(r['colonyID'])))
+
+    accKey = accKey + 1
+    mgiKey = mgiKey + 1
+    alleleKey = alleleKey + 1
+    allelesWrittenCt += 1
+
+    return
+
+def keyCounts(r):
+    # Purpose: count the keys of each table needed by one resolved allele
+    # Returns: list of counts, in the order of keyNames
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
+
+    noteCt = 1
+    if r['description'] != '':
+        noteCt = 2
+    return [1, len(r['mutationKeyList']), 2, 1, noteCt, len(r['subTypeKeyList']), 1]
+
+# the key globals, in the order of keyCounts()
+keyNames = ['alleleKey', 'alleleMutationKey', 'refAssocKey', 'accKey',
+    'noteKey', 'annotKey', 'mgiKey']
+
+def initWorker():
+    # Purpose: open the database connection of a row generation worker
+    # Returns: Nothing
+    # Assumes: the parent closed its connection before the fork
+    # Effects: connects to the database
+    # Throws: Nothing
+
+    db.useOneConnection(1)
+
+def resolveChunk(chunk):
+    # Purpose: resolve the lines of one chunk (in a worker)
+    # Returns: (status, resolved alleles, key counts, error log text,
+    #   output text, sql statistics, sql plans); status is 1 if a line
+    #   is invalid, else 0
+    # Assumes: initWorker() has been called
+    # Effects: Nothing
+    # Throws: Nothing
 
-        error = 0
-        lineNum = lineNum + 1
-        print('%s: %s' % (lineNum, line))
-        # Split the line into tokens
-        tokens = line[:-1].split('\t')
+    global fpErrorFile
+
+    # errors and output are returned so the parent writes them in order
+    fpErrors = io.StringIO()
+    fpErrorFile = fpErrors
+    fpOut = io.StringIO()
+    emalSql.reset()
+    rList = []
+    countList = [0] * len(keyNames)
+    status = 0
+    with contextlib.redirect_stdout(fpOut):
         try:
-            markerID = tokens[0]
-            markerSymbol = tokens[1]
-            mutationType = tokens[2] 	# IMPC allele type
-            description = tokens[3]
-            colonyID = tokens[4]
-            strainOfOrigin =  tokens[5]
-            alleleSymbol =  tokens[6]
-            alleleName =   tokens[7]
-            inheritanceMode =  tokens[8]
-            alleleType = tokens[9] 	# IMPC allele class
-            alleleSubType  = tokens[10]
-            alleleStatus = tokens[11]
-            transmission = tokens[12]
-            collection = tokens[13]
-            jNum = tokens[14]
-            createdBy  = tokens[15]
-
-        except:
-            print('exiting with invalid line')
-            exit(1, 'Invalid Line (%d): %s\n' % (lineNum, line))
-
-        print('validating data and getting keys')
-        # marker key
-        markerKey = loadlib.verifyMarker(markerID, lineNum, fpErrorFile)
-
-        # _vocab_key = 36 (Allele Molecular Mutation)
-        mutationList = str.split(mutationType, ';')
-        if len(mutationList) > 1:
-           print('mutationList: %s' % mutationList)
-        mutationKeyList = []
-        for m in mutationList:
-            mutationKey = loadlib.verifyTerm('', 36, m, lineNum, fpErrorFile)
-            if mutationKey != 0:
-                mutationKeyList.append(mutationKey)
-        if len(mutationKeyList) > 1:
-            print('mutationKeyList: %s' % mutationKeyList)
-        # strains
-        strainOfOriginKey = sourceloadlib.verifyStrain(strainOfOrigin, lineNum, fpErrorFile)
-
-
-        # _vocab_key = 35 (Allele Inheritance Mode)
-        inheritanceModeKey = loadlib.verifyTerm('', 35, inheritanceMode, lineNum, fpErrorFile)
-
-        # _vocab_key = 38 (Allele Type)
-        alleleTypeKey = loadlib.verifyTerm('', 38, alleleType, lineNum, fpErrorFile)
-
-        # _vocab_key = 93 (Allele Subtype)
-        subTypeList = str.split(alleleSubType, ';')
-        if len(subTypeList) > 1:
-           print('subTypeList: %s' % subTypeList)
-        subTypeKeyList = []
-        for s in subTypeList:
-            if s != '': # if we have a subtype, get it's key
-                subTypeKey = loadlib.verifyTerm('', 93, s, lineNum, fpErrorFile)
-                if subTypeKey != 0:
-                    subTypeKeyList.append(subTypeKey)
-        if len(subTypeKeyList) > 1:
-            print('subTypeKeyList: %s' % subTypeKeyList)
-
-        # _vocab_key = 37 (Allele Status)
-        alleleStatusKey = loadlib.verifyTerm('', 37, alleleStatus, lineNum, fpErrorFile)
-
-        # _vocab_key = 61 (Allele Transmission)
-        transmissionKey = loadlib.verifyTerm('', 61, transmission, lineNum, fpErrorFile)
-
-        # _vocab_key = 92
-        collectionKey = loadlib.verifyTerm('', 92, collection, lineNum, fpErrorFile)
-
-        # _vocab_key = 73 (Marker-Allele Association Status)
-        # _term_key = 4268545 (Curated)
-        markerStatusKey = 4268545
-
-        # reference
-        refKey = loadlib.verifyReference(jNum, lineNum, fpErrorFile)
-
-        # creator
-        createdByKey = loadlib.verifyUser(createdBy, lineNum, fpErrorFile)
-        if createdByKey == 0:
-            continue
+            for lineNum, line in chunk:
+                r = resolveLine(line, lineNum)
+                if r is not None:
+                    rList.append(r)
+                    countList = [c + n for c, n in zip(countList, keyCounts(r))]
+        except SystemExit:
+            # exit() has closed the error log of the chunk
+            status = 1
+    errors = ''
+    if not fpErrors.closed:
+        errors = fpErrors.getvalue()
+    return (status, rList, countList, errors, fpOut.getvalue(),
+        emalSql.statDict, emalSql.planDict)
+
+def segmentName(fileName, chunkNum):
+    # Purpose: name the segment of a bcp file written for one chunk
+    # Returns: file name
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
 
-        print('checking for missing data')
-        # if errors, continue to next record
-        # errors are stored (via loadlib) in the .error log
-        if markerKey == 0 \
-                or mutationKeyList == [] \
-                or strainOfOriginKey == 0 \
-                or inheritanceModeKey == 0 \
-                or alleleTypeKey == 0 \
-                or alleleStatusKey == 0 \
-                or transmissionKey == 0 \
-                or collectionKey == 0 \
-                or refKey == 0 \
-                or createdByKey == 0:
-            print('missing data, skipping this line')
-            continue
+    return '%s.%s' % (fileName, chunkNum)
 
-        # if no errors, process the allele
-        print('writing to allele file')
-        # allele (isWildType = 0)
-        fpAlleleFile.write('%d|%s|%s|%s|%s|%s|%s|%s|%s|%s|0|%s|%s|%s|%s|%s|%s|%s|%s|%s|%s\n' \
-            % (alleleKey, markerKey, strainOfOriginKey, inheritanceModeKey, alleleTypeKey, \
-            alleleStatusKey, transmissionKey, collectionKey, alleleSymbol, alleleName, \
-            isExtinct, isMixed, refKey, markerStatusKey, \
-            createdByKey, createdByKey, createdByKey, loaddate, loaddate, loaddate))
-
-        # molecular mutation
-        for mutationKey in mutationKeyList:
-            fpMutationFile.write('%s|%s|%s|%s|%s\n' \
-                % (alleleMutationKey, alleleKey, mutationKey, loaddate, loaddate))
-            alleleMutationKey += 1
-
-        # reference associations
-
-        # Original
-        fpRefFile.write('%s|%s|%s|%s|%s|%s|%s|%s|%s\n' \
-            % (refAssocKey, refKey, alleleKey, mgiTypeKey, origRefTypeKey, \
-                        createdByKey, createdByKey, loaddate, loaddate))
-        refAssocKey = refAssocKey + 1
-
-        # Molecular
-        fpRefFile.write('%s|%s|%s|%s|%s|%s|%s|%s|%s\n' \
-            % (refAssocKey, refKey, alleleKey, mgiTypeKey, molRefTypeKey, \
-                        createdByKey, createdByKey, loaddate, loaddate))
-        refAssocKey = refAssocKey + 1
-
-        # allele subtype
-        for subTypeKey in subTypeKeyList:
-            fpAnnotFile.write('%s|%s|%s|%s|%s|%s|%s\n' \
-                    % (annotKey, annotTypeKey, alleleKey, subTypeKey, \
-                            qualifierKey, loaddate, loaddate))
-            annotKey = annotKey + 1
-
-        # MGI Accession ID for the allele
-        alleleID = '%s%s' % (mgiPrefix, mgiKey)
-        fpAccFile.write('%s|%s|%s|%s|1|%d|%d|0|1|%s|%s|%s|%s\n' \
-            % (accKey, alleleID, mgiPrefix, mgiKey, alleleKey, mgiTypeKey, \
-               createdByKey, createdByKey, loaddate, loaddate))
+# the bcp file names and descriptor globals, for the segments
+segmentFiles = [(alleleFileName, 'fpAlleleFile'), (mutationFileName, 'fpMutationFile'),
+    (refFileName, 'fpRefFile'), (accFileName, 'fpAccFile'),
+    (noteFileName, 'fpNoteFile'), (annotFileName, 'fpAnnotFile'),
+    (newAlleleRptFileName, 'fpNewAlleleRptFile')]
+
+def writeChunk(args):
+    # Purpose: write the bcp rows of one chunk to its segment files
+    #   (in a worker), starting from the first key of each table
+    #   reserved for the chunk
+    # Returns: output text
+    # Assumes: Nothing
+    # Effects: writes segment files
+    # Throws: Nothing
 
-        # storing data in MGI_Note
-        # molecular note
+    chunkNum, rList, keyList = args
+    g = globals()
+    for name, key in zip(keyNames, keyList):
+        g[name] = key
+    for fileName, fpName in segmentFiles:
+        g[fpName] = open(segmentName(fileName, chunkNum), 'w')
+
+    fpOut = io.StringIO()
+    with contextlib.redirect_stdout(fpOut):
+        for r in rList:
+            writeAllele(r)
+
+    for fileName, fpName in segmentFiles:
+        g[fpName].close()
+    return fpOut.getvalue()
+
+def processFileParallel(lineList):
+    # Purpose: resolve the lines and create the bcp files with
+    #   alleleWorkers processes
+    # Returns: Nothing
+    # Assumes: file descriptors have been initialized, primary keys are set
+    # Effects: writes to the bcp files, sets the primary keys to the
+    #   next unused keys; exits if a line does not have 16 columns
+    # Throws: Nothing
 
-        if description != '':
-            fpNoteFile.write('%s|%s|%s|%s|%s|%s|%s|%s|%s\n' \
-                % (noteKey, alleleKey, mgiTypeKey, molecularNoteTypeKey, description,\
-                   createdByKey, createdByKey, loaddate, loaddate))
+    global allelesWrittenCt
 
-            noteKey = noteKey + 1
+    chunkSize = (len(lineList) + alleleWorkers - 1) // alleleWorkers
+    chunkList = []
+    for i in range(0, len(lineList), chunkSize):
+        chunkList.append([(n + 1, lineList[n]) for n in range(i, min(i + chunkSize, len(lineList)))])
 
-        # colony ID note
-        fpNoteFile.write('%s|%s|%s|%s|%s|%s|%s|%s|%s\n' \
-            % (noteKey, alleleKey, mgiTypeKey, colonyIdNoteTypeKey, colonyID, \
-               createdByKey, createdByKey, loaddate, loaddate))
+    # the workers open their own connections; nothing buffered may be
+    # inherited
+    for fp in [fpDiagFile, fpErrorFile, fpNewAlleleRptFile, sys.stdout, sys.stderr]:
+        fp.flush()
+    db.useOneConnection(0)
 
-        noteKey = noteKey + 1
+    pool = multiprocessing.get_context('fork').Pool(alleleWorkers, initWorker)
+    resultList = pool.map(resolveChunk, chunkList)
+
+    # reserve the key block of each chunk: the keys of the chunks before it
+    g = globals()
+    argList = []
+    keyList = [g[name] for name in keyNames]
+    for chunkNum, (status, rList, countList, errors, output, statDict, planDict) \
+            in enumerate(resultList):
+        fpErrorFile.write(errors)
+        sys.stdout.write(output)
+        emalSql.merge(statDict, planDict)
+        if status != 0:
+            pool.terminate()
+            db.useOneConnection(1)
+            exit(1, 'Invalid Line in chunk %s\n' % chunkNum)
+        argList.append((chunkNum, rList, keyList))
+        keyList = [k + c for k, c in zip(keyList, countList)]
+        allelesWrittenCt += len(rList)
+
+    outputList = pool.map(writeChunk, argList)
+    pool.close()
+    pool.join()
+    db.useOneConnection(1)
 
-        # Print out a new text file and attach the new MGI Allele IDs 
-        # as the last field
+    # the next unused keys
+    for name, key in zip(keyNames, keyList):
+        g[name] = key
 
-        fpNewAlleleRptFile.write('%s\t%s\t%s\t%s\t%s\t%s\n' \
-        % (mgi_utils.prvalue(alleleID), \
-        mgi_utils.prvalue(alleleSymbol), \
-        mgi_utils.prvalue(alleleName), \
-        mgi_utils.prvalue(markerID), \
-        mgi_utils.prvalue(markerSymbol), \
-        mgi_utils.prvalue(colonyID)))
+    # concatenate the segments in order
+    for chunkNum, output in enumerate(outputList):
+        sys.stdout.write(output)
+        for fileName, fpName in segmentFiles:
+            fpSegment = open(segmentName(fileName, chunkNum), 'r')
+            shutil.copyfileobj(fpSegment, g[fpName])
+            fpSegment.close()
+            os.remove(segmentName(fileName, chunkNum))
 
-        accKey = accKey + 1
-        mgiKey = mgiKey + 1
-        alleleKey = alleleKey + 1
+    return
+
+def processFile():
+    # Purpose: Read the input file, resolve values to keys. Create bcp files
+    # Returns: 1 if error,  else 0
+    # Assumes: file descriptors have been initialized
+    # Effects: exits if the line does not have 16 columns
+    # Throws: Nothing
+
+    global linesReadCt
+
+    lineNum = 0
+    # For each line in the input file
+
+    lineList = fpInputFile.readlines()
+    if alleleWorkers > 1 and len(lineList) > 1:
+        processFileParallel(lineList)
+        lineNum = len(lineList)
+    else:
+        for line in lineList:
+
+            lineNum = lineNum + 1
+            r = resolveLine(line, lineNum)
+            if r is not None:
+                writeAllele(r)
+
+    linesReadCt = lineNum
 
     #
     # Update the AccessionMax value
@@ -560,16 +1065,29 @@ def processFile():
 #  MAIN
 #
 
-if initialize() != 0:
-    sys.exit(1)
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--resume':
+        if initializeResume() != 0:
+            sys.exit(1)
+        if bcpCheckpoint() != 0:
+            exit(1)
+        exit(0)
+
+    if emalProfile.run('initialize', initialize) != 0:
+        sys.exit(1)
+
+    if emalProfile.run('setPrimaryKeys', setPrimaryKeys) != 0:
+        sys.exit(1)
 
-if setPrimaryKeys() != 0:
-    sys.exit(1)
+    emalMetrics.startStage('rowgen')
+    if emalProfile.run('processFile', processFile) != 0:
+        sys.exit(1)
+    emalMetrics.endStage('rowgen', rowsIn = linesReadCt, rowsOut = allelesWrittenCt, \
+        counts = {'workers' : alleleWorkers})
 
-if processFile() != 0:
-    sys.exit(1)
+    if emalProfile.run('bcpFiles', bcpFiles) != 0:
+        exit(1)
 
-if bcpFiles() != 0:
-    sys.exit(1)
+    emalSql.writeSummary(fpDiagFile)
 
-sys.exit(0)
+    sys.exit(0)
@@ -23,6 +23,7 @@
 #  Inputs:
 #
 #      IMPC file ($SOURCE_COPY_INPUT_FILE) - the latest 9 col version from GenTar
+#           may be gzip or zstd compressed
 #           text is from the column header       
 #       field 1: Gene Symbol
 #       field 2: Gene MGI Accession ID
@@ -83,8 +84,20 @@
 
 import sys 
 import os
+import time
 import db
 import re
+import functools
+import loadlib
+import emalMetrics
+import emalFile
+import emalQC
+import emalSql
+import emalProfile
+import emalQCSql
+import emalCheck
+import emalSuggest
+import emalLedger
 
 
 CRT = '\n'
@@ -123,6 +136,18 @@ fpAllele = None
 # allele MGI ID\tColony ID
 fpNoteload = None
 
+# in-process colony ID noteload (instead of mginoteload.csh)
+# if 'true' the resolved (allele key, colony ID) pairs are bcp'd directly
+cidNoteInProcess = ''
+cidNoteBcpFile = None
+
+# if 'true', in debug mode and notes will not be bcp-ed into the database
+DEBUG = ''
+
+# colony ID notes to add to existing alleles
+# [(alleleKey, colonyID, input line number, allele ID), ...]
+cidNoteList = []
+
 #
 # lookups
 #
@@ -137,8 +162,8 @@ impcSubTypeList = []
 # allele type/subtype translation
 alleleTypeTransDict = {}
 
-# colonyId to allele symbol in database
-# {colonyID: [a1, ...an], ...}
+# colonyId to allele symbol in database, keyed by colonyKey(colonyID)
+# {colonyKey: [a1, ...an], ...}
 colonyToAlleleDict = {}
 
 # allele lookup by symbol
@@ -157,9 +182,8 @@ labCodeDict = {}
 # regex to find labcode in symbol
 labCodeFinder = re.compile ('\)(\w+)')
 
-# regex to check for multiple < or > in symbol
-pattern1 = r'<'
-pattern2 = r'>'
+# regex to find the em sequence number in symbol
+seqNumFinder = re.compile ('<em(.*)\(')
 
 # marker ID to marker name lookup (for Allele Name construction)
 # {markerID: markerName|symbol, ...}
@@ -168,8 +192,93 @@ markerDict = {}
 # {alleleKey:colonyIDNote, ...}
 colonyDict = {}
 
-# list of standard and non-private strains in the database
-strainList = []
+# non-private strains in the database, by strain name and synonym
+# {strain name or synonym: strain name, ...}
+strainDict = {}
+
+# GenTar colony background strain to MGI strain translation
+# {GenTar strain: MGI strain, ...}
+strainTransDict = {}
+
+# lookup loading (LOOKUP_MODE): 'full' loads every allele, colony ID note
+# and marker; 'selective' loads only those the input file references
+lookupMode = 'full'
+
+# selective loading falls back to full above this number of distinct
+# input values (LOOKUP_SELECTIVE_MAX)
+lookupSelectiveMax = 100000
+
+# QC engine (QC_ENGINE): 'python' evaluates the QC one line at a time
+# (createAlleleFile), 'sqlite' as set-based queries (see emalQCSql.py)
+qcEngine = 'python'
+
+# the lookup snapshot for emalCheck.py (LOOKUP_SNAPSHOT), written when
+# the lookups are loaded in full; not written if not set
+lookupSnapshot = None
+
+# number of nearest MGI values suggested for a mismatched allele symbol,
+# colony ID or lab code (QC_SUGGEST_K); 0 for no suggestions
+suggestK = 0
+
+# the QC categories that carry suggestions, and the kind of MGI value
+# suggested for their input value (see suggest())
+# {spool name: kind, ...}
+suggestSpoolDict = {
+    'alleleIdMatchAlleleSSMismatch' : 'symbol',
+    'cidMatchAlleleSSMismatch' : 'symbol',
+    'symbolMatchColonyIdMismatch' : 'colony',
+    'labCodeNotInMgi' : 'labCode' }
+
+# the n-gram index of each kind of MGI value, built from the lookups
+# when the first suggestion is needed; cleared when the lookups are loaded
+# {kind: emalSuggest.NgramIndex, ...}
+suggestIndexDict = {}
+
+# the lookup queries of the run, for the diagnostic log
+# [(query name, rows, seconds), ...]
+lookupQueryList = []
+
+# estimated memory of the lookups, from lookupSize()
+lookupBytes = 0
+
+# the restriction added to each lookup query in selective mode
+# {query name: sql, ...}
+lookupFilterDict = {
+    'colonyToAllele' : '''
+        and (n.note like '%|%'
+            or lower(trim(n.note)) in
+                (select value from emal_lookup where kind = 'colony'))''',
+    'colonyNote' : '''
+        and n._Object_key in (select _Allele_key from emal_allele)''',
+    'allele' : '''
+        and a._Allele_key in (select _Allele_key from emal_allele)''',
+    'marker' : '''
+        and a.accid in (select value from emal_lookup where kind = 'marker')''' }
+
+# the source tables of each lookup, for refreshLookups(); the allele
+# lookup also depends on the colony ID notes (buildAlleleDicts)
+# {query name: [source table, ...], ...}
+lookupSourceDict = {
+    'colonyToAllele' : ['MGI_Note', 'ALL_Allele', 'MRK_Marker',
+        'ACC_Accession', 'VOC_Term'],
+    'colonyNote' : ['MGI_Note'],
+    'allele' : ['MGI_Note', 'ALL_Allele', 'MRK_Marker', 'ACC_Accession',
+        'VOC_Term'],
+    'labCode' : ['VOC_Term'],
+    'marker' : ['MRK_Marker', 'ACC_Accession'],
+    'strain' : ['PRB_Strain', 'MGI_Synonym'] }
+
+# the rows of each source table the lookups read
+# {source table: sql restriction, ...}
+sourceFilterDict = {
+    'MGI_Note' : 'where _NoteType_key = 1041',
+    'ACC_Accession' : 'where _MGIType_key in (2, 11) and _LogicalDB_key = 1',
+    'MGI_Synonym' : 'where _MGIType_key = 10' }
+
+# the signature (row count, latest modification date) of each source
+# table when the lookups were loaded by loadWarm()/refreshLookups()
+# {source table: (count, modification date), ...}
+sourceSignatureDict = {}
 
 # template for creating allelel name for new alleles
 # marker name, sequenceNum, lab code name
@@ -187,41 +296,64 @@ allelesFoundCt = 0
 # current line number - used for Total count in reporting
 lineNum = 0
 
+# number of input lines whose 7.2.A1 checks are run together, column-wise
+qcBatchSize = 10000
+
 # current set of alleles seen in the input, this is the calculated symbol
 # using marker symbol and allele subscript from the input
 # key = calculated symbol, value = list of lists
 # each member of list represents one line from input
 # inner list as three parts
-# 1. alleleFile line, 2. input line number, 3. input line
+# 1. alleleFile line, 2. input line number, 3. input line reference
 calcAlleleDict = {}
 
 #
-# QC lists for reporting errors
+# QC lists for reporting errors; each is spooled to a file as the
+# errors are found (see emalQC.py)
+# Spool(name, rule code, names of the rule fields that follow the
+#	line number in the report entry, entry suffix)
 #
-missingRequiredValueList = []	
-labCodeNotInMgiList = []	
-badNomenList = []
-markerIdNotInMgiList = []	
-strainNotInMgiList = []		
-unknownAlleleClassList = []     
-unknownAlleleTypeList = []      
-unknownSubTypeList = []
-alleleIdNotInMGIList = []	
-alleleIdMatchAlleleStatusDiscrepList = []	
-alleleIdMatchMarkerIdMismatchList = []		
-alleleIdMatchAlleleSSMismatchList = []  	
-alleleIdMatchColonyIDMismatchList = []  	
-alleleIdMatchColonyIdMatchToMultiList = []	
-alleleIdMatchColonyIdMatchToDiffAlleleList = []	
-cidMatchToMultiList = []		
-cidMatchMarkerIdMismatchList = []		
-cidMatchAlleleSSMismatchList = []               
-cidMatchAlleleStatusDiscrepList = []
-symbolMatchAlleleStatusDiscrepList = []		
-symbolMatchColonyIdMismatchList = []		
-symbolMatchMultiAlleleList  = []	
-dupeAlleleInInputList = []
-atTransKeyNotInMgiList = []
+missingRequiredValueList = emalQC.Spool('missingRequiredValue', '7.2.A1.missing',
+    ['missingValues'])
+labCodeNotInMgiList = emalQC.Spool('labCodeNotInMgi', '7.2.I', ['labCode'])
+badNomenList = emalQC.Spool('badNomen', 'nomen', ['alleleSymbol'])
+markerIdNotInMgiList = emalQC.Spool('markerIdNotInMgi', '7.2.A1.marker')
+strainNotInMgiList = emalQC.Spool('strainNotInMgi', '7.2.A1.strain')
+unknownAlleleClassList = emalQC.Spool('unknownAlleleClass', '7.2.A1.class')
+unknownAlleleTypeList = emalQC.Spool('unknownAlleleType', '7.2.A1.type')
+unknownSubTypeList = emalQC.Spool('unknownSubType', '7.2.A1.subtype')
+alleleIdNotInMGIList = emalQC.Spool('alleleIdNotInMGI', '7.2.C1', ['objectType'])
+alleleIdMatchAlleleStatusDiscrepList = emalQC.Spool('alleleIdMatchAlleleStatusDiscrep',
+    '7.2.D3', ['dbAlleleStatus'])
+alleleIdMatchMarkerIdMismatchList = emalQC.Spool('alleleIdMatchMarkerIdMismatch',
+    '7.2.D1', ['alleleID', 'alleleSymbol', 'dbMarkerID', 'dbMarkerSymbol'])
+alleleIdMatchAlleleSSMismatchList = emalQC.Spool('alleleIdMatchAlleleSSMismatch',
+    '7.2.D2', ['dbAlleleID', 'dbAlleleSymbol'])
+alleleIdMatchColonyIDMismatchList = emalQC.Spool('alleleIdMatchColonyIDMismatch',
+    '7.2.D4a', ['alleleID', 'dbAlleleSymbol', 'dbColonyID'])
+alleleIdMatchColonyIdMatchToMultiList = emalQC.Spool('alleleIdMatchColonyIdMatchToMulti',
+    '7.2.D4b.multi', ['alleleID', 'dbAlleleSymbol', 'dbColonyID', 'dbMatchAlleleID',
+    'dbMatchAlleleSymbol', 'dbMatchAlleleType', 'dbMatchColonyID'])
+alleleIdMatchColonyIdMatchToDiffAlleleList = emalQC.Spool('alleleIdMatchColonyIdMatchToDiffAllele',
+    '7.2.D4b.diff', ['alleleID', 'dbAlleleSymbol', 'dbColonyID', 'dbMatchAlleleID',
+    'dbMatchAlleleSymbol', 'dbMatchAlleleType', 'dbMatchColonyID'])
+# F1 and duplicate entries end with an extra CRT in the report
+cidMatchToMultiList = emalQC.Spool('cidMatchToMulti', '7.2.F1',
+    ['dbAlleleID', 'dbAlleleSymbol'], CRT)
+cidMatchMarkerIdMismatchList = emalQC.Spool('cidMatchMarkerIdMismatch', '7.2.F2a',
+    ['dbAlleleID', 'dbAlleleSymbol'])
+cidMatchAlleleSSMismatchList = emalQC.Spool('cidMatchAlleleSSMismatch', '7.2.F2b',
+    ['dbAlleleID', 'dbAlleleSymbol'])
+cidMatchAlleleStatusDiscrepList = emalQC.Spool('cidMatchAlleleStatusDiscrep', '7.2.F3',
+    ['dbAlleleID', 'dbAlleleSymbol', 'dbAlleleStatus'])
+symbolMatchAlleleStatusDiscrepList = emalQC.Spool('symbolMatchAlleleStatusDiscrep', '7.2.H1',
+    ['dbAlleleID', 'dbAlleleSymbol', 'dbAlleleStatus'])
+symbolMatchColonyIdMismatchList = emalQC.Spool('symbolMatchColonyIdMismatch', '7.2.H2',
+    ['dbAlleleID', 'dbAlleleSymbol', 'dbColonyID'])
+symbolMatchMultiAlleleList = emalQC.Spool('symbolMatchMultiAllele', '7.2.H3',
+    ['dbAlleleID', 'dbAlleleSymbol'])
+dupeAlleleInInputList = emalQC.Spool('dupeAlleleInInput', 'dupe', [], CRT)
+atTransKeyNotInMgiList = emalQC.Spool('atTransKeyNotInMgi', '7.2.A1g', ['impcKey'])
 
 class Allele:
     #
@@ -229,7 +361,8 @@ class Allele:
     # Has: a set of allele attributes
     # Does: provides direct access to its attributes
     #
-    def __init__(self, alleleID,    # str.- allele  MGI ID
+    def __init__(self, alleleKey,   # integer - allele primary key
+            alleleID,               # str.- allele  MGI ID
             alleleSymbol,           # str.- allele symbol
             alleleStatus,	    # str.- allele status
             alleleType,		    # str.- allele type
@@ -237,6 +370,7 @@ class Allele:
             markerSymbol,	    # str.- marker symbol
             markerKey,              # integer - marker primary key
             colonyID):		    # str.- pipe delim colony ID string
+        self.ak = alleleKey
         self.aid = alleleID
         self.asym = alleleSymbol
         self.ast = alleleStatus
@@ -248,6 +382,44 @@ class Allele:
     def toString(this):
         return '%s, %s, %s, %s, %s, %s, %s' % (this.aid, this.asym, this.ast, this.mid, this.ms, this.mk, this.cid)
 
+class AlleleSymbol:
+    #
+    # Is: a parsed endonuclease-mediated allele symbol
+    # Has: gene symbol, superscript, em sequence number, lab code,
+    #   nomenclature check
+    # Does: parses the symbol once (see parseAlleleSymbol)
+    #
+    def __init__(self, symbol): # str.- allele symbol
+        self.symbol = symbol
+
+        # more than one '<' or '>' is bad nomenclature
+        self.isBadNomen = int(symbol.count('<') > 1 or symbol.count('>') > 1)
+
+        # gene symbol<superscript>; a symbol without '<' is a superscript
+        start = symbol.find('<')
+        if start == -1:
+            self.geneSymbol = ''
+            self.superscript = symbol
+        else:
+            end = symbol.find('>', start)
+            if end == -1:
+                end = len(symbol)
+            self.geneSymbol = symbol[:start]
+            self.superscript = symbol[start + 1:end]
+
+        # match ')' literally then get group where token(s) in 
+        # [a-zA-Z0-9_] (\w) and at least one token (+)
+        self.labCode = ''
+        match = labCodeFinder.search(symbol)
+        if match:
+            self.labCode = match.group(1)
+
+        # None if there is no '<em...(' 
+        self.seqNum = None
+        match = seqNumFinder.search(symbol)
+        if match:
+            self.seqNum = match.group(1)
+
 def initialize():
     # Purpose: create lookups, open files
     #   get max keys from the db
@@ -256,15 +428,47 @@ def initialize():
     # Effects: Sets global variables, exits if a file can't be opened,
     #  creates files in the file system
 
-    global logDiagFile, logCurFile, qcFile, impcFile, alleleFile, noteloadFile
-    global jNumber, createdBy, inHeritMode, alleleStatus
-    global transmissionState, alleleCollection, strainList
-    global colonyToAlleleDict, alleleBySymbolDict, labCodeDict, markerDict
-    global colonyDict, host, alleleTypeTransDict, impcAlleleTypeList
-    global impcSubTypeList, calcAlleleDict
+    global lookupMode
 
     db.useOneConnection(1)
 
+    configure()
+
+    if openFiles() != 0:
+        sys.exit(1)
+
+    # restrict the lookups to the input values, or load them all
+    filterDict = {}
+    if lookupMode == 'selective':
+        if uploadInput() == 0:
+            filterDict = lookupFilterDict
+        else:
+            lookupMode = 'full'
+
+    loadLookups(filterDict)
+    writeColonyFanOut()
+    writeLookupStats()
+    if lookupMode == 'full':
+        writeSnapshot()
+
+    return 0
+
+def configure():
+    # Purpose: read the configuration
+    # Returns: Nothing
+    # Assumes: Nothing
+    # Effects: Sets global variables
+    # Throws: Nothing
+
+    global logDiagFile, logCurFile, qcFile, impcFile, alleleFile, noteloadFile
+    global jNumber, createdBy, inHeritMode, alleleStatus
+    global transmissionState, alleleCollection, strainTransDict
+    global host, alleleTypeTransDict, impcAlleleTypeList
+    global impcSubTypeList
+    global cidNoteInProcess, cidNoteBcpFile, DEBUG
+    global lookupMode, lookupSelectiveMax, qcEngine, lookupSnapshot
+    global suggestK
+
     logDiagFile = os.getenv('LOG_DIAG')
     logCurFile = os.getenv('LOG_CUR')
     qcFile = os.getenv('QC_FILE')
@@ -278,6 +482,22 @@ def initialize():
     transmissionState = os.getenv('TRANSMISSION_STATE')
     alleleCollection = os.getenv('ALLELE_COLLECTION')
     host = os.getenv('HOST')
+    cidNoteInProcess = os.getenv('CID_NOTELOAD_INPROCESS')
+    cidNoteBcpFile = os.getenv('CID_NOTE_BCP')
+    DEBUG = os.getenv('LOG_DEBUG')
+    lookupMode = os.getenv('LOOKUP_MODE') or 'full'
+    qcEngine = os.getenv('QC_ENGINE') or 'python'
+    lookupSnapshot = os.getenv('LOOKUP_SNAPSHOT')
+    if os.getenv('LOOKUP_SELECTIVE_MAX'):
+        lookupSelectiveMax = int(os.getenv('LOOKUP_SELECTIVE_MAX'))
+    suggestK = int(os.getenv('QC_SUGGEST_K') or 0)
+
+    # the categories with suggestions report them as their last field
+    for spool in emalQC.spoolList:
+        if spool.name in suggestSpoolDict:
+            spool.fieldNames = [f for f in spool.fieldNames if f != 'suggestions']
+            if suggestK > 0:
+                spool.fieldNames = spool.fieldNames + ['suggestions']
     
     impcAlleleTypeList = str.split(os.getenv('IMPC_ALLELETYPES'), '|')
     impcSubTypeList = str.split(os.getenv('IMPC_SUBTYPES'), '|')
@@ -289,34 +509,387 @@ def initialize():
     #print('alleleTypeTransString: %s' % alleleTypeTransString)
     #print('alleleTypeTransDict: %s' % alleleTypeTransDict)
 
-    if openFiles() != 0:
-        sys.exit(1)
+    strainTransString = os.getenv('STRAIN_TRANS')
+    if strainTransString:
+        strainTransDict = dict(x.split('=') for x in strainTransString.split('\n'))
+
+    return
+
+def loadLookups(filterDict = {}, nameList = None):
+    # Purpose: load the lookups from the database
+    # Returns: Nothing
+    # Assumes: db connection
+    # Effects: Sets global variables
+    # Throws: Nothing
+
+    # filterDict: restriction added to each lookup query (selective mode)
+    # nameList: the lookups to (re)load, by query name; all if None
+    #   a reloaded lookup is cleared first
+
+    global lookupBytes
+
+    suggestIndexDict.clear()
 
     # Query for IKMC Allele Colony Name - there are multi per allele
-    results = db.sql('''select distinct n.note as cidNote, 
-            a.symbol as alleleSymbol, t.term as alleleStatus, 
-            t2.term as alleleType, m.symbol as markerSymbol, m._Marker_key,
-            a1.accid as alleleID, a2.accid as markerID, 
-            a1.preferred as allelePref, a2.preferred as markerPref
-        from MGI_Note n, ALL_Allele a, MRK_Marker m, ACC_Accession a1, ACC_Accession a2, 
-            VOC_Term t, VOC_Term t2
-        where n._NoteType_key = 1041
-        and n._Object_key = a._Allele_key
-        and a._Marker_key = m._Marker_key
-        and a._Allele_Status_key = t._Term_key
-        and a._Allele_Type_key = t2._Term_key
-        and a._Allele_key = a1._Object_key
-        and a1._MGIType_key = 11
-        and a1._LogicalDB_key = 1
-        and a1.prefixPart = 'MGI:' 
-        and a1.preferred = 1
-        and a._Marker_key = a2._Object_key
-        and a2._MGIType_key = 2
-        and a2._LogicalDB_key = 1
-        and a2.prefixPart = 'MGI:' 
-        and a2.preferred = 1''', 'auto')
+    if nameList is None or 'colonyToAllele' in nameList:
+        colonyToAlleleDict.clear()
+        results = lookupQuery('colonyToAllele', '''select distinct n.note as cidNote, a._Allele_key,
+                a.symbol as alleleSymbol, t.term as alleleStatus, 
+                t2.term as alleleType, m.symbol as markerSymbol, m._Marker_key,
+                a1.accid as alleleID, a2.accid as markerID, 
+                a1.preferred as allelePref, a2.preferred as markerPref
+            from MGI_Note n, ALL_Allele a, MRK_Marker m, ACC_Accession a1, ACC_Accession a2, 
+                VOC_Term t, VOC_Term t2
+            where n._NoteType_key = 1041
+            and n._Object_key = a._Allele_key
+            and a._Marker_key = m._Marker_key
+            and a._Allele_Status_key = t._Term_key
+            and a._Allele_Type_key = t2._Term_key
+            and a._Allele_key = a1._Object_key
+            and a1._MGIType_key = 11
+            and a1._LogicalDB_key = 1
+            and a1.prefixPart = 'MGI:' 
+            and a1.preferred = 1
+            and a._Marker_key = a2._Object_key
+            and a2._MGIType_key = 2
+            and a2._LogicalDB_key = 1
+            and a2.prefixPart = 'MGI:' 
+            and a2.preferred = 1%s''' % filterDict.get('colonyToAllele', ''))
+        buildColonyToAlleleDict(results)
+
+    # Query for alleles with colony IDs
+    if nameList is None or 'colonyNote' in nameList:
+        colonyDict.clear()
+        results = lookupQuery('colonyNote', '''select n._Object_key as alleleKey, n.note
+            from MGI_Note n
+            where n._NoteType_key = 1041%s''' % filterDict.get('colonyNote', ''))
+        buildColonyDict(results)
+
+    # Query for alleles and create lookup
+    if nameList is None or 'allele' in nameList:
+        alleleBySymbolDict.clear()
+        alleleByIDDict.clear()
+        results = lookupQuery('allele', '''select a._Allele_key, a.symbol as alleleSymbol, 
+                t.term as alleleStatus, t2.term as alleleType, a1.accid as alleleID, 
+                a2.accid as markerID, m.symbol as markerSymbol, m._Marker_key
+            from ALL_Allele a,  ACC_Accession a1, ACC_Accession a2, MRK_Marker m,
+                VOC_Term t, VOC_Term t2
+            where a._Allele_Status_key = t._Term_key
+            and a._Allele_Type_key = t2._Term_key
+            and a._Marker_key = m._Marker_key
+            and a._Allele_key = a1._Object_key
+            and a1._MGIType_key = 11
+            and a1.preferred = 1
+            and a1._LogicalDB_key = 1 
+            and a._Marker_key = a2._Object_key
+            and a2._MGIType_key = 2
+            and a2.preferred = 1
+            and a2._LogicalDB_key = 1%s''' % filterDict.get('allele', ''))
+        buildAlleleDicts(results)
+
+    # Query for lab codes and create lookup
+    if nameList is None or 'labCode' in nameList:
+        labCodeDict.clear()
+        results = lookupQuery('labCode', '''select term, abbreviation from VOC_Term
+            where _Vocab_key = 71''')
+        buildLabCodeDict(results)
+
+    # Query for markers and create lookup
+    if nameList is None or 'marker' in nameList:
+        markerDict.clear()
+        results = lookupQuery('marker', '''select a.accid, m.symbol, m.name
+            from MRK_Marker m, ACC_Accession a
+            where m._Marker_Status_key = 1
+            and m._Marker_Type_key in (1, 7)
+            and m._Marker_key = a._Object_key
+            and a._MGIType_key = 2
+            and a._LogicalDB_key = 1
+            and a.prefixPart = 'MGI:' %s''' % filterDict.get('marker', ''))
+        buildMarkerDict(results)
+
+    # Query for strains and their synonyms (_MGIType_key = 10)
+    if nameList is None or 'strain' in nameList:
+        strainDict.clear()
+        results = lookupQuery('strain', '''select s.strain, s.strain as synonym, 0 as isSynonym
+            from PRB_Strain s
+            where s.private = 0
+            union all
+            select s.strain, ms.synonym, 1 as isSynonym
+            from PRB_Strain s, MGI_Synonym ms
+            where s.private = 0
+            and s._Strain_key = ms._Object_key
+            and ms._MGIType_key = 10''')
+        buildStrainDict(results)
+
+    lookupBytes = lookupSize()
+
+    return
+
+def writeSnapshot():
+    # Purpose: write the lookups to the lookup snapshot (emalCheck.py)
+    # Returns: Nothing
+    # Assumes: the lookups have been loaded in full, fpLogDiag is open
+    #	if it is to be logged
+    # Effects: writes to the file system
+    # Throws: Nothing
+
+    if not lookupSnapshot:
+        return
+
+    start = time.time()
+    try:
+        emalCheck.writeSnapshot(sys.modules[__name__], lookupSnapshot)
+        message = 'Lookup snapshot: %s (%.2f sec)' % \
+            (lookupSnapshot, time.time() - start)
+    except:
+        # the snapshot is for the QC checks only, it never fails the load
+        message = 'Lookup snapshot not written: %s' % str(sys.exc_info()[1])
+    if fpLogDiag is not None and not fpLogDiag.closed:
+        fpLogDiag.write('%s%s' % (message, CRT))
+    else:
+        print(message)
+
+    return
+
+def readSignatures():
+    # Purpose: read the signature of each source table of the lookups
+    # Returns: dictionary {source table: (count, modification date), ...}
+    # Assumes: db connection
+    # Effects: Nothing
+    # Throws: Nothing
+
+    signatureDict = {}
+    for table in sorted(set(sum(list(lookupSourceDict.values()), []))):
+        results = db.sql('''select count(*) as rowCt,
+                max(modification_date) as modDate
+            from %s %s''' % (table, sourceFilterDict.get(table, '')), 'auto')
+        signatureDict[table] = (results[0]['rowCt'], str(results[0]['modDate']))
+
+    return signatureDict
+
+def loadWarm():
+    # Purpose: read the configuration and load all of the lookups, to
+    #	be kept in memory by the loader daemon (emalDaemon.py)
+    # Returns: Nothing
+    # Assumes: Nothing
+    # Effects: Sets global variables
+    # Throws: Nothing
+
+    global lookupMode, sourceSignatureDict
+
+    db.useOneConnection(1)
+    configure()
+
+    # the daemon serves every input file, so nothing is restricted
+    lookupMode = 'full'
+    sourceSignatureDict = readSignatures()
+    loadLookups()
+
+    return
+
+def refreshLookups():
+    # Purpose: reload the lookups whose source tables have changed
+    #	since they were loaded
+    # Returns: list of the reloaded lookups (query names)
+    # Assumes: loadWarm() has been called
+    # Effects: Sets global variables
+    # Throws: Nothing
+
+    global sourceSignatureDict
+
+    signatureDict = readSignatures()
+    changedSet = set([t for t in signatureDict \
+        if signatureDict[t] != sourceSignatureDict.get(t)])
+    nameList = [n for n in lookupSourceDict \
+        if changedSet.intersection(lookupSourceDict[n])]
+
+    if nameList:
+        lookupQueryList[:] = [q for q in lookupQueryList if q[0] not in nameList]
+        loadLookups(nameList = nameList)
+    sourceSignatureDict = signatureDict
+
+    return nameList
+
+def prescanInput():
+    # Purpose: collect the distinct values of the input file that the
+    #	QC looks up
+    # Returns: dictionary {kind: set of values, ...}, kinds 'marker' (IDs),
+    #	'colony' (colonyKey of the IDs), 'allele' (IDs), 'symbol'
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: IOError if the file cannot be read
+
+    valueDict = {'marker' : set(), 'colony' : set(), 'allele' : set(),
+        'symbol' : set()}
+    fp = emalFile.openBinary(impcFile)
+    fp.readline() # header
+    for rawLine in fp:
+        # tokens as createAlleleFile() reads them
+        line = emalQC.decodeLine(rawLine)
+        tokens = list(map(str.strip, line[:-1].split('\t')))
+        if len(tokens) < 9:
+            continue
+        valueDict['marker'].add(tokens[1])
+        valueDict['colony'].add(colonyKey(tokens[2]))
+        valueDict['symbol'].add(tokens[7])
+        valueDict['allele'].add(tokens[8])
+    fp.close()
+
+    for values in valueDict.values():
+        values.discard('')
+
+    return valueDict
+
+def uploadInput():
+    # Purpose: load the distinct input values into temp table emal_lookup
+    #	(kind, value) and the keys of the alleles they reference (by
+    #	allele ID or symbol) into temp table emal_allele, for the
+    #	selective lookup queries
+    # Returns: 1 if the lookups must be loaded in full, else 0
+    # Assumes: db connection
+    # Effects: creates temp tables in the database
+    # Throws: Nothing
+
+    start = time.time()
+    try:
+        valueDict = prescanInput()
+    except:
+        fpLogDiag.write('%sCannot prescan input file: %s; loading full lookups%s' % \
+            (CRT, impcFile, CRT))
+        return 1
+
+    valueCt = sum([len(v) for v in valueDict.values()])
+    if valueCt > lookupSelectiveMax:
+        fpLogDiag.write('%s%s distinct input values > LOOKUP_SELECTIVE_MAX %s; loading full lookups%s' % \
+            (CRT, valueCt, lookupSelectiveMax, CRT))
+        return 1
+
+    try:
+        db.sql('drop table if exists emal_lookup', None)
+        db.sql('drop table if exists emal_allele', None)
+        db.sql('create temporary table emal_lookup (kind text, value text)', None)
+        rows = []
+        for kind in sorted(valueDict):
+            for value in valueDict[kind]:
+                rows.append("('%s', '%s')" % (kind, str.replace(value, "'", "''")))
+        for i in range(0, len(rows), 1000):
+            db.sql('insert into emal_lookup values %s' % str.join(',', rows[i:i + 1000]), None)
+        db.sql('create index emal_lookup_idx1 on emal_lookup (kind, value)', None)
+        db.sql('''create temporary table emal_allele as
+            select a1._Object_key as _Allele_key
+            from ACC_Accession a1
+            where a1._MGIType_key = 11
+            and a1._LogicalDB_key = 1
+            and a1.preferred = 1
+            and a1.accid in (select value from emal_lookup where kind = 'allele')
+            union
+            select a._Allele_key
+            from ALL_Allele a
+            where a.symbol in (select value from emal_lookup where kind = 'symbol')''', None)
+    except:
+        fpLogDiag.write('%sCannot upload input values; loading full lookups%s' % (CRT, CRT))
+        return 1
+
+    lookupQueryList.append(('upload', valueCt, time.time() - start))
+    fpLogDiag.write('%sSelective lookups: %s%s' % (CRT, str.join(', ', \
+        ['%s %s' % (len(valueDict[k]), k) for k in sorted(valueDict)]), CRT))
+
+    return 0
+
+def lookupQuery(name, command):
+    # Purpose: run a lookup query and note its rows and transfer time
+    # Returns: the result set
+    # Assumes: db connection
+    # Effects: Sets global variables
+    # Throws: Nothing
+
+    start = time.time()
+    results = db.sql(command, 'auto')
+    lookupQueryList.append((name, len(results), time.time() - start))
+
+    return results
+
+def lookupSize():
+    # Purpose: estimate the memory of the lookups
+    # Returns: bytes
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
+
+    seen = set()
+    size = 0
+    objectList = [colonyToAlleleDict, colonyDict, alleleBySymbolDict,
+        alleleByIDDict, labCodeDict, markerDict, strainDict]
+    while objectList:
+        o = objectList.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        if type(o) == dict:
+            objectList.extend(o.keys())
+            objectList.extend(o.values())
+        elif type(o) in (list, tuple, set):
+            objectList.extend(o)
+        elif isinstance(o, Allele):
+            objectList.append(o.__dict__)
+
+    return size
+
+def lookupCounts():
+    # Purpose: summarize the lookup loading for the run metrics
+    # Returns: dictionary
+    # Assumes: loadLookups() has been called
+    # Effects: Nothing
+    # Throws: Nothing
+
+    return {'mode' : lookupMode,
+        'rows' : sum([q[1] for q in lookupQueryList if q[0] != 'upload']),
+        'transferSeconds' : round(sum([q[2] for q in lookupQueryList]), 3),
+        'bytes' : lookupBytes}
+
+def writeLookupStats():
+    # Purpose: write the lookup rows, transfer time and memory to the
+    #	diagnostic log
+    # Returns: Nothing
+    # Assumes: fpLogDiag is open
+    # Effects: writes to the diagnostic log
+    # Throws: Nothing
+
+    counts = lookupCounts()
+    fpLogDiag.write('%sLookup mode: %s%s' % (CRT, lookupMode, CRT))
+    for name, rows, seconds in lookupQueryList:
+        fpLogDiag.write('    %s: %s rows %.3f sec%s' % (name, rows, seconds, CRT))
+    fpLogDiag.write('    total: %s rows %.3f sec, lookup memory %.1f MB%s' % \
+        (counts['rows'], counts['transferSeconds'], counts['bytes'] / 1048576.0, CRT))
+
+    return
+
+def colonyKey(colonyID):
+    # Purpose: canonical form of a colony ID for the colony ID lookup;
+    #	colony IDs are compared without case, as lower() of the
+    #	selective lookup query, the 7.2.D4a check and qcDiff.py
+    # Returns: the key
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
+
+    return str.lower(colonyID)
+
+def buildColonyToAlleleDict(results):
+    # Purpose: create the colony ID to allele lookup
+    # Returns: Nothing
+    # Assumes: results are from the colony ID note query of initialize()
+    # Effects: Sets global variables
+    # Throws: Nothing
+
+    # the allele symbols mapped to each colony ID, to skip duplicates
+    # {colonyKey: set of symbols, ...}
+    symbolSetDict = {}
+
     for r in results:
         colonyIDString = str.strip(r['cidNote'])
+        alleleKey = r['_Allele_key']
         alleleSymbol = r['alleleSymbol']
         alleleStatus = r['alleleStatus']
         alleleType = r['alleleType']
@@ -325,47 +898,64 @@ def initialize():
         markerKey = r['_Marker_key']
         markerID = r['markerID']
         # create allele object
-        allele = Allele(alleleID, alleleSymbol, alleleStatus, alleleType, markerID, markerSymbol, markerKey, colonyIDString)
+        allele = Allele(alleleKey, alleleID, alleleSymbol, alleleStatus, alleleType, markerID, markerSymbol, markerKey, colonyIDString)
         colonyIDList = str.split(colonyIDString, '|')
         
-        # map the allele to each colony ID and create lookup
+        # map the allele to each colony ID and create lookup; a colony ID
+        # may be assoc w/>1 allele (or there may be a dupe)
         for c in colonyIDList:
-            cLower = str.lower(c)
-            if cLower not in colonyToAlleleDict:
-                colonyToAlleleDict[cLower] = []
-                colonyToAlleleDict[cLower].append(allele)
-            else: # this colony ID is assoc w/>1 allele (or there is a dupe)
-                symbolList = []
-                alleles =  colonyToAlleleDict[cLower]
-                for a in alleles:
-                    symbolList.append(a.asym)
-                if alleleSymbol not in symbolList: # don't add duplicate alleles
-                    colonyToAlleleDict[cLower].append(allele)
+            key = colonyKey(c)
+            symbolSet = symbolSetDict.get(key)
+            if symbolSet is None:
+                symbolSetDict[key] = {alleleSymbol}
+                colonyToAlleleDict[key] = [allele]
+            elif alleleSymbol not in symbolSet: # don't add duplicate alleles
+                symbolSet.add(alleleSymbol)
+                colonyToAlleleDict[key].append(allele)
+
+    return
+
+def writeColonyFanOut():
+    # Purpose: write the fan-out of the colony ID to allele lookup
+    #	to the diagnostic log
+    # Returns: Nothing
+    # Assumes: buildColonyToAlleleDict() has been called, fpLogDiag is open
+    # Effects: writes to the diagnostic log
+    # Throws: Nothing
+
+    # {number of alleles: number of colony IDs, ...}
+    fanOutDict = {}
+    for alleleList in colonyToAlleleDict.values():
+        n = len(alleleList)
+        fanOutDict[n] = fanOutDict.get(n, 0) + 1
+    multiCt = sum([fanOutDict[n] for n in fanOutDict if n > 1])
+
+    fpLogDiag.write('%sColony ID lookup: %s colony IDs, %s to more than one allele%s' % \
+        (CRT, len(colonyToAlleleDict), multiCt, CRT))
+    for n in sorted(fanOutDict):
+        fpLogDiag.write('    %s allele(s): %s colony IDs%s' % (n, fanOutDict[n], CRT))
+
+    return
+
+def buildColonyDict(results):
+    # Purpose: create the allele key to colony ID note lookup
+    # Returns: Nothing
+    # Assumes: Nothing
+    # Effects: Sets global variables
+    # Throws: Nothing
 
-    # Query for alleles with colony IDs
-    results = db.sql('''select n._Object_key as alleleKey, n.note
-        from MGI_Note n
-        where n._NoteType_key = 1041''', 'auto')
     for r in results:
         colonyDict[r['alleleKey']] =  r['note']
- 
-    # Query for alleles and create lookup
-    results = db.sql('''select a._Allele_key, a.symbol as alleleSymbol, 
-            t.term as alleleStatus, t2.term as alleleType, a1.accid as alleleID, 
-            a2.accid as markerID, m.symbol as markerSymbol, m._Marker_key
-        from ALL_Allele a,  ACC_Accession a1, ACC_Accession a2, MRK_Marker m,
-            VOC_Term t, VOC_Term t2
-        where a._Allele_Status_key = t._Term_key
-        and a._Allele_Type_key = t2._Term_key
-        and a._Marker_key = m._Marker_key
-        and a._Allele_key = a1._Object_key
-        and a1._MGIType_key = 11
-        and a1.preferred = 1
-        and a1._LogicalDB_key = 1 
-        and a._Marker_key = a2._Object_key
-        and a2._MGIType_key = 2
-        and a2.preferred = 1
-        and a2._LogicalDB_key = 1''', 'auto')
+
+    return
+
+def buildAlleleDicts(results):
+    # Purpose: create the allele by symbol and allele by ID lookups
+    # Returns: Nothing
+    # Assumes: buildColonyDict() has been called
+    # Effects: Sets global variables
+    # Throws: Nothing
+
     for r in results:
         alleleID  = r['alleleID']
         alleleKey = r['_Allele_key']
@@ -379,35 +969,52 @@ def initialize():
         if alleleKey in colonyDict:
             colonyID = colonyDict[alleleKey]
         # create allele object
-        allele = Allele(alleleID, alleleSymbol, alleleStatus, alleleType, markerID, markerSymbol, markerKey, colonyID)
+        allele = Allele(alleleKey, alleleID, alleleSymbol, alleleStatus, alleleType, markerID, markerSymbol, markerKey, colonyID)
         alleleBySymbolDict[alleleSymbol] = allele
         alleleByIDDict[alleleID] = allele
 
-    # Query for lab codes and create lookup
-    results = db.sql('''select term, abbreviation from VOC_Term
-        where _Vocab_key = 71''', 'auto')
+    return
+
+def buildLabCodeDict(results):
+    # Purpose: create the lab code abbreviation to lab name lookup
+    # Returns: Nothing
+    # Assumes: Nothing
+    # Effects: Sets global variables
+    # Throws: Nothing
+
     for r in results:
         labCodeDict[r['abbreviation']] = str.strip(r['term'])
-    
-    # Query for markers and create lookup
-    results = db.sql('''select a.accid, m.symbol, m.name
-        from MRK_Marker m, ACC_Accession a
-        where m._Marker_Status_key = 1
-        and m._Marker_Type_key in (1, 7)
-        and m._Marker_key = a._Object_key
-        and a._MGIType_key = 2
-        and a._LogicalDB_key = 1
-        and a.prefixPart = 'MGI:' ''', 'auto')
+
+    return
+
+def buildMarkerDict(results):
+    # Purpose: create the marker ID to 'name|symbol' lookup
+    # Returns: Nothing
+    # Assumes: Nothing
+    # Effects: Sets global variables
+    # Throws: Nothing
+
     for r in results:
         markerDict[r['accid']] = '%s|%s' % (r['name'], r['symbol'])
 
-    # Query for strains
-    results = db.sql('''select strain from PRB_Strain
-        where private = 0''', 'auto')
+    return
+
+def buildStrainDict(results):
+    # Purpose: create the strain lookup by strain name and synonym;
+    #   a strain name is not overridden by another strain's synonym
+    # Returns: Nothing
+    # Assumes: Nothing
+    # Effects: Sets global variables
+    # Throws: Nothing
+
     for r in results:
-        strainList.append(r['strain'])
+        if not r['isSynonym']:
+            strainDict[r['strain']] = r['strain']
+    for r in results:
+        if r['isSynonym']:
+            strainDict.setdefault(r['synonym'], r['strain'])
 
-    return 0
+    return
 
 def openFiles():
     # Purpose: Open input/output files.
@@ -447,10 +1054,12 @@ def openFiles():
         return 1
 
     #
-    # Open the IMPC file
+    # Open the IMPC file (decompressed as a stream if compressed);
+    # QC report entries reference its lines (see emalQC.py)
     #
     try:
-        fpIMPC = open(impcFile, 'r')
+        fpIMPC = emalFile.openBinary(impcFile)
+        emalQC.openInput(impcFile)
     except:
         print('Cannot open file: ' + impcFile)
         return 1
@@ -473,6 +1082,15 @@ def openFiles():
         print('Cannot open file: ' + noteloadFile)
         return 1
 
+    #
+    # Open the structured QC file (if configured)
+    #
+    try:
+        emalQC.openJson()
+    except:
+        print('Cannot open file: ' + emalQC.jsonFile)
+        return 1
+
     return 0
 
 
@@ -493,6 +1111,8 @@ def closeFiles():
         fpIMPC.close()
         fpAllele.close()
         fpNoteload.close()
+        emalQC.removeSpools()
+        emalQC.closeInput()
     except:
         return 1
     return 0
@@ -521,19 +1141,67 @@ def queryMGIType(id): # An MGI Accession ID
             typeList.append(r['tableName'])
         return str.join(', ', typeList)
 
+def queryMarkerIDs(markerKey): # a marker primary key
+    # Purpose: Find the MGI IDs (preferred and secondary) of a marker
+    # Returns: the result set from the query; may be empty
+    # Assumes:  connection to a database
+    # Effects: Nothing
+    # Throws: Nothing
+
+    results = db.sql('''select accid
+            from ACC_Accession
+            where _MGIType_key = 2
+            and _LogicalDB_key = 1
+            and _Object_key = %s ''' % markerKey, 'auto')
+
+    return results
+
+@functools.lru_cache(maxsize = None)
+def parseAlleleSymbol(allele): # an allele symbol
+    # Purpose: Parse an endonuclease-mediated allele symbol,
+    #   e.g. Gm123<em1(IMPC)J>; the result is cached per symbol
+    # Returns: AlleleSymbol
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
+
+    return AlleleSymbol(allele)
+
 def findLabCode(allele): # an IMPC allele symbol
     # Purpose: Finds the labcode in an allele subscript
     # Returns: '' if no labCode found in "allele; else the labCode
     # Assumes: Nothing
     # Effects: Nothing
     # Throws: Nothing
-    # match ')' literally then get group where token(s) in 
-    # [a-zA-Z0-9_] (\w) and at least one token (+)
-    labCode = ''
-    match = labCodeFinder.search(allele)
-    if match:
-        labCode = match.group(1)
-    return labCode
+
+    return parseAlleleSymbol(allele).labCode
+
+def isBadNomen(allele): # an IMPC allele symbol
+    # Purpose: Checks the allele symbol has at most one '<' and one '>'
+    # Returns: 1 if the nomenclature is bad, else 0
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
+
+    return parseAlleleSymbol(allele).isBadNomen
+
+def symbolsMatch(alleleSymbol, dbSymbol): # input symbol, MGI allele symbol
+    # Purpose: Checks the input allele symbol names the MGI allele;
+    #   the input may be the full symbol or just the superscript
+    # Returns: 1 if the symbols match, else 0
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
+
+    if alleleSymbol == dbSymbol:
+        return 1
+    inSymbol = parseAlleleSymbol(alleleSymbol)
+    mgiSymbol = parseAlleleSymbol(dbSymbol)
+    if inSymbol.geneSymbol != '' and inSymbol.geneSymbol != mgiSymbol.geneSymbol:
+        return 0
+    if inSymbol.superscript != mgiSymbol.superscript:
+        return 0
+    return 1
 
 def findAlleleBySymbol(symbol): # an MGI allele symbol
     # Purpose: query for an allele by its symbol
@@ -542,7 +1210,7 @@ def findAlleleBySymbol(symbol): # an MGI allele symbol
     # Effects: Nothing
     # Throws: Nothing
 
-    results = db.sql('''select t.term as status, a.symbol, aa.accid
+    results = db.sql('''select t.term as status, a.symbol, aa.accid, a._Allele_key
         from ALL_Allele a, VOC_Term t, ACC_Accession aa
         where a.symbol  = '%s'
         and a._Allele_Status_key = t._Term_key
@@ -553,7 +1221,185 @@ def findAlleleBySymbol(symbol): # an MGI allele symbol
         and aa.prefixPart = 'MGI:' ''' % symbol, 'auto')
 
     return results
+
+def suggestIndex(kind): # 'symbol', 'colony' or 'labCode'
+    # Purpose: the n-gram index of a kind of MGI value, built from the
+    #   lookups the first time it is needed
+    # Returns: emalSuggest.NgramIndex
+    # Assumes: the lookups have been loaded, db connection
+    # Effects: Sets global variables
+    # Throws: Nothing
+
+    if kind not in suggestIndexDict:
+        if kind == 'symbol':
+            symbolDict = {}
+            for a in alleleByIDDict.values():
+                symbolDict[a.aid] = a.asym
+            # the selective lookups hold only the alleles the input
+            # references; the symbols of all of them are queried
+            if lookupMode == 'selective':
+                for r in lookupQuery('suggestSymbol', '''select a.symbol as alleleSymbol,
+                        a1.accid as alleleID
+                    from ALL_Allele a,  ACC_Accession a1, ACC_Accession a2, MRK_Marker m,
+                        VOC_Term t, VOC_Term t2
+                    where a._Allele_Status_key = t._Term_key
+                    and a._Allele_Type_key = t2._Term_key
+                    and a._Marker_key = m._Marker_key
+                    and a._Allele_key = a1._Object_key
+                    and a1._MGIType_key = 11
+                    and a1.preferred = 1
+                    and a1._LogicalDB_key = 1 
+                    and a._Marker_key = a2._Object_key
+                    and a2._MGIType_key = 2
+                    and a2.preferred = 1
+                    and a2._LogicalDB_key = 1'''):
+                    symbolDict[r['alleleID']] = r['alleleSymbol']
+            suggestIndexDict[kind] = emalSuggest.NgramIndex( \
+                list(symbolDict.values()),
+                [alleleLabel(symbolDict[aid], aid) for aid in symbolDict])
+        elif kind == 'colony':
+            noteList = list(colonyDict.values())
+            # as the symbols, the colony ID notes of all alleles
+            if lookupMode == 'selective':
+                noteList = [r['note'] for r in lookupQuery('suggestColony', '''select n.note
+                    from MGI_Note n
+                    where n._NoteType_key = 1041''')]
+            colonySet = set()
+            for note in noteList:
+                for cid in str.split(note, '|'):
+                    if str.strip(cid) != '':
+                        colonySet.add(str.strip(cid))
+            suggestIndexDict[kind] = emalSuggest.NgramIndex(sorted(colonySet))
+        else:
+            suggestIndexDict[kind] = emalSuggest.NgramIndex(sorted(labCodeDict), n = 2)
+
+    return suggestIndexDict[kind]
+
+def suggest(kind, value, exclude = None): # kind of MGI value, the input value,
+                                         # a label already in the QC entry
+    # Purpose: the MGI values nearest to an input value (QC_SUGGEST_K),
+    #   other than the label "exclude"
+    # Returns: the rule fields to add to the QC entry: () if suggestions
+    #   are off, else (the nearest values separated by ', ',)
+    # Assumes: the lookups have been loaded
+    # Effects: Sets global variables
+    # Throws: Nothing
+
+    if suggestK <= 0:
+        return ()
+    if exclude is None:
+        return (str.join(', ', suggestIndex(kind).query(value, suggestK)),)
+    labelList = [l for l in suggestIndex(kind).query(value, suggestK + 1) \
+        if l != exclude]
+    return (str.join(', ', labelList[:suggestK]),)
+
+def alleleLabel(symbol, accID): # allele symbol, allele MGI ID
+    # Purpose: the label of an allele in the symbol suggestions
+    # Returns: string
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
+
+    return '%s (%s)' % (symbol, accID)
+
+def suggestHeader():
+    # Purpose: the report column of the suggestions
+    # Returns: 'Suggestions' and a TAB, '' if suggestions are off
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
+
+    if suggestK <= 0:
+        return ''
+    return 'Suggestions%s' % TAB
         
+def validatedLines():
+    # Purpose: Read the IMPC file in batches of qcBatchSize lines and run
+    #	the 7.2.A1 checks of each batch column-wise
+    # Returns: generator of (line number, line reference, tokens, verdict),
+    #	in input order; verdict from validateColumns()
+    # Assumes: fpIMPC has been opened
+    # Effects: reads fpIMPC
+    # Throws: UnicodeDecodeError, IndexError if a line has too few columns
+
+    header = fpIMPC.readline()
+    lineNum = 1 # ignoring header
+    offset = len(header) # byte offset of the line
+    batch = []
+    for rawLine in fpIMPC:
+        lineNum += 1
+        line = emalQC.decodeLine(rawLine)
+        # reference to the line for the QC report entries
+        batch.append((lineNum, emalQC.lineRef(offset, line),
+            list(map(str.strip, line[:-1].split('\t')))))
+        offset += len(rawLine)
+        if len(batch) == qcBatchSize:
+            for (lineNum, lineRef, tokens), verdict in \
+                    zip(batch, validateColumns(batch)):
+                yield lineNum, lineRef, tokens, verdict
+            batch = []
+    for (lineNum, lineRef, tokens), verdict in \
+            zip(batch, validateColumns(batch)):
+        yield lineNum, lineRef, tokens, verdict
+
+def columnVerdicts(column, check):
+    # Purpose: Apply a check once to each distinct value of a column
+    # Returns: list of the verdicts, one per row of the column
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
+
+    verdictDict = {}
+    for value in set(column):
+        verdictDict[value] = check(value)
+    return list(map(verdictDict.__getitem__, column))
+
+def validateColumns(batch):
+    # Purpose: Run the 7.2.A1 required value and vocabulary checks over
+    #	a batch of input lines, one column at a time
+    # Returns: list of verdicts, one per line:
+    #	(MGI strain or None if not in MGI, names of the missing required
+    #	fields, marker ID in MGI, allele class ok, allele type ok,
+    #	allele subtype ok)
+    # Assumes: lookups have been loaded
+    # Effects: Nothing
+    # Throws: IndexError if a line has too few columns
+
+    if not batch:
+        return []
+
+    # the columns used by the checks
+    markerIDs, colonyIDs, strains, alleleClasses, alleleTypes, \
+        alleleSubTypes, alleleSymbols = zip(*[(t[1], t[2], t[3], t[4], t[5],
+            t[6], t[7]) for lineNum, lineRef, t in batch])
+
+    # Translate colony background strain (STRAIN_TRANS), then look it up
+    # in the database (by name or synonym)
+    strainList = columnVerdicts(strains,
+        lambda s: strainDict.get(strainTransDict.get(s, s)))
+
+    # missing required values, in report order
+    missingList = [[] for r in batch]
+    for name, column in [('Marker ID', markerIDs),
+            ('Colony ID', colonyIDs),
+            ('Allele Class (type)', alleleClasses),
+            ('Allele (mutation) Type', alleleTypes),
+            ('Allele Symbol', alleleSymbols)]:
+        for i, isMissing in enumerate(columnVerdicts(column, lambda v: v == '')):
+            if isMissing:
+                missingList[i].append(name)
+
+    markerList = columnVerdicts(markerIDs, lambda v: v in markerDict)
+    classList = columnVerdicts(alleleClasses,
+        lambda v: str.lower(v) == 'endonuclease-mediated')
+    typeList = columnVerdicts(alleleTypes,
+        lambda v: str.lower(v) in impcAlleleTypeList)
+    subTypeList = columnVerdicts(alleleSubTypes,
+        lambda v: v == '' or str.lower(v) in impcSubTypeList)
+
+    return list(zip(strainList, missingList, markerList, classList,
+        typeList, subTypeList))
+
 def createAlleleFile():
     # Purpose: Read the IMPC file and QC. Create a Allele input file
     # Returns: 1 if error,  else 0
@@ -574,81 +1420,61 @@ def createAlleleFile():
     global symbolMatchAlleleStatusDiscrepList, symbolMatchColonyIdMismatchList
     global symbolMatchMultiAlleleList, calcAlleleDict, atTransKeyNotInMgiList
     global linesSkippedCt, linesLoadedCt, allelesFoundCt, lineNum
+    global cidNoteList
 
-    header = fpIMPC.readline()
     lineNum = 1 # ignoring header
-    for line in fpIMPC.readlines(): 
-        lineNum += 1
+    for lineNum, lineRef, tokens, verdict in validatedLines():
         hasError = 0
         alleleFound = 0
-        tokens = list(map(str.strip, line[:-1].split('\t')))
+        mgiStrain, missingDataList, markerOk, classOk, typeOk, subTypeOk = verdict
         #print('#### Split input line: %s' % tokens)
         
         # tokens[0] -  marker symbol, not used by the load
         markerID = tokens[1]
         colonyID = tokens[2]
-        strain = str.strip(tokens[3]) # colony background strain
         alleleClass = tokens[4] 
         alleleType = tokens[5] 
         alleleSubType = tokens[6] 
         alleleSymbol = tokens[7] # full symbol, was just superscript
         alleleID = tokens[8] # can be blank, if present allele has already been created
-        # Translate colony background strain; 2 cases
-        if strain == 'C57BL/6NTac/Den':
-            strain = 'C57BL/6NTac'
-        elif strain == 'C57BL/6NTac/USA':
-            strain = 'C57BL/6NTac'
-
-        # check if in the database, if not load allele with Not Specified strain
-        # but still report 11/8/22
-        if strain not in strainList:
-            strainNotInMgiList.append('%s%s%s' % (lineNum, TAB, line))
+
+        # the 7.2.A1 checks have been run column-wise (validateColumns);
+        # report their verdicts in the original order
+
+        # check if in the database (by name or synonym), if not load allele
+        # with Not Specified strain but still report 11/8/22
+        if mgiStrain is not None:
+            strain = mgiStrain
+        else:
+            strainNotInMgiList.append(lineNum, lineRef)
             strain = 'Not Specified'
 
         # Requirement 7.2A1 Missing or Rejected Values for Required Fields
-        missingDataList = []
-        # report missing required values
-        if markerID == '':
-            missingDataList.append('Marker ID')
-        if colonyID == '':
-            missingDataList.append('Colony ID')
-        #if strain == '': # 11/8/22  strain now set above
-        #    missingDataList.append('Strain') 
-        if alleleClass == '':
-            missingDataList.append('Allele Class (type)')
-        if alleleType == '':
-            missingDataList.append('Allele (mutation) Type')
-        # empty alleleDescription now means to not create molecular note
-        #if alleleDescription == '': 11/22 not loading molecular note now
-        #    missingDataList.append('Allele Description')
-        if alleleSymbol == '':
-            missingDataList.append('Allele Symbol')
-
         if len(missingDataList):
-            missingRequiredValueList.append('%s%s%s%s%s' % (lineNum, TAB, str.join(', ', missingDataList), TAB, line))
+            missingRequiredValueList.append(lineNum, lineRef, str.join(', ', missingDataList))
             #print('  ### missing fields in input file, skip remaining QC')
             linesSkippedCt += 1
             continue	# If missing fields skip remainder of QC
 
         # Requirement 7.2A1 col2
-        if markerID not in markerDict:  
-            markerIdNotInMgiList.append('%s%s%s' % (lineNum, TAB, line))
+        if not markerOk:
+            markerIdNotInMgiList.append(lineNum, lineRef)
             hasError = 1
 
          # Requirement 7.2A1 col8
-        if str.lower(alleleClass) != 'endonuclease-mediated':
-            unknownAlleleClassList.append('%s%s%s' % (lineNum, TAB, line))
+        if not classOk:
+            unknownAlleleClassList.append(lineNum, lineRef)
             hasError = 1 
         else:
             alleleClass = 'Endonuclease-mediated' # not capitalized in the file, cap in DB
 
         # Requirement 7.2A1 col9
-        if str.lower(alleleType) not in impcAlleleTypeList:
-            unknownAlleleTypeList.append('%s%s%s' % (lineNum, TAB, line))
+        if not typeOk:
+            unknownAlleleTypeList.append(lineNum, lineRef)
             hasError = 1
         # Requirement 7.2A1 col10
-        if alleleSubType != '' and str.lower(alleleSubType) not in impcSubTypeList:
-            unknownSubTypeList.append('%s%s%s' % (lineNum, TAB, line))
+        if not subTypeOk:
+            unknownSubTypeList.append(lineNum, lineRef)
             hasError = 1
         if hasError: # skip to next line if any of the above checks fails
             #print('  ### unexpected data in input file, skip remaining QC')
@@ -676,18 +1502,13 @@ def createAlleleFile():
                 #print('dbA.asym: %s' % dbA.asym)
                 # if not 'Approved', don't do any other checks.
                 if dbA.ast != 'Approved':    # Requirement 7.2.D3 Allele ID status check
-                    alleleIdMatchAlleleStatusDiscrepList.append('%s%s%s%s%s' % \
-                        (lineNum, TAB, dbA.ast, TAB, line))
+                    alleleIdMatchAlleleStatusDiscrepList.append(lineNum, lineRef, dbA.ast)
                     hasError = 1
                 else:   
                     # Requirement 7.2.D1 Marker ID check, 2ndary OK
                     if markerID != dbA.mid: # check to see if 2ndary
                         #print('markerID: %s dbID: %s' % (markerID, dbA.mid))
-                        results = db.sql('''select accid
-                                from ACC_Accession
-                                where _MGIType_key = 2
-                                and _LogicalDB_key = 1
-                                and _Object_key = %s ''' % dbA.mk, 'auto')
+                        results = queryMarkerIDs(dbA.mk)
                         isSecondary = 0
                         for r in results:
                             #print('dbAccID: %s' %  r['accid'])
@@ -695,15 +1516,14 @@ def createAlleleFile():
                                 isSecondary = 1
                                 break
                         if not isSecondary:
-                            alleleIdMatchMarkerIdMismatchList.append( '%s%s%s%s%s%s%s%s%s%s%s' % \
-                                (lineNum, TAB, alleleID, TAB, calcAlleleSymbol, TAB, dbA.mid, TAB, dbA.ms, TAB, line))
+                            alleleIdMatchMarkerIdMismatchList.append(lineNum, lineRef, alleleID, calcAlleleSymbol, dbA.mid, dbA.ms)
                             hasError = 1
                     # Requirement 7.2.D2 Allele symbol check
                     #print('alleleSymbol: %s' % alleleSymbol)
                     #print('dbAlleleSymbol: %s' % dbA.asym)
-                    if str.find(dbA.asym, alleleSymbol) == -1:
-                        alleleIdMatchAlleleSSMismatchList.append('%s%s%s%s%s%s%s' % \
-                            (lineNum, TAB, dbA.aid, TAB, dbA.asym, TAB, line))
+                    if not symbolsMatch(alleleSymbol, dbA.asym):
+                        alleleIdMatchAlleleSSMismatchList.append(lineNum, lineRef, dbA.aid, dbA.asym,
+                            *suggest('symbol', alleleSymbol, alleleLabel(dbA.asym, dbA.aid)))
                         hasError = 1
                     # Requirement 7.2.D4 Colony Name/ID check
                     # From the set of cid(s) (0..n) associated with allele ID in the 
@@ -715,31 +1535,30 @@ def createAlleleFile():
                     dbColonyIDList = []
                     cidError = 0 # assume there's no error
                     if dbA.cid != '':
-                        dbColonyIDList.append(str.lower(dbA.cid)) # for lower case compare
+                        dbColonyIDList.append(colonyKey(dbA.cid)) # for lower case compare
                     #print('dbColonyIDList: %s' % dbColonyIDList)
                     #print('IncColonyID: %s' % colonyID)
 
                     # Requirement 7.2.D4a Allele ID match, Colony ID Mismatch
-                    if dbColonyIDList != [] and str.lower(colonyID) not in dbColonyIDList:
-                        alleleIdMatchColonyIDMismatchList.append('%s%s%s%s%s%s%s%s%s' % (lineNum, TAB, alleleID, TAB, dbA.asym, TAB, dbA.cid, TAB, line))
+                    if dbColonyIDList != [] and colonyKey(colonyID) not in dbColonyIDList:
+                        alleleIdMatchColonyIDMismatchList.append(lineNum, lineRef, alleleID, dbA.asym, dbA.cid)
                         hasError = 1
                         cidError = 1
 
-                    # Requirement 7.2.D4b Colony ID matches MULTIPLE  alleles in the database
                     # get the set of allele(s) (0..n) associated with incoming cid
                     # if there are multiple alleles in the set report
-                    if str.lower(colonyID) in colonyToAlleleDict:
-                        #print('%s in colonyToAlleleDict' % colonyID)
-                        allelesByCidList = colonyToAlleleDict[str.lower(colonyID)]
+                    allelesByCidList = colonyToAlleleDict.get(colonyKey(colonyID))
+                    if allelesByCidList is not None:
+                        # Requirement 7.2.D4b Colony ID matches MULTIPLE  alleles in the database
                         if len(allelesByCidList) > 1:
                             for aByCid in allelesByCidList:
-                                alleleIdMatchColonyIdMatchToMultiList.append('%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s' % (lineNum, TAB, alleleID, TAB, dbA.asym, TAB, dbA.cid, TAB, aByCid.aid, TAB, aByCid.asym, TAB, aByCid.at, TAB, aByCid.cid, TAB, line))
+                                alleleIdMatchColonyIdMatchToMultiList.append(lineNum, lineRef, alleleID, dbA.asym, dbA.cid, aByCid.aid, aByCid.asym, aByCid.at, aByCid.cid)
                                 hasError = 1
                                 cidError = 1
                         else: # 7.2.D4b  Colony ID matches SINGLE allele in the database
                             aByCid = allelesByCidList[0]
                             if alleleID != aByCid.aid:
-                                alleleIdMatchColonyIdMatchToDiffAlleleList.append('%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s' % (lineNum, TAB, alleleID, TAB, dbA.asym, TAB, dbA.cid, TAB, aByCid.aid, TAB, aByCid.asym, TAB, aByCid.at, TAB, aByCid.cid, TAB, line))
+                                alleleIdMatchColonyIdMatchToDiffAlleleList.append(lineNum, lineRef, alleleID, dbA.asym, dbA.cid, aByCid.aid, aByCid.asym, aByCid.at, aByCid.cid)
                                 hasError = 1
                                 cidError = 1
                     if hasError == 0 and cidError == 0:
@@ -748,6 +1567,7 @@ def createAlleleFile():
                             # Requirement 7.2.D4 if no error and no cid in the database, add a 
                             # new note to the allele
                             fpNoteload.write('%s%s%s%s' % (alleleID, TAB, colonyID, CRT))
+                            cidNoteList.append((dbA.ak, colonyID, lineNum, alleleID))
 
             else: # Requirement 7.2.C1 Allele ID not in MGI OR matches different object type
                 #print('Allele ID not in MGI OR matches a different object type')
@@ -755,23 +1575,22 @@ def createAlleleFile():
                 # report: 
                 # error type: 'MGI Allele Accession present, No MGI Allele Match
                 # if different MGI Type, report this line from input
-                alleleIdNotInMGIList.append('%s%s%s%s%s' % \
-                    (lineNum, TAB, objectType, TAB, line))
+                alleleIdNotInMGIList.append(lineNum, lineRef, objectType)
                 hasError = 1
             # END ALLELE ID PRESENT IN INPUT
 
         # BEGIN ALLELE ID NOT PRESENT IN INPUT
         else: 
 
-            # BEGIN COLONY ID MATCH 7.2.E
             #print('  #### Allele ID not in input, colonyID is: %s' % colonyID)
-            if str.lower(colonyID) in colonyToAlleleDict: 
-                alleleList = colonyToAlleleDict[str.lower(colonyID)]
+            alleleList = colonyToAlleleDict.get(colonyKey(colonyID))
+            # BEGIN COLONY ID MATCH 7.2.E
+            if alleleList is not None:
                 # Requirement 7.2.F1 Colony ID Matches Multiple Alleles in MGI
                 if len(alleleList) > 1:
                     for dbA in alleleList:
                         # report multiple alleles for a colony ID
-                        cidMatchToMultiList.append('%s%s%s%s%s%s%s%s' % (lineNum, TAB, dbA.aid, TAB, dbA.asym, TAB, line, CRT))
+                        cidMatchToMultiList.append(lineNum, lineRef, dbA.aid, dbA.asym)
                         hasError = 1
                         #print('  ###  multiple alleles for colony ID, skip remaining checks')
                         linesSkippedCt += 1
@@ -780,23 +1599,21 @@ def createAlleleFile():
                 dbA = alleleList[0] # there is only one
                 # Requirement 7.2.F3 allele Status Check
                 if dbA.ast != 'Approved':  
-                    cidMatchAlleleStatusDiscrepList.append('%s%s%s%s%s%s%s%s%s' % \
-                        (lineNum, TAB,  dbA.aid, TAB, dbA.asym, TAB, dbA.ast, TAB, line))
+                    cidMatchAlleleStatusDiscrepList.append(lineNum, lineRef, dbA.aid, dbA.asym, dbA.ast)
                     hasError = 1
                 else:
                     # The following two checks could be replaced with a 
                     # calculated allele symbol match
                     # Requirement 7.2.F2 Marker ID check
                     if markerID != dbA.mid:
-                        cidMatchMarkerIdMismatchList.append( '%s%s%s%s%s%s%s' % \
-                            (lineNum, TAB, dbA.aid, TAB, dbA.asym, TAB, line))
+                        cidMatchMarkerIdMismatchList.append(lineNum, lineRef, dbA.aid, dbA.asym)
                         hasError = 1
                     # Requirement 7.2.F2 Allele symbol check
                     #print('cid match, alleleSymbol: %s' % alleleSymbol)
                     #print('cid match dbAlleleSymbol: %s' % dbA.asym)
-                    if str.find(dbA.asym, alleleSymbol) == -1:
-                        cidMatchAlleleSSMismatchList.append('%s%s%s%s%s%s%s' % \
-                            (lineNum, TAB, dbA.aid, TAB, dbA.asym, TAB, line))
+                    if not symbolsMatch(alleleSymbol, dbA.asym):
+                        cidMatchAlleleSSMismatchList.append(lineNum, lineRef, dbA.aid, dbA.asym,
+                            *suggest('symbol', alleleSymbol, alleleLabel(dbA.asym, dbA.aid)))
                         hasError = 1
                 if hasError == 0:
                     alleleFound = 1
@@ -822,11 +1639,11 @@ def createAlleleFile():
                     status = results[0]['status']
                     aID = results[0]['accid']
                     symbol = results[0]['symbol']
+                    aKey = results[0]['_Allele_key']
 
                     # Requirement 7.2.H1  Allele Status Check
                     if status != 'Approved':
-                        symbolMatchAlleleStatusDiscrepList.append('%s%s%s%s%s%s%s%s%s' % \
-                            (lineNum, TAB, aID, TAB, symbol, TAB, status, TAB, line))
+                        symbolMatchAlleleStatusDiscrepList.append(lineNum, lineRef, aID, symbol, status)
                         symbolError = 1
                         hasError = 1
 
@@ -836,8 +1653,8 @@ def createAlleleFile():
                         # if there is a cid for the symbol it has to be a 
                         # mismatch with the inc cid
                         if allele.cid != '': 
-                            symbolMatchColonyIdMismatchList.append('%s%s%s%s%s%s%s%s%s' % \
-                                (lineNum, TAB, aID, TAB, symbol, TAB, allele.cid, TAB, line))
+                            symbolMatchColonyIdMismatchList.append(lineNum, lineRef, aID, symbol, allele.cid,
+                                *suggest('colony', colonyID))
                             symbolError = 1
                             hasError = 1
                     # Requirement 7.2.H4 No CID Match, Symbol match, and no errors
@@ -845,6 +1662,7 @@ def createAlleleFile():
                     if symbolError == 0 and hasError == 0:
                         alleleFound = 1
                         fpNoteload.write('%s%s%s%s' % (aID, TAB, colonyID, CRT))
+                        cidNoteList.append((aKey, colonyID, lineNum, aID))
 
                 # Requirement 7.2.H3 check for multiple (duplicate) alleles in the database
                 #else: # len(results) > 1:
@@ -854,8 +1672,7 @@ def createAlleleFile():
                         #print(r)
                         aID = r['accid']
                         symbol = r['symbol']
-                        symbolMatchMultiAlleleList.append('%s%s%s%s%s%s%s' % \
-                            (lineNum, TAB, aID, TAB, symbol, TAB, line))
+                        symbolMatchMultiAlleleList.append(lineNum, lineRef, aID, symbol)
                         symbolError = 1
                         hasError = 1
 
@@ -875,16 +1692,17 @@ def createAlleleFile():
         # Requirement 7.2.I So, we have a new allele; check the lab code in 
         # the symbol to make sure it is in the Cell Line Lab Code vocab
         labName = ''
+        parsedSymbol = parseAlleleSymbol(alleleSymbol)
         #print('  #### checking allele nomenclature')
-        if len(re.findall(pattern1, alleleSymbol)) > 1 or len(re.findall(pattern2, alleleSymbol)) > 1:
+        if parsedSymbol.isBadNomen:
             #print('  #### bad allele nomen, not creating allele')
-            badNomenList.append('%s%s%s%s%s' % (lineNum, TAB, alleleSymbol, TAB, line))
+            badNomenList.append(lineNum, lineRef, alleleSymbol)
             hasError = 1
         #print('  #### checking lab code')
-        labCode = findLabCode(alleleSymbol)
+        labCode = parsedSymbol.labCode
 
         if labCode not in labCodeDict:
-            labCodeNotInMgiList.append('%s%s%s%s%s' % (lineNum, TAB, labCode, TAB, line))
+            labCodeNotInMgiList.append(lineNum, lineRef, labCode, *suggest('labCode', labCode))
             #print('  #### bad lab code, not creating allele')
             hasError = 1
 
@@ -899,7 +1717,7 @@ def createAlleleFile():
         else:
             impcKey = '%s|%s' % (str.lower(alleleType), str.lower(alleleSubType))
         if impcKey not in alleleTypeTransDict:
-            atTransKeyNotInMgiList.append('%s%s%s%s%s' % (lineNum, TAB, impcKey, TAB, line))
+            atTransKeyNotInMgiList.append(lineNum, lineRef, impcKey)
             #print('  #### alleleType/subType combo not in translation')
             hasError = 1
         else:
@@ -920,6 +1738,11 @@ def createAlleleFile():
             #print('alleleTypes: %s subTypes: %s' % (alleleTypes, subTypes))
 
                 
+        # the allele name needs the em sequence number of the symbol
+        if hasError == 0 and parsedSymbol.seqNum is None:
+            badNomenList.append(lineNum, lineRef, alleleSymbol)
+            hasError = 1
+
         #
         # If no errors write out to dictionary of lines
         #
@@ -928,9 +1751,7 @@ def createAlleleFile():
         else:
             #print('  #### No allele identified in DB and no errors; translate stuff and create allele')
             # get the sequencNum from the allele
-            seqNumFinder = re.compile ( '<em(.*)\(' )
-            match = seqNumFinder.search(alleleSymbol)
-            sequenceNum = match.group(1)
+            sequenceNum = parsedSymbol.seqNum
 
             # get the lab name from the lab code
             labName = labCodeDict[labCode]
@@ -942,20 +1763,29 @@ def createAlleleFile():
             
             # the line we want to write to the allele file if no dupes
             alleleLine = '%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s' % (markerID, TAB, markerSymbol, TAB, mgiAlleleType, TAB, alleleDescription, TAB, colonyID, TAB, strain, TAB, calcAlleleSymbol, TAB, alleleName, TAB, inHeritMode, TAB, alleleClass, TAB, mgiSubType, TAB, alleleStatus, TAB, transmissionState, TAB, alleleCollection, TAB, jNumber, TAB, createdBy, CRT)
-            calcAlleleDict[calcAlleleSymbol].append([alleleLine, lineNum, line])
+            calcAlleleDict[calcAlleleSymbol].append([alleleLine, lineNum, lineRef])
 
     for key in calcAlleleDict:
         if len(calcAlleleDict[key]) > 1: # dupe in input
             #print('  ### Dupe alleles in input')
             #print(calcAlleleDict[key])
             for l in calcAlleleDict[key]:
-                dupeAlleleInInputList.append('%s%s%s%s' % (l[1], TAB, l[2], CRT))
+                dupeAlleleInInputList.append(l[1], l[2])
         else:
             linesLoadedCt += 1
             fpAllele.write(calcAlleleDict[key][0][0])
 
     return 0
 
+def createAlleleFileSql():
+    # Purpose: createAlleleFile() with the relational QC engine
+    # Returns: 1 if error,  else 0
+    # Assumes: file descriptors have been initialized
+    # Effects: writes to the file system
+    # Throws: Nothing
+
+    return emalQCSql.createAlleleFile(sys.modules[__name__])
+
 def writeQCReport():
     # Purpose: write all QC errors to the QC report file
     # Returns: 1 if error, else 0
@@ -971,192 +1801,384 @@ def writeQCReport():
     fpQC.write('%s%s7.2.A.1 Required Value Missing or Invalid%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%s Missing Value(s)%sInput Line%s' % (TAB, TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(missingRequiredValueList):
-        fpQC.write(str.join(CRT, missingRequiredValueList))
+    missingRequiredValueList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(missingRequiredValueList))
 
     fpQC.write('%s%s7.2.A1 MGI Marker ID not in MGI%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sInput Line%s' % (TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(markerIdNotInMgiList):
-         fpQC.write(str.join(CRT, markerIdNotInMgiList))
+    markerIdNotInMgiList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(markerIdNotInMgiList))
 
     fpQC.write('%s%s7.2.A1 Colony Background Strain not in MGI%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sInput Line%s' % (TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(strainNotInMgiList):
-         fpQC.write(str.join(CRT, strainNotInMgiList))
+    strainNotInMgiList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(strainNotInMgiList))
 
     fpQC.write('%s%s7.2.A1 Allele Class not Endonuclease-mediated%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sInput Line%s' % (TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(unknownAlleleClassList):
-         fpQC.write(str.join(CRT, unknownAlleleClassList))
+    unknownAlleleClassList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(unknownAlleleClassList))
    
     fpQC.write('%s%s7.2.A1 Allele (mutation) Type not in Translated Set%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sInput Line%s' % (TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(unknownAlleleTypeList):
-         fpQC.write(str.join(CRT, unknownAlleleTypeList))
+    unknownAlleleTypeList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(unknownAlleleTypeList)) 
 
     fpQC.write('%s%s7.2.A1 Allele Subtype not in Translated Set%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sInput Line%s' % (TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(unknownSubTypeList):
-         fpQC.write(str.join(CRT, unknownSubTypeList))
+    unknownSubTypeList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(unknownSubTypeList))
 
     fpQC.write('%s%s7.2.C1 MGI Allele ID present, No MGI Allele Match%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sObjectType%sInput Line%s' % (TAB, TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(alleleIdNotInMGIList):
-         fpQC.write(str.join(CRT, alleleIdNotInMGIList))
+    alleleIdNotInMGIList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(alleleIdNotInMGIList))
 
     fpQC.write('%s%s7.2.D3 Allele ID Match, Allele Status Discrepancy%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sAllele Status%sInput Line%s' % (TAB, TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(alleleIdMatchAlleleStatusDiscrepList):
-         fpQC.write(str.join(CRT, alleleIdMatchAlleleStatusDiscrepList))
+    alleleIdMatchAlleleStatusDiscrepList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(alleleIdMatchAlleleStatusDiscrepList))
 
     fpQC.write('%s%s7.2.D1 Allele ID Match, Marker ID Mismatch%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sAllele ID%sAllele Symbol%sDB Marker ID%sDB Marker Symbol%sInput Line%s' % (TAB, TAB, TAB, TAB, TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(alleleIdMatchMarkerIdMismatchList):
-         fpQC.write(str.join(CRT, alleleIdMatchMarkerIdMismatchList))
+    alleleIdMatchMarkerIdMismatchList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(alleleIdMatchMarkerIdMismatchList))
 
     fpQC.write('%s%s7.2.D2 Allele ID Match, Allele Symbol  Mismatch%s%s' % (CRT, CRT, CRT, CRT))
-    fpQC.write('Line#%sDB Allele ID%sDB Allele Symbol%sInput Line%s' % (TAB, TAB, TAB, CRT))
+    fpQC.write('Line#%sDB Allele ID%sDB Allele Symbol%s%sInput Line%s' % (TAB, TAB, TAB, suggestHeader(), CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(alleleIdMatchAlleleSSMismatchList):
-         fpQC.write(str.join(CRT, alleleIdMatchAlleleSSMismatchList))
+    alleleIdMatchAlleleSSMismatchList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(alleleIdMatchAlleleSSMismatchList))
 
     fpQC.write('%s%s7.2.D4a Allele ID Match, Colony ID Mismatch%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sAllele ID%sDB Allele Symbol%sDB CID%sInput Line%s' % (TAB, TAB, TAB, TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(alleleIdMatchColonyIDMismatchList):
-         fpQC.write(str.join(CRT, alleleIdMatchColonyIDMismatchList))
+    alleleIdMatchColonyIDMismatchList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(alleleIdMatchColonyIDMismatchList))
 
     fpQC.write('%s%s7.2.D4b Allele ID match, Colony ID Match to Multi MGI Alleles%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sInput Allele ID%sInput Allele Symbol%sInput Colony ID%sDB Allele ID%sDB Allele Symbol%sDB Allele Type%sDB Colony ID%sInput Line%s' % (TAB, TAB, TAB, TAB, TAB, TAB, TAB, TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(alleleIdMatchColonyIdMatchToMultiList):
-         fpQC.write(str.join(CRT, alleleIdMatchColonyIdMatchToMultiList))
+    alleleIdMatchColonyIdMatchToMultiList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(alleleIdMatchColonyIdMatchToMultiList))
 
     fpQC.write('%s%s7.2.D4b Allele ID match, Colony ID Match to Different Allele%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sInput Allele ID%sInput Allele Symbol%sInput Colony ID%sDB Allele ID%sDB Allele Symbol%sDB Allele Type%sDB Colony ID%sInput Line%s' % (TAB, TAB, TAB, TAB, TAB, TAB, TAB, TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(alleleIdMatchColonyIdMatchToDiffAlleleList):
-         fpQC.write(str.join(CRT, alleleIdMatchColonyIdMatchToDiffAlleleList))
+    alleleIdMatchColonyIdMatchToDiffAlleleList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(alleleIdMatchColonyIdMatchToDiffAlleleList))
 
     fpQC.write('%s%s7.2.F1 Colony ID Matches Multiple Alleles%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sDB Allele ID%sDB Allele Symbol%sInput Line%s' % (TAB, TAB, TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(cidMatchToMultiList):
-         fpQC.write(str.join(CRT, cidMatchToMultiList))
+    cidMatchToMultiList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(cidMatchToMultiList))
 
     fpQC.write('%s%s7.2.F2a Colony ID Match, Marker ID Mismatch%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sDB Allele ID%sDB Allele Symbol%sInput Line%s' % (TAB, TAB, TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(cidMatchMarkerIdMismatchList):
-         fpQC.write(str.join(CRT, cidMatchMarkerIdMismatchList))
+    cidMatchMarkerIdMismatchList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(cidMatchMarkerIdMismatchList))
 
     fpQC.write('%s%s7.2.F2b Colony ID Match, Allele Symbol Mismatch%s%s' % (CRT, CRT, CRT, CRT))
-    fpQC.write('Line#%sDB Allele ID%sDB Allele Symbol%sInput Line%s' % (TAB, TAB, TAB, CRT))
+    fpQC.write('Line#%sDB Allele ID%sDB Allele Symbol%s%sInput Line%s' % (TAB, TAB, TAB, suggestHeader(), CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(cidMatchAlleleSSMismatchList):
-         fpQC.write(str.join(CRT, cidMatchAlleleSSMismatchList))
+    cidMatchAlleleSSMismatchList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(cidMatchAlleleSSMismatchList))
 
     fpQC.write('%s%s7.2.F3 Colony ID Match, Allele Status Discrepancy%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sDB Allele ID%sDB Allele Symbol%sDB Allele Status%sInput Line%s' % (TAB, TAB, TAB, TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(cidMatchAlleleStatusDiscrepList):
-         fpQC.write(str.join(CRT, cidMatchAlleleStatusDiscrepList))
+    cidMatchAlleleStatusDiscrepList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(cidMatchAlleleStatusDiscrepList))
 
     fpQC.write('%s%s7.2.H1 Allele Symbol Match, Allele Status Discrepancy%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sDB Allele ID%sDB Allele Symbol%sDB Allele Status%sInput Line%s' % (TAB, TAB, TAB, TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(symbolMatchAlleleStatusDiscrepList):
-         fpQC.write(str.join(CRT, symbolMatchAlleleStatusDiscrepList))
+    symbolMatchAlleleStatusDiscrepList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(symbolMatchAlleleStatusDiscrepList))
 
     fpQC.write('%s%s7.2.H2 Allele Symbol Match, Colony ID Mismatch%s%s' % (CRT, CRT, CRT, CRT))
-    fpQC.write('Line#%sDB Allele ID%sDB Allele Symbol%sDB Allele CID%sInput Line%s' % (TAB, TAB, TAB, TAB, CRT))
+    fpQC.write('Line#%sDB Allele ID%sDB Allele Symbol%sDB Allele CID%s%sInput Line%s' % (TAB, TAB, TAB, TAB, suggestHeader(), CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(symbolMatchColonyIdMismatchList):
-         fpQC.write(str.join(CRT, symbolMatchColonyIdMismatchList))
+    symbolMatchColonyIdMismatchList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(symbolMatchColonyIdMismatchList))
 
     fpQC.write('%s%s7.2.H3 Allele Symbol Match to Multiple Alleles%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sDB Allele ID%sDB Allele Symbol%sInput Line%s' % (TAB, TAB, TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(symbolMatchMultiAlleleList):
-         fpQC.write(str.join(CRT, symbolMatchMultiAlleleList))
+    symbolMatchMultiAlleleList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(symbolMatchMultiAlleleList))
 
     fpQC.write('%s%sNew check: Allele Symbol has incorrect nomenclature%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sAllele Symbol%sInput Line%s' % (TAB, TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(badNomenList):
-        fpQC.write(str.join(CRT, badNomenList))
+    badNomenList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(badNomenList))
 
     fpQC.write('%s%s7.2.I No Allele Match, Lab Code not Present%s%s' % (CRT, CRT, CRT, CRT))
-    fpQC.write('Line#%sLab Code%sInput Line%s' % (TAB, TAB, CRT))
+    fpQC.write('Line#%sLab Code%s%sInput Line%s' % (TAB, TAB, suggestHeader(), CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
 
-    if len(labCodeNotInMgiList):
-        fpQC.write(str.join(CRT, labCodeNotInMgiList))
+    labCodeNotInMgiList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(labCodeNotInMgiList))
    
     fpQC.write('%s%s7.2.A1g Allele (mutation) Type/Allele Subtype combination not in Translated Set%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sIMPC alleleType|subType%sInput Line%s' % (TAB, TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(atTransKeyNotInMgiList):
-        fpQC.write(str.join(CRT, atTransKeyNotInMgiList))
+    atTransKeyNotInMgiList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(atTransKeyNotInMgiList))
  
     fpQC.write('%s%sDuplicate Allele in Input%s%s' % (CRT, CRT, CRT, CRT))
     fpQC.write('Line#%sInput Line%s' % (TAB, CRT))
     fpQC.write('_____________________________________________________________%s' % CRT)
-    if len(dupeAlleleInInputList):
-        fpQC.write(str.join(CRT, dupeAlleleInInputList))
+    dupeAlleleInInputList.copyTo(fpQC)
     fpQC.write('Total: %s' % len(dupeAlleleInInputList))
 
     return 0
 
+def stageLedger():
+    # Purpose: stage the alleles of the allele file and the colony ID
+    #   notes of the run in the allele ledger (emalLedger.py), to be
+    #   recorded once the load has committed them
+    # Returns: Nothing
+    # Assumes: createAlleleFile has been run
+    # Effects: writes the ledger (LEDGER_FILE), reads the input file
+    # Throws: sqlite3.Error if the ledger cannot be written
+
+    if not emalLedger.ledgerFile:
+        return
+
+    rowList = []
+    for calcAlleleSymbol in calcAlleleDict:
+        if len(calcAlleleDict[calcAlleleSymbol]) == 1:
+            alleleLine, alleleLineNum, lineRef = calcAlleleDict[calcAlleleSymbol][0]
+            tokens = str.split(alleleLine, TAB)
+            rowList.append(('created', alleleLineNum, '', calcAlleleSymbol, tokens[0], tokens[4]))
+    for alleleKey, colonyID, noteLineNum, alleleID in cidNoteList:
+        symbol = markerID = ''
+        if alleleID in alleleByIDDict:
+            symbol = alleleByIDDict[alleleID].asym
+            markerID = alleleByIDDict[alleleID].mid
+        rowList.append(('annotated', noteLineNum, alleleID, symbol, markerID, colonyID))
+
+    emalLedger.stage(emalQC.run, emalFile.hashFile(impcFile), impcFile, rowList)
+    fpLogDiag.write('Ledger entries staged: %s (run %s)%s' % (len(rowList), emalQC.run, CRT))
+
+    return
+
+def loadColonyNotes():
+    # Purpose: bcp the colony ID notes for existing alleles directly into
+    #   MGI_Note (incremental), instead of running mginoteload.csh
+    #   on the cid_noteload file
+    # Returns: 1 if error, else 0
+    # Assumes: db connection, createAlleleFile has been run
+    # Effects: writes to the file system, copies data into the db
+    # Throws: Nothing
+
+    if cidNoteInProcess != 'true' or DEBUG == 'true':
+        return 0
+
+    startTime = time.time()
+    fpLogDiag.write('%sIn-process colony ID noteload%s' % (CRT, CRT))
+
+    if len(cidNoteList) == 0:
+        fpLogDiag.write('No colony ID notes to load%s' % CRT)
+        return 0
+
+    results = db.sql('''select _User_key from MGI_User
+        where login = '%s' ''' % createdBy, 'auto')
+    if results == []:
+        fpLogDiag.write('Unknown user: %s%s' % (createdBy, CRT))
+        return 1
+    createdByKey = results[0]['_User_key']
+
+    results = db.sql(''' select nextval('mgi_note_seq') as nextKey ''', 'auto')
+    noteKey = results[0]['nextKey']
+
+    try:
+        fpNoteBcp = open(cidNoteBcpFile, 'w')
+    except:
+        fpLogDiag.write('Cannot open file: %s%s' % (cidNoteBcpFile, CRT))
+        return 1
+
+    # _MGIType_key 11 = Allele, _NoteType_key 1041 = IKMC Allele Colony Name
+    for alleleKey, colonyID, noteLineNum, alleleID in cidNoteList:
+        fpNoteBcp.write('%s|%s|11|1041|%s|%s|%s|%s|%s%s' % \
+            (noteKey, alleleKey, colonyID, createdByKey, createdByKey, \
+            loadlib.loaddate, loadlib.loaddate, CRT))
+        noteKey += 1
+    fpNoteBcp.close()
+
+    db.commit()
+
+    bcpCmd = '%s/bin/bcpin.csh %s %s MGI_Note "/" %s "|" "\\n" mgd' % \
+        (os.getenv('PG_DBUTILS'), db.get_sqlServer(), db.get_sqlDatabase(), \
+        cidNoteBcpFile)
+    fpLogDiag.write('%s%s' % (bcpCmd, CRT))
+    if os.system(bcpCmd) != 0:
+        fpLogDiag.write('Colony ID note bcp failed%s' % CRT)
+        return 1
+
+    # update mgi_note_seq auto-sequence
+    db.sql(''' select setval('mgi_note_seq', (select max(_Note_key) from MGI_Note)) ''', None)
+    db.commit()
+
+    fpLogDiag.write('Colony ID notes loaded: %s%s' % (len(cidNoteList), CRT))
+    fpLogDiag.write('Elapsed seconds: %.2f%s' % (time.time() - startTime, CRT))
+
+    return 0
+
+def qcCounts():
+    # Purpose: count the errors in each QC category
+    # Returns: dictionary {category: count, ...}
+    # Assumes: createAlleleFile has been run
+    # Effects: Nothing
+    # Throws: Nothing
+
+    return {
+        '7.2.A1 Required Value' : len(missingRequiredValueList),
+        '7.2.A1 Marker ID' : len(markerIdNotInMgiList),
+        '7.2.A1 Strain' : len(strainNotInMgiList),
+        '7.2.A1 Allele Class' : len(unknownAlleleClassList),
+        '7.2.A1 Allele Type' : len(unknownAlleleTypeList),
+        '7.2.A1 Allele Subtype' : len(unknownSubTypeList),
+        '7.2.C1' : len(alleleIdNotInMGIList),
+        '7.2.D3' : len(alleleIdMatchAlleleStatusDiscrepList),
+        '7.2.D1' : len(alleleIdMatchMarkerIdMismatchList),
+        '7.2.D2' : len(alleleIdMatchAlleleSSMismatchList),
+        '7.2.D4a' : len(alleleIdMatchColonyIDMismatchList),
+        '7.2.D4b Multi' : len(alleleIdMatchColonyIdMatchToMultiList),
+        '7.2.D4b Different' : len(alleleIdMatchColonyIdMatchToDiffAlleleList),
+        '7.2.F1' : len(cidMatchToMultiList),
+        '7.2.F2a' : len(cidMatchMarkerIdMismatchList),
+        '7.2.F2b' : len(cidMatchAlleleSSMismatchList),
+        '7.2.F3' : len(cidMatchAlleleStatusDiscrepList),
+        '7.2.H1' : len(symbolMatchAlleleStatusDiscrepList),
+        '7.2.H2' : len(symbolMatchColonyIdMismatchList),
+        '7.2.H3' : len(symbolMatchMultiAlleleList),
+        'Nomenclature' : len(badNomenList),
+        '7.2.I' : len(labCodeNotInMgiList),
+        '7.2.A1g' : len(atTransKeyNotInMgiList),
+        'Duplicate' : len(dupeAlleleInInputList) }
+
+def resetQC():
+    # Purpose: clear the QC results so createAlleleFile can be run again
+    # Returns: Nothing
+    # Assumes: Nothing
+    # Effects: Sets global variables
+    # Throws: Nothing
+
+    global linesSkippedCt, linesLoadedCt, allelesFoundCt, lineNum
+
+    for qcList in [missingRequiredValueList, labCodeNotInMgiList,
+            badNomenList, markerIdNotInMgiList, strainNotInMgiList,
+            unknownAlleleClassList, unknownAlleleTypeList, unknownSubTypeList,
+            alleleIdNotInMGIList, alleleIdMatchAlleleStatusDiscrepList,
+            alleleIdMatchMarkerIdMismatchList, alleleIdMatchAlleleSSMismatchList,
+            alleleIdMatchColonyIDMismatchList,
+            alleleIdMatchColonyIdMatchToMultiList,
+            alleleIdMatchColonyIdMatchToDiffAlleleList, cidMatchToMultiList,
+            cidMatchMarkerIdMismatchList, cidMatchAlleleSSMismatchList,
+            cidMatchAlleleStatusDiscrepList, symbolMatchAlleleStatusDiscrepList,
+            symbolMatchColonyIdMismatchList, symbolMatchMultiAlleleList,
+            dupeAlleleInInputList, atTransKeyNotInMgiList, cidNoteList]:
+        qcList.clear()
+    calcAlleleDict.clear()
+
+    linesSkippedCt = 0
+    linesLoadedCt = 0
+    allelesFoundCt = 0
+    lineNum = 0
+
+    return
+
+def runQC():
+    # Purpose: run the QC, write the QC report and load the colony ID
+    #	notes, once the lookups are loaded and the files are open
+    # Returns: 1 if error, else 0
+    # Assumes: initialize() or runWarm() has been called
+    # Effects: writes to the file system, closes the files
+    # Throws: Nothing
+
+    emalMetrics.startStage('qc')
+    qcFunction = createAlleleFile
+    if qcEngine == 'sqlite':
+        qcFunction = createAlleleFileSql
+    if emalProfile.run('createAlleleFile', qcFunction) != 0:
+        closeFiles()
+        return 1
+    emalMetrics.endStage('qc', rowsIn = lineNum - 1, \
+        rowsOut = linesLoadedCt, counts = qcCounts())
+
+    emalMetrics.startStage('report')
+    if emalProfile.run('writeQCReport', writeQCReport) != 0:
+        closeFiles()
+        return 1
+    emalQC.writeIndex()
+    stageLedger()
+    emalMetrics.endStage('report')
+
+    emalMetrics.startStage('noteload')
+    if loadColonyNotes() != 0:
+        closeFiles()
+        return 1
+    if cidNoteInProcess == 'true' and DEBUG != 'true':
+        emalMetrics.endStage('noteload', rowsOut = len(cidNoteList))
+
+    emalSql.writeSummary(fpLogDiag)
+
+    return closeFiles()
+
+def runWarm(run = None): # the run (RUN_ID of emalload.sh)
+    # Purpose: run the QC of the current input file with the lookups
+    #	kept in memory by the loader daemon (emalDaemon.py)
+    # Returns: 1 if error, else 0
+    # Assumes: loadWarm() has been called
+    # Effects: writes to the file system
+    # Throws: Nothing
+
+    # clear the state of the previous run
+    resetQC()
+    emalSql.reset()
+    emalQC.run = run or time.strftime('%Y%m%d.%H%M')
+    loadlib.loaddate = time.strftime('%m/%d/%Y')
+
+    emalMetrics.startStage('lookup')
+    if openFiles() != 0:
+        return 1
+    writeColonyFanOut()
+    writeLookupStats()
+    counts = lookupCounts()
+    counts['warm'] = 1
+    emalMetrics.endStage('lookup', counts = counts)
+
+    return runQC()
+
 #
 #  MAIN
 #
 
-if initialize() != 0:
-    sys.exit(1)
-
-if createAlleleFile() != 0:
-    closeFiles()
-    sys.exit(1)
+if __name__ == '__main__':
+    # statement timing (see emalSql.py)
+    emalSql.install()
 
-if writeQCReport() != 0:
-    closeFiles()
-    sys.exit(1)
+    emalMetrics.startStage('lookup')
+    if emalProfile.run('initialize', initialize) != 0:
+        sys.exit(1)
+    emalMetrics.endStage('lookup', counts = lookupCounts())
 
-if closeFiles() != 0:
-    sys.exit(1)
+    if runQC() != 0:
+        sys.exit(1)
 
-db.useOneConnection(0)
+    db.useOneConnection(0)
 
-sys.exit(0)
+    sys.exit(0)
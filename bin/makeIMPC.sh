@@ -19,6 +19,7 @@ Usage="Usage: makeIMPC.sh config"
 #  Outputs:
 #
 #      - Log file (${LOG})
+#      - Metrics file (${METRICS_FILE})
 #
 #  Exit Codes:
 #
@@ -34,7 +35,8 @@ Usage="Usage: makeIMPC.sh config"
 #      1) Source the configuration file to establish the environment.
 #      2) Verify that the input file exists.
 #      3) Establish the log file.
-#      4) Call makeIMPC.py to QC and create the allele file
+#      4) Call emalload.py to copy the input file, QC and create the
+#         allele file (makeIMPC.py) and load the colony ID notes
 #
 #  Notes:  
 #	12/15/2016
@@ -57,6 +59,13 @@ CONFIG=$1
 # Establish the log file.
 #
 LOG=${LOG_DIAG}
+rm -rf ${METRICS_FILE}
+
+#
+# The run: names the run in the QC index, the allele ledger and the archive
+#
+RUN_ID=`date '+%Y%m%d.%H%M'`
+export RUN_ID
 
 #
 #  Source the DLA library functions.
@@ -83,49 +92,16 @@ preload ${OUTPUTDIR}
 rm -f ${OUTPUTDIR}/*
 
 #
-# copy source input file
-#
-echo "copying source input file..." >> ${LOG}
-date >> ${LOG}
-rm -rf ${SOURCE_COPY_INPUT_FILE}
-cp ${SOURCE_INPUT_FILE} ${SOURCE_COPY_INPUT_FILE}
-STAT=$?
-checkStatus ${STAT} "Copying input file"
-
-#
-# Create the IMPC Allele input files
+# Copy the input file, create the IMPC Allele input files (makeIMPC.py),
+# then run the qcdiff beside the colony ID noteload, the ledger and the
+# archive, as a dependency graph (see emalload.py)
 #
 echo "" >> ${LOG}
 date >> ${LOG}
 echo "Create the IMPC Allele input file (makeIMPC.sh)" | tee -a ${LOG}
-${PYTHON} -W "ignore" ./makeIMPC.py 2>&1 >> ${LOG}
+${PYTHON} -W "ignore" ${EMALLOAD}/bin/emalload.py qc >> ${LOG} 2>&1
 STAT=$?
-checkStatus ${STAT} "makeIMPC.py ${CONFIG}"
-#
-# run noteload to add colony id notes to existing alleles
-#
-
-if [ "${LOG_DEBUG}" != "true" ]
-then
-    if [ -s ${CID_NOTE_FILE} ]
-    then
-	echo "" >> ${LOG}
-	date >> ${LOG}
-	${NOTELOAD}/mginoteload.csh ${EMALLOAD}/impc_noteload.config
-	STAT=$?
-	checkStatus ${STAT} "CID noteload ${CONFIG}"
-    fi
-fi
-
-#
-# Archive a copy of the input file, adding a timestamp suffix.
-#
-echo "" >> ${LOG_DIAG}
-date >> ${LOG_DIAG}
-echo "Archive input file" >> ${LOG_DIAG}
-TIMESTAMP=`date '+%Y%m%d.%H%M'`
-ARC_FILE=`basename ${SOURCE_INPUT_FILE}`.${TIMESTAMP}
-cp -p ${SOURCE_INPUT_FILE} ${ARCHIVEDIR}/${ARC_FILE}
+checkStatus ${STAT} "emalload.py qc ${CONFIG}"
 
 #
 # run postload cleanup and email logs
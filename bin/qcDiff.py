@@ -0,0 +1,196 @@
+#
+#  qcDiff.py
+###########################################################################
+#
+#  Purpose:
+#
+#       Run-over-run QC diff. Each QC record of the run (QC_JSON_FILE,
+#	see emalQC.py) is keyed by (rule, colony ID, allele symbol) and
+#	the key hashed; the keys are compared with those stored by the
+#	previous run and the new, resolved and persisting errors are
+#	reported with counts per rule. The keys of this run then replace
+#	the stored keys, except for a QC preview (makeIMPC.sh), which is
+#	compared with the keys of the last load.
+#
+#	Runs in linear time: one pass over the records, one over the
+#	stored keys, set lookups for the comparison.
+#
+#  Usage:
+#
+#      qcDiff.py [--preview]
+#
+#	--preview: do not store the keys of this run
+#
+#  Env Vars:
+#
+#	QC_JSON_FILE - the structured QC file of this run
+#	QC_DIFF_KEYS - the stored keys of the previous run
+#	QC_DIFF_RPT - the diff report
+#
+#  Inputs:
+#
+#	${QC_JSON_FILE}
+#	${QC_DIFF_KEYS}, one line per key:
+#	    hash<TAB>rule<TAB>colony ID<TAB>allele symbol<TAB>line#
+#
+#  Outputs:
+#
+#	${QC_DIFF_RPT}
+#	${QC_DIFF_KEYS}, the keys of this run (not with --preview)
+#
+#  Exit Codes:
+#
+#      0:  Successful completion
+#      1:  An exception occurred
+#
+#  Notes:
+#
+#	Colony IDs are compared without case, as in the QC.
+#	If there are no stored keys, every error is reported as new.
+#	A run without QC records (QC_JSON_FILE missing or empty) has no
+#	errors: all stored errors are reported as resolved.
+#
+###########################################################################
+
+import sys
+import os
+import json
+import hashlib
+
+TAB = '\t'
+CRT = '\n'
+
+jsonFile = os.getenv('QC_JSON_FILE')
+keysFile = os.getenv('QC_DIFF_KEYS')
+diffFile = os.getenv('QC_DIFF_RPT')
+
+#
+# Purpose: Hash the key of a QC record
+# Returns: hex digest
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def hashKey(rule, colonyID, alleleSymbol):
+    key = '%s\0%s\0%s' % (rule, str.lower(colonyID), alleleSymbol)
+    return hashlib.blake2b(key.encode(), digest_size = 8).hexdigest()
+
+#
+# Purpose: Read the keys of the QC records of this run
+# Returns: dictionary {hash: (rule, colony ID, allele symbol, line#)}
+#	(the first record of a key); empty if the file does not exist
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: IOError if the file cannot be read
+#
+def readRecords(fileName):
+    keyDict = {}
+    if not os.path.exists(fileName):
+        return keyDict
+    for text in open(fileName, 'r'):
+        record = json.loads(text)
+        rule = record['rule']
+        colonyID = record['input']['colonyID']
+        alleleSymbol = record['input']['alleleSymbol']
+        digest = hashKey(rule, colonyID, alleleSymbol)
+        if digest not in keyDict:
+            keyDict[digest] = (rule, colonyID, alleleSymbol, str(record['line']))
+    return keyDict
+
+#
+# Purpose: Read the stored keys of the previous run
+# Returns: dictionary {hash: (rule, colony ID, allele symbol, line#)},
+#	None if there are no stored keys
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: IOError if the file cannot be read
+#
+def readKeys(fileName):
+    if not os.path.exists(fileName):
+        return None
+    keyDict = {}
+    for line in open(fileName, 'r'):
+        tokens = str.split(line[:-1], TAB)
+        keyDict[tokens[0]] = tuple(tokens[1:])
+    return keyDict
+
+#
+# Purpose: Store the keys of this run
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: replaces the stored keys
+# Throws: IOError if the file cannot be written
+#
+def writeKeys(fileName, keyDict):
+    fp = open(fileName + '.new', 'w')
+    for digest in keyDict:
+        fp.write('%s%s%s%s' % (digest, TAB, str.join(TAB, keyDict[digest]), CRT))
+    fp.close()
+    os.rename(fileName + '.new', fileName)
+    return
+
+#
+# Purpose: Write the diff report
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: writes to the file system
+# Throws: IOError if the file cannot be written
+#
+def writeReport(fileName, currentDict, previousDict):
+    newList = []
+    persistingList = []
+    for digest in currentDict:
+        if digest in previousDict:
+            persistingList.append(currentDict[digest])
+        else:
+            newList.append(currentDict[digest])
+    resolvedList = [previousDict[d] for d in previousDict if d not in currentDict]
+
+    # counts per rule: [new, resolved, persisting]
+    ruleDict = {}
+    for i, keyList in enumerate([newList, resolvedList, persistingList]):
+        for key in keyList:
+            ruleDict.setdefault(key[0], [0, 0, 0])[i] += 1
+
+    fp = open(fileName, 'w')
+    fp.write('QC errors new: %s resolved: %s persisting: %s%s%s' % \
+        (len(newList), len(resolvedList), len(persistingList), CRT, CRT))
+    fp.write('Rule%sNew%sResolved%sPersisting%s' % (TAB, TAB, TAB, CRT))
+    fp.write('_____________________________________________________________%s' % CRT)
+    for rule in sorted(ruleDict):
+        fp.write('%s%s%s%s' % (rule, TAB, str.join(TAB, map(str, ruleDict[rule])), CRT))
+
+    for title, keyList in [('New', newList), ('Resolved', resolvedList)]:
+        fp.write('%s%s%s QC Errors%s%s' % (CRT, CRT, title, CRT, CRT))
+        fp.write('Rule%sColony ID%sAllele Symbol%sLine#%s' % (TAB, TAB, TAB, CRT))
+        fp.write('_____________________________________________________________%s' % CRT)
+        # grouped by rule, in input order within a rule
+        byRuleDict = {}
+        for key in keyList:
+            byRuleDict.setdefault(key[0], []).append(key)
+        for rule in sorted(byRuleDict):
+            for key in byRuleDict[rule]:
+                fp.write('%s%s' % (str.join(TAB, key), CRT))
+        fp.write('Total: %s%s' % (len(keyList), CRT))
+    fp.close()
+    return
+
+#
+# MAIN
+#
+if __name__ == '__main__':
+    if not jsonFile or not keysFile or not diffFile:
+        print('QC_JSON_FILE, QC_DIFF_KEYS and QC_DIFF_RPT must be defined')
+        sys.exit(1)
+    preview = sys.argv[1:] == ['--preview']
+
+    currentDict = readRecords(jsonFile)
+    previousDict = readKeys(keysFile)
+    if previousDict is None:
+        print('No stored QC keys: %s; all errors are new' % keysFile)
+        previousDict = {}
+
+    writeReport(diffFile, currentDict, previousDict)
+    if not preview:
+        writeKeys(keysFile, currentDict)
+    sys.exit(0)